@@ -0,0 +1,230 @@
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from context_window import count_message_tokens
+from manifest import IngestionManifest
+from context_bundle import get_context_bundle_store
+from rate_limiter import RateLimiter
+from request_scheduler import COMPLETION_TOKENS_ESTIMATE
+from response_cache import get_response_cache, get_deck_hashes, make_context_id
+from tracing import configure_tracing, turn
+
+# Function to read the questionnaire from a JSONL or CSV file
+def load_questions(questions_file):
+    """Return [{"id", "question"}]; lines without an id are identified by a hash of the question."""
+    questions = []
+    with open(questions_file, "r", encoding="utf-8-sig", newline="") as f:
+        if questions_file.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for row in rows:
+        if isinstance(row, str):
+            row = {"question": row}
+        question = (row.get("question") or "").strip()
+        if not question:
+            continue
+        question_id = str(row.get("id") or "").strip() or hashlib.sha1(question.encode("utf-8")).hexdigest()[:12]
+        questions.append({"id": question_id, "question": question})
+    return questions
+
+# Function to find the questions already answered in an earlier (interrupted) run
+def load_completed(output_file):
+    """Return the (deck, question id) pairs with an answer in the output file; failed ones are asked again."""
+    completed = set()
+    if not os.path.exists(output_file):
+        return completed
+    with open(output_file, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Last line cut off by the interruption
+            if record.get("answer") and not record.get("error"):
+                completed.add((record["deck"], record["question_id"]))
+    return completed
+
+# Function to make sure the answers of a resumed run start on a line of their own
+def repair_last_line(output_file):
+    """Drop a last line cut off by an interruption, or end a complete one with its missing newline."""
+    if not os.path.exists(output_file):
+        return
+    with open(output_file, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        # Read back far enough to find the start of the last line
+        chunk = 4096
+        position = size
+        tail = b""
+        while position > 0 and b"\n" not in tail:
+            position = max(0, position - chunk)
+            f.seek(position)
+            tail = f.read(size - position)
+        if tail.endswith(b"\n"):
+            return
+        line_start = position + tail.rfind(b"\n") + 1
+        try:
+            json.loads(tail[line_start - position:].decode("utf-8"))
+        except ValueError:
+            f.truncate(line_start)
+        else:
+            f.write(b"\n")
+
+# Function to ask one question about one deck
+def answer_question(generator, limiter, system_message, deck, question):
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": question["question"]}
+    ]
+    estimated_tokens = count_message_tokens(messages) + COMPLETION_TOKENS_ESTIMATE
+    waits = []
+
+    # Only a request that is actually sent takes rate-limit budget; cached replies do not wait
+    def acquire():
+        waits.append(limiter.acquire(estimated_tokens))
+
+    with turn(mode="batch", deck=deck):
+        answer = generator.send_request(messages, before_request=acquire)
+    metrics = generator.last_metrics
+    usage = metrics.get("usage") or {}
+    if waits:
+        # A reply without usage keeps the estimate
+        limiter.settle(estimated_tokens, usage.get("total_tokens", estimated_tokens))
+    waited = waits[0] if waits else 0.0
+    record = {
+        "deck": deck,
+        "question_id": question["id"],
+        "question": question["question"],
+        "answer": answer,
+        "latency": round(metrics.get("total_latency") or 0.0, 4),
+        "rate_limit_wait": round(waited, 4),
+        "usage": usage or None,
+        "retries": metrics.get("retries", 0),
+        "cached": bool(metrics.get("cached"))
+    }
+    if answer is None:
+        record["error"] = metrics.get("error", "No response")
+    return record
+
+# Function to run a questionnaire against several decks
+def run_batch(questions, deck_json_paths, output_file, management_file, concurrency=4,
+              tokens_per_minute=0, requests_per_minute=0, response_cache=None):
+    """Ask every question about every deck with bounded concurrency, appending one JSON line per answer.
+
+    Pairs already answered in output_file are skipped, so an interrupted run can simply be restarted.
+    """
+    from main import OpenAITextGenerator, get_access_token, load_pre_paper_prompt
+    from main import openai_api_base, deployment_name, subscription_key, retrieval_top_k, prompt_format, base_folder
+
+    pre_paper_prompt = load_pre_paper_prompt()
+    completed = load_completed(output_file)
+    limiter = RateLimiter(tokens_per_minute, requests_per_minute)
+    manifest = IngestionManifest(management_file)
+    context_bundles = get_context_bundle_store(os.path.join(base_folder, "cache", "context_bundles"))
+
+    tasks = []
+    for path in deck_json_paths:
+        deck = os.path.basename(path)
+        pending = [question for question in questions if (deck, question["id"]) not in completed]
+        if not pending:
+            continue
+        system_message = context_bundles.get(pre_paper_prompt, [path], prompt_format)["system_message"]
+        deck_hashes = get_deck_hashes(manifest, [path])
+        # Batch always sends the full deck, whatever CONTEXT_MODE the chat uses
+        context_id = make_context_id(pre_paper_prompt, deck_hashes, "full", retrieval_top_k, prompt_format)
+        for question in pending:
+            tasks.append((deck, system_message, deck_hashes, context_id, question))
+
+    skipped = len(questions) * len(deck_json_paths) - len(tasks)
+    if not tasks:
+        print(f"Nothing to do: all {skipped} answer(s) are already in {output_file}.")
+        return {"answered": 0, "failed": 0, "skipped": skipped, "seconds": 0.0}
+
+    print(f"Asking {len(tasks)} question(s) with {concurrency} worker(s) ({skipped} already answered)...")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    repair_last_line(output_file)
+    write_lock = threading.Lock()
+    start_time = time.perf_counter()
+    answered = failed = 0
+    prompt_tokens = cached_prompt_tokens = 0
+    with open(output_file, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for deck, system_message, deck_hashes, context_id, question in tasks:
+            # One generator per question: last_metrics belongs to a single request
+            generator = OpenAITextGenerator(
+                openai_api_base, deployment_name, get_access_token, subscription_key,
+                response_cache=response_cache, context_id=context_id, deck_hashes=deck_hashes
+            )
+            future = executor.submit(answer_question, generator, limiter, system_message, deck, question)
+            futures[future] = (deck, question)
+        for future in as_completed(futures):
+            deck, question = futures[future]
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"deck": deck, "question_id": question["id"], "question": question["question"],
+                          "answer": None, "error": str(e)}
+            with write_lock:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()  # Every finished answer survives an interruption
+            if record.get("error"):
+                failed += 1
+            else:
+                answered += 1
+            usage = record.get("usage") or {}
+            prompt_tokens += usage.get("prompt_tokens", 0)
+            cached_prompt_tokens += (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            elapsed = time.perf_counter() - start_time
+            print(f"[{answered + failed}/{len(tasks)}] {deck} / {question['id']}: "
+                  f"{'failed' if record.get('error') else 'ok'} | {(answered + failed) / elapsed:.2f} questions/s")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Answered {answered} question(s) in {elapsed:.1f}s; {failed} failed, {skipped} skipped. Results: {output_file}")
+    prefix_cache_hit_rate = cached_prompt_tokens / prompt_tokens if prompt_tokens else 0.0
+    if prompt_tokens:
+        print(f"Prefix cache: {cached_prompt_tokens} of {prompt_tokens} prompt tokens ({prefix_cache_hit_rate:.0%})")
+    return {"answered": answered, "failed": failed, "skipped": skipped, "seconds": elapsed,
+            "prefix_cache_hit_rate": prefix_cache_hit_rate}
+
+def main():
+    base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+    parser = argparse.ArgumentParser(description="Answer a fixed list of questions about one or more decks.")
+    parser.add_argument("questions", help="JSONL (one {\"question\", \"id\"} object per line) or CSV with a question column")
+    parser.add_argument("--decks", nargs="*", default=None, help="JSON file names in the json folder (default: all)")
+    parser.add_argument("--json-folder", default=os.path.join(base_folder, "ppt_json"))
+    parser.add_argument("--management-folder", default=os.path.join(base_folder, "text_extraction_management_files"))
+    parser.add_argument("--output", default=os.path.join(base_folder, "batch_answers.jsonl"))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")))
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("RATE_LIMIT_TPM", "0")), help="tokens per minute (0: unlimited)")
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("RATE_LIMIT_RPM", "0")), help="requests per minute (0: unlimited)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the response cache")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    if not questions:
+        print(f"No questions found in {args.questions}")
+        return 1
+    deck_names = args.decks or sorted(f for f in os.listdir(args.json_folder) if f.lower().endswith(".json"))
+    deck_json_paths = [os.path.join(args.json_folder, name) for name in deck_names]
+    missing = [path for path in deck_json_paths if not os.path.exists(path)]
+    if missing or not deck_json_paths:
+        print(f"JSON file(s) not found: {', '.join(missing) or args.json_folder}")
+        return 1
+
+    configure_tracing("batch", os.path.join(base_folder, "traces"))
+    response_cache = None if args.no_cache else get_response_cache(os.path.join(base_folder, "cache", "responses"))
+    management_file = os.path.join(args.management_folder, "ppt_management.json")
+    result = run_batch(questions, deck_json_paths, args.output, management_file, args.concurrency,
+                       args.tpm, args.rpm, response_cache)
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
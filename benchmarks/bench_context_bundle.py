@@ -0,0 +1,143 @@
+"""Measure context bundle reuse and the prompt-cache hit rate it enables.
+
+Usage:
+    python benchmarks/bench_context_bundle.py [--decks 20] [--slides 30] [--sessions 4] [--questions 3]
+
+Writes synthetic deck JSON files into a temporary PPTCHAT_HOME and times the "All JSON files" system
+message of context_bundle.py built cold, reused from memory and reused from disk by a fresh process.
+The bundle's content hash must not depend on the order the decks are passed in.
+Then every session asks its questions against the mock Azure endpoint, which reports a cached prefix
+when the same long system message was sent before:
+- bundle: every session gets the bundle (decks in file name order)
+- listing_order: every session concatenates the decks in its own order, as the directory listing
+  used to decide
+The prefix-cache hit rate is the share of prompt tokens reported in usage.prompt_tokens_details.cached_tokens.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+sys.path.insert(0, BENCHMARKS_FOLDER)
+
+from mock_azure import MockAzureServer
+from synthetic_decks import sentence
+
+def write_decks(ppt_json_folder, decks, slides, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(ppt_json_folder, exist_ok=True)
+    paths = []
+    for deck in range(decks):
+        file_name = f"deck_{deck:03d}.pptx"
+        records = [{
+            "file_name": file_name,
+            "title": sentence(rng, 4).capitalize(),
+            "slide_number": number,
+            "text": "\n".join(sentence(rng) for _ in range(rng.randint(3, 6))),
+            "note": sentence(rng, 12),
+            "slide_link": f"file:///ppt/{file_name}#slide={number}",
+        } for number in range(1, slides + 1)]
+        path = os.path.join(ppt_json_folder, f"deck_{deck:03d}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+        paths.append(path)
+    return paths
+
+def timed_get(store, pre_paper_prompt, paths, prompt_format):
+    start = time.perf_counter()
+    bundle = store.get(pre_paper_prompt, paths, prompt_format)
+    return bundle, round(time.perf_counter() - start, 4)
+
+def measure_disk_reuse(home, prompt_format):
+    """Run in a fresh process: the bundle built by the parent must come from disk."""
+    from context_bundle import ContextBundleStore
+    ppt_json_folder = os.path.join(home, "ppt_json")
+    paths = [os.path.join(ppt_json_folder, f) for f in os.listdir(ppt_json_folder) if f.endswith(".json")]
+    store = ContextBundleStore(os.path.join(home, "cache", "context_bundles"))
+    bundle, seconds = timed_get(store, "You answer questions about the decks.", paths, prompt_format)
+    print(json.dumps({"source": bundle["source"], "seconds": seconds, "content_hash": bundle["content_hash"]}))
+
+def ask_sessions(server, system_messages, questions):
+    """Send every session's questions; return the prefix-cache hit rate over all prompt tokens."""
+    from main import OpenAITextGenerator, get_access_token
+    prompt_tokens = cached_tokens = 0
+    for session, system_message in enumerate(system_messages):
+        generator = OpenAITextGenerator(server.api_base, "mock", get_access_token, "mock")
+        for question in range(questions):
+            messages = [{"role": "system", "content": system_message},
+                        {"role": "user", "content": f"Question {question} of session {session}"}]
+            generator.send_request(messages, use_cache=False)
+        prompt_tokens += generator.usage_totals["prompt_tokens"]
+        cached_tokens += generator.usage_totals["cached_prompt_tokens"]
+    return round(cached_tokens / prompt_tokens, 3) if prompt_tokens else None
+
+def run(args):
+    with tempfile.TemporaryDirectory() as home, MockAzureServer(latency=0.0, token_delay=0.0) as server:
+        os.environ.update({
+            "PPTCHAT_HOME": home, "TOKEN_URL": server.token_url, "OPENAI_API_BASE": server.api_base,
+            "DEPLOYMENT_NAME": "mock", "SUBSCRIPTION_KEY": "mock", "TENANT_ID": "mock", "CLIENT_ID": "mock",
+            "CLIENT_SECRET": "mock", "RESOURCE": "mock", "RESPONSE_CACHE": "0", "TRACING": "0",
+        })
+        from context_bundle import ContextBundleStore, build_deck_context
+        pre_paper_prompt = "You answer questions about the decks."
+        paths = write_decks(os.path.join(home, "ppt_json"), args.decks, args.slides)
+        store = ContextBundleStore(os.path.join(home, "cache", "context_bundles"))
+
+        cold, cold_seconds = timed_get(store, pre_paper_prompt, paths, args.format)
+        shuffled = paths[:]
+        random.Random(1).shuffle(shuffled)
+        warm, warm_seconds = timed_get(store, pre_paper_prompt, shuffled, args.format)
+        disk = json.loads(subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--disk-reuse", home, "--format", args.format],
+            check=True, capture_output=True, text=True
+        ).stdout.strip().splitlines()[-1])
+
+        rng = random.Random(2)
+        listing_messages = []
+        for _ in range(args.sessions):
+            order = paths[:]
+            rng.shuffle(order)
+            listing_messages.append(pre_paper_prompt + "\n\n" + "\n\n".join(
+                build_deck_context([path], args.format) for path in order))
+
+        return {
+            "decks": args.decks,
+            "slides": args.decks * args.slides,
+            "bundle_tokens": cold["tokens"],
+            "build_s": cold_seconds,
+            "memory_reuse_s": warm_seconds,
+            "disk_reuse_s": disk["seconds"],
+            "disk_reuse_source": disk["source"],
+            "order_independent": cold["content_hash"] == warm["content_hash"] == disk["content_hash"],
+            "prefix_cache_hit_rate": {
+                "bundle": ask_sessions(server, [cold["system_message"]] * args.sessions, args.questions),
+                "listing_order": ask_sessions(server, listing_messages, args.questions),
+            },
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decks", type=int, default=20)
+    parser.add_argument("--slides", type=int, default=30)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--format", default="compact", choices=["compact", "json"])
+    parser.add_argument("--disk-reuse", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.disk_reuse:
+        measure_disk_reuse(args.disk_reuse, args.format)
+        return 0
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    return 0 if result["order_independent"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
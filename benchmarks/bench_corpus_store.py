@@ -0,0 +1,113 @@
+"""Compare loading every deck from indented JSON files with the JSONL corpus store.
+
+Usage:
+    python benchmarks/bench_corpus_store.py [--slides 100000] [--slides-per-deck 100]
+
+Each load runs in a fresh subprocess so its peak resident memory (ru_maxrss) is isolated.
+Peak RSS is only reported on platforms with the resource module (Linux/macOS).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER)
+
+from corpus_store import get_corpus_store, sync_corpus_from_json_folder
+
+WORDS = "revenue growth roadmap launch budget kpi hiring churn margin cloud security agenda".split()
+
+MODES = ["json_all", "corpus_text", "corpus_all", "corpus_projected", "corpus_one_deck", "corpus_stream"]
+
+def generate_json_folder(folder, slides, slides_per_deck):
+    for deck_number in range(0, slides // slides_per_deck):
+        file_name = f"deck_{deck_number:05d}.pptx"
+        slides_data = [{
+            "file_name": file_name,
+            "title": " ".join(random.choices(WORDS, k=4)),
+            "slide_number": slide_number,
+            "text": "\n".join(" ".join(random.choices(WORDS, k=8)) for _ in range(5)),
+            "note": " ".join(random.choices(WORDS, k=10)),
+            "slide_link": f"file:///C:/python_scripts/pptChat/ppt/{file_name}#slide={slide_number}",
+        } for slide_number in range(1, slides_per_deck + 1)]
+        with open(os.path.join(folder, f"deck_{deck_number:05d}.json"), "w", encoding="utf-8") as f:
+            json.dump(slides_data, f, indent=4, ensure_ascii=False)
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def measure(mode, folder):
+    system_message = None
+    start = time.perf_counter()
+    if mode == "json_all":
+        # What option 2 "All JSON files" used to do
+        combined_data = []
+        for json_file in sorted(f for f in os.listdir(folder) if f.endswith(".json")):
+            with open(os.path.join(folder, json_file), "r", encoding="utf-8") as f:
+                combined_data.extend(json.load(f))
+        system_message = json.dumps(combined_data, indent=4, ensure_ascii=False)
+        rows = len(combined_data)
+    else:
+        store = get_corpus_store(folder)
+        if mode == "corpus_text":
+            # What option 2 "All JSON files" does now
+            system_message = store.read_text()
+            rows = system_message.count('"slide_number"')
+        elif mode == "corpus_all":
+            rows = len(store.read_records())
+        elif mode == "corpus_projected":
+            rows = len(store.read_records(columns=["file_name", "slide_number", "title"]))
+        elif mode == "corpus_one_deck":
+            rows = len(store.read_records(file_names=["deck_00000.pptx"]))
+        else:
+            rows = sum(1 for _ in store.iter_records(columns=["text"]))
+    seconds = time.perf_counter() - start
+    result = {"mode": mode, "rows": rows, "seconds": round(seconds, 3), "peak_rss_mb": peak_rss_mb()}
+    if system_message is not None:
+        result["prompt_chars"] = len(system_message)
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=100000)
+    parser.add_argument("--slides-per-deck", type=int, default=100)
+    parser.add_argument("--measure", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.folder)
+        return
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as folder:
+        generate_json_folder(folder, args.slides, args.slides_per_deck)
+        start = time.perf_counter()
+        sync_corpus_from_json_folder(folder)
+        migration_seconds = time.perf_counter() - start
+        results = []
+        for mode in MODES:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--measure", mode, "--folder", folder],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({
+        "slides": args.slides,
+        "migration_s": round(migration_seconds, 3),
+        "loads": results,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measure near-duplicate slide detection: how it scales and how much of the context it removes.
+
+Usage:
+    python benchmarks/bench_dedup.py [--sizes 1000,2000,4000,8000,16000] [--slides 40] [--shared 0.3]
+
+Builds synthetic slide records in decks of --slides slides. A --shared share of every deck's slides
+is copied from a common pool (agenda, disclaimer and product slides reused across decks); a third
+of the copies get one word changed, so they are near rather than exact duplicates. For each corpus
+size the signatures are added to a fresh dedup_index.DedupIndex and collapse_duplicates() clusters
+them; the time per slide of both stages should stay roughly flat as the corpus grows. The report
+(slides and prompt tokens removed) comes from dedup_index.dedup_report on the largest corpus, and
+recall is the share of the planted copies that were collapsed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+sys.path.insert(0, BENCHMARKS_FOLDER)
+
+from synthetic_decks import WORDS, sentence
+from dedup_index import DedupIndex, collapse_duplicates, dedup_report
+
+def make_slide(rng):
+    return {
+        "title": sentence(rng, 4).capitalize(),
+        "text": "\n".join(sentence(rng) for _ in range(rng.randint(3, 6))),
+        "note": sentence(rng, 12),
+    }
+
+def make_records(total_slides, slides_per_deck, shared, seed=0):
+    """Return (records, planted copies); copies keep the pool slide's text, some with one word changed."""
+    rng = random.Random(seed)
+    pool = [make_slide(rng) for _ in range(max(10, total_slides // 50))]
+    records = []
+    copies = 0
+    for deck in range(total_slides // slides_per_deck):
+        file_name = f"deck_{deck:05d}.pptx"
+        for number in range(1, slides_per_deck + 1):
+            if rng.random() < shared:
+                slide = dict(rng.choice(pool))
+                copies += 1
+                if rng.random() < 1 / 3:
+                    words = slide["text"].split(" ")
+                    words[rng.randrange(len(words))] = rng.choice(WORDS)
+                    slide["text"] = " ".join(words)
+            else:
+                slide = make_slide(rng)
+            records.append({"file_name": file_name, "slide_number": number, **slide,
+                            "slide_link": f"file:///ppt/{file_name}#slide={number}"})
+    return records, copies
+
+def run_size(total_slides, args):
+    records, copies = make_records(total_slides, args.slides, args.shared)
+    with tempfile.TemporaryDirectory() as folder:
+        index = DedupIndex(os.path.join(folder, "dedup_index"))
+        start = time.perf_counter()
+        index.add_records(records)
+        signature_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        collapsed, clusters = collapse_duplicates(records, index, args.threshold)
+        cluster_seconds = time.perf_counter() - start
+    removed = len(records) - len(collapsed)
+    return {
+        "slides": len(records),
+        "signatures_s": round(signature_seconds, 3),
+        "collapse_s": round(cluster_seconds, 3),
+        "signatures_us_per_slide": round(signature_seconds / len(records) * 1e6, 1),
+        "collapse_us_per_slide": round(cluster_seconds / len(records) * 1e6, 1),
+        "clusters": clusters,
+        "removed": removed,
+        # Each cluster keeps one planted copy (or the pool slide) as its representative
+        "recall": round(removed / max(1, copies - clusters), 3),
+    }, records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,2000,4000,8000,16000")
+    parser.add_argument("--slides", type=int, default=40, help="slides per deck")
+    parser.add_argument("--shared", type=float, default=0.3, help="share of slides copied from the common pool")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    results = []
+    records = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        result, records = run_size(size, args)
+        results.append(result)
+    first, last = results[0], results[-1]
+    growth = last["slides"] / first["slides"]
+    total_growth = (last["signatures_s"] + last["collapse_s"]) / max(1e-9, first["signatures_s"] + first["collapse_s"])
+    report = dedup_report(records, threshold=args.threshold, top=3)
+    print(json.dumps({
+        "sizes": results,
+        # 1.0 is perfectly linear; all-pairs comparison would be close to the slide growth factor
+        "time_growth_per_slide_growth": round(total_growth / growth, 2),
+        "slide_growth": growth,
+        "report": report,
+    }, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
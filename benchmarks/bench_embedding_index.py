@@ -0,0 +1,71 @@
+"""Measure embedding index query latency as the corpus grows.
+
+Usage:
+    python benchmarks/bench_embedding_index.py [--sizes 1000 10000 50000] [--queries 20]
+
+Uses the offline HashingEmbedder on synthetic slides, so no network access is needed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_index import EmbeddingIndex, HashingEmbedder
+
+WORDS = (
+    "revenue growth roadmap launch budget kpi hiring churn margin cloud security agenda "
+    "customer partner pipeline forecast risk compliance migration platform pricing"
+).split()
+
+def synthetic_records(deck_number, slides):
+    return [{
+        "file_name": f"deck_{deck_number}.pptx",
+        "slide_number": slide_number,
+        "title": " ".join(random.choices(WORDS, k=3)),
+        "text": " ".join(random.choices(WORDS, k=40)),
+        "note": "",
+    } for slide_number in range(1, slides + 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--slides-per-deck", type=int, default=100)
+    args = parser.parse_args()
+    random.seed(0)
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        index = EmbeddingIndex(folder, HashingEmbedder())
+        deck_number = 0
+        for size in sorted(args.sizes):
+            start = time.perf_counter()
+            while index.count < size:
+                index.add_records(synthetic_records(deck_number, args.slides_per_deck))
+                deck_number += 1
+            append_seconds = time.perf_counter() - start
+            # Reopen so queries run against the memory-mapped file
+            index = EmbeddingIndex(folder, HashingEmbedder())
+            queries = [" ".join(random.choices(WORDS, k=4)) for _ in range(args.queries)]
+            start = time.perf_counter()
+            for query in queries:
+                index.search(query, top_k=5)
+            single_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            start = time.perf_counter()
+            index.search(queries, top_k=5)
+            batched_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            results.append({
+                "slides": index.count,
+                "append_s": round(append_seconds, 3),
+                "query_ms": round(single_ms, 3),
+                "batched_query_ms_per_query": round(batched_ms, 3),
+            })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
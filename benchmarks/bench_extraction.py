@@ -0,0 +1,77 @@
+"""Compare the streaming XML extractor with the python-pptx extractor: throughput and memory.
+
+Usage:
+    python benchmarks/bench_extraction.py [--slides 1000] [--decks 1] [ppt_folder]
+
+Without a folder, synthetic decks (with tables and grouped shapes) are generated in a temporary folder.
+Parity of the two engines is checked by tests/test_pptx_stream.py. Each engine runs in a fresh subprocess so its peak resident memory (ru_maxrss) is isolated; it is only reported on platforms
+with the resource module (Linux/macOS).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER)
+
+from ppt_extraction import extract_text_with_metadata_from_ppt, list_ppt_files
+
+ENGINES = ["python-pptx", "stream"]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def measure(engine, folder):
+    paths = [os.path.join(folder, f) for f in list_ppt_files(folder)]
+    start = time.perf_counter()
+    slides = sum(len(extract_text_with_metadata_from_ppt(path, engine=engine)) for path in paths)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"engine": engine, "files": len(paths), "slides": slides, "seconds": round(seconds, 3),
+                      "slides_per_s": round(slides / seconds, 1), "peak_rss_mb": peak_rss_mb()}))
+
+def run(folder):
+    results = []
+    for engine in ENGINES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", engine, folder],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps({"engines": results}, indent=2))
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("ppt_folder", nargs="?")
+    parser.add_argument("--slides", type=int, default=1000)
+    parser.add_argument("--decks", type=int, default=1)
+    parser.add_argument("--measure", choices=ENGINES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.ppt_folder)
+        return 0
+    if args.ppt_folder:
+        return run(args.ppt_folder)
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Built in a subprocess so python-pptx does not raise this process' peak RSS
+        subprocess.run(
+            [sys.executable, os.path.join(REPO_FOLDER, "benchmarks", "synthetic_decks.py"), folder,
+             "--decks", str(args.decks), "--slides", str(args.slides)],
+            check=True, capture_output=True
+        )
+        return run(folder)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Compare the prompt size of indented JSON, minified JSON and the compact serializer.
+
+Usage:
+    python benchmarks/bench_prompt_compaction.py [<ppt_json_folder>] [--decks 3] [--slides 40] [--live]
+
+Without a folder, sample decks with a title, bullets, a footer, a confidentiality line and a page
+number on every slide are generated with python-pptx and run through the real extractor. With
+--live the first question is also sent with each format to the Azure deployment configured in
+.env (response cache bypassed) and the time to first token / total latency are reported.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pptx import Presentation
+from pptx.util import Inches
+from context_window import estimate_tokens
+from ppt_extraction import extract_text_with_metadata_from_ppt
+from prompt_serializer import serialize_slides
+
+WORDS = "revenue growth roadmap launch budget kpi hiring churn margin cloud security agenda partner pipeline".split()
+
+def add_textbox(slide, text, top):
+    slide.shapes.add_textbox(Inches(0.5), Inches(top), Inches(9), Inches(0.4)).text_frame.text = text
+
+def build_sample_deck(path, slides):
+    presentation = Presentation()
+    for number in range(1, slides + 1):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = " ".join(random.choices(WORDS, k=4)).capitalize()
+        slide.placeholders[1].text = "\n".join(" ".join(random.choices(WORDS, k=7)) for _ in range(4))
+        add_textbox(slide, "Confidential - for internal use only", 6.6)
+        add_textbox(slide, "(c) 2025 Example Corp. All rights reserved.", 6.9)
+        add_textbox(slide, str(number), 7.1)
+        slide.notes_slide.notes_text_frame.text = " ".join(random.choices(WORDS, k=12))
+    presentation.save(path)
+
+def load_decks(json_folder, decks, slides):
+    if json_folder:
+        for json_file in sorted(f for f in os.listdir(json_folder) if f.lower().endswith(".json")):
+            with open(os.path.join(json_folder, json_file), "r", encoding="utf-8") as f:
+                yield json_file, json.load(f)
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        for deck_number in range(decks):
+            ppt_path = os.path.join(folder, f"sample_deck_{deck_number + 1}.pptx")
+            build_sample_deck(ppt_path, slides)
+            yield os.path.basename(ppt_path), extract_text_with_metadata_from_ppt(ppt_path)
+
+def measure_live(generator, context, question):
+    messages = [{"role": "system", "content": context}, {"role": "user", "content": question}]
+    for _ in generator.stream_request(messages, use_cache=False):
+        pass
+    return generator.last_metrics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("json_folder", nargs="?")
+    parser.add_argument("--decks", type=int, default=3, help="sample decks to generate without a folder")
+    parser.add_argument("--slides", type=int, default=40, help="slides per sample deck")
+    parser.add_argument("--question", default="What are the KPIs?")
+    parser.add_argument("--live", action="store_true", help="also send the prompts to the deployment")
+    args = parser.parse_args()
+    random.seed(0)
+
+    generator = None
+    if args.live:
+        from main import OpenAITextGenerator, openai_api_base, deployment_name, get_access_token, subscription_key
+        generator = OpenAITextGenerator(openai_api_base, deployment_name, get_access_token, subscription_key)
+
+    results = []
+    all_records = []
+    for name, records in load_decks(args.json_folder, args.decks, args.slides):
+        all_records.extend(records)
+        start = time.perf_counter()
+        compact = serialize_slides(records)
+        serialize_seconds = time.perf_counter() - start
+        indented_tokens = estimate_tokens(json.dumps(records, indent=4, ensure_ascii=False))
+        compact_tokens = estimate_tokens(compact)
+        results.append({
+            "deck": name,
+            "slides": len(records),
+            "json_indent_tokens": indented_tokens,
+            "json_minified_tokens": estimate_tokens(json.dumps(records, ensure_ascii=False, separators=(",", ":"))),
+            "compact_tokens": compact_tokens,
+            "reduction": round(1 - compact_tokens / indented_tokens, 3) if indented_tokens else 0.0,
+            "serialize_ms": round(serialize_seconds * 1000, 3),
+        })
+
+    before = json.dumps(all_records, indent=4, ensure_ascii=False)
+    after = serialize_slides(all_records)
+    summary = {
+        "decks": len(results),
+        "slides": len(all_records),
+        "json_indent_tokens": estimate_tokens(before),
+        "compact_tokens": estimate_tokens(after),
+    }
+    summary["reduction"] = round(1 - summary["compact_tokens"] / summary["json_indent_tokens"], 3) if all_records else 0.0
+    if generator is not None:
+        for label, context in (("json_indent", before), ("compact", after)):
+            metrics = measure_live(generator, context, args.question)
+            summary[f"{label}_time_to_first_token_s"] = metrics.get("time_to_first_token")
+            summary[f"{label}_total_latency_s"] = metrics.get("total_latency")
+    print(json.dumps({"per_deck": results, "all": summary}, indent=2))
+
+if __name__ == "__main__":
+    main()
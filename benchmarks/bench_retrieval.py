@@ -0,0 +1,77 @@
+"""Compare prompt size and latency of the "full deck" and "retrieved" context modes.
+
+Usage:
+    python benchmarks/bench_retrieval.py <ppt_json_folder> [--question "..."] [--top-k 5] [--live]
+
+Without --live only prompt sizes and index build/query times are measured; with --live each
+question is also sent to the Azure deployment configured in .env in both modes.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_index import BM25Index, load_or_build_index, retrieve_slides
+from context_window import estimate_tokens
+
+DEFAULT_QUESTIONS = [
+    "Summarize the roadmap slide",
+    "What are the KPIs?",
+    "Which slides mention the budget?",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("json_folder")
+    parser.add_argument("--question", action="append", dest="questions")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="also send the prompts to the deployment")
+    args = parser.parse_args()
+    questions = args.questions or DEFAULT_QUESTIONS
+
+    json_paths = sorted(
+        os.path.join(args.json_folder, f) for f in os.listdir(args.json_folder) if f.lower().endswith(".json")
+    )
+    start = time.perf_counter()
+    index = BM25Index.merge([load_or_build_index(path) for path in json_paths])
+    index_seconds = time.perf_counter() - start
+    full_context = json.dumps(index.records, indent=4, ensure_ascii=False)
+
+    generator = None
+    if args.live:
+        from main import OpenAITextGenerator, openai_api_base, deployment_name, get_access_token, subscription_key
+        generator = OpenAITextGenerator(openai_api_base, deployment_name, get_access_token, subscription_key)
+
+    results = []
+    for question in questions:
+        start = time.perf_counter()
+        retrieved = retrieve_slides(index, question, args.top_k)
+        query_seconds = time.perf_counter() - start
+        retrieved_context = json.dumps(retrieved, indent=4, ensure_ascii=False)
+        row = {
+            "question": question,
+            "full_tokens": estimate_tokens(full_context),
+            "retrieved_tokens": estimate_tokens(retrieved_context),
+            "query_ms": round(query_seconds * 1000, 3),
+        }
+        if generator is not None:
+            for mode, context in (("full", full_context), ("retrieved", retrieved_context)):
+                messages = [{"role": "system", "content": context}, {"role": "user", "content": question}]
+                start = time.perf_counter()
+                generator.send_request(messages)
+                row[f"{mode}_latency_s"] = round(time.perf_counter() - start, 3)
+        results.append(row)
+
+    print(json.dumps({
+        "decks": len(json_paths),
+        "slides": len(index.records),
+        "index_load_or_build_s": round(index_seconds, 3),
+        "top_k": args.top_k,
+        "questions": results,
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Simulate concurrent chat sessions against the mock Azure endpoint, with and without the request scheduler.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--clients 8] [--heavy-clients 1] [--questions 5]
+                                         [--short-tokens 200] [--heavy-tokens 5000]
+                                         [--tpm 20000] [--max-in-flight 4] [--latency 0.2]
+
+Every client is one session asking its questions back to back; heavy clients send a whole deck
+with every question (like the "Full deck" mode on a large deck), the others short prompts. The mock
+deployment enforces --tpm as a token bucket and answers 429 + Retry-After beyond it.
+- direct: every session calls the endpoint on its own (retrying 429s with the shared HTTP client)
+- scheduled: every request goes through request_scheduler.RequestScheduler with the same TPM
+Each mode runs in a fresh subprocess (its own HTTP client and circuit breaker) and reports the 429s,
+failed requests and latency percentiles of short and heavy requests.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+sys.path.insert(0, BENCHMARKS_FOLDER)
+
+from mock_azure import MockAzureServer
+
+MODES = ["direct", "scheduled"]
+
+def percentile(values, share):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(share * len(values)))], 3)
+
+def run_mode(mode, args):
+    with tempfile.TemporaryDirectory() as home, MockAzureServer(
+            latency=args.latency, token_delay=0.005, completion_tokens=40, tpm_limit=args.tpm) as server:
+        os.environ.update({
+            "PPTCHAT_HOME": home, "TOKEN_URL": server.token_url, "OPENAI_API_BASE": server.api_base,
+            "DEPLOYMENT_NAME": "mock", "SUBSCRIPTION_KEY": "mock", "TENANT_ID": "mock", "CLIENT_ID": "mock",
+            "CLIENT_SECRET": "mock", "RESOURCE": "mock", "RESPONSE_CACHE": "0", "TRACING": "0",
+        })
+        from main import OpenAITextGenerator, get_access_token
+        from context_window import count_message_tokens
+        from rate_limiter import RateLimiter
+        from request_scheduler import RequestScheduler, COMPLETION_TOKENS_ESTIMATE
+
+        scheduler = RequestScheduler(RateLimiter(args.tpm), args.max_in_flight) if mode == "scheduled" else None
+        results = []
+        results_lock = threading.Lock()
+
+        def client(index):
+            heavy = index < args.heavy_clients
+            deck_text = "slide text " * ((args.heavy_tokens if heavy else args.short_tokens) * 4 // 11)
+            for question in range(args.questions):
+                messages = [{"role": "system", "content": deck_text},
+                            {"role": "user", "content": f"Question {question} of client {index}"}]
+                generator = OpenAITextGenerator(server.api_base, "mock", get_access_token, "mock")
+                start = time.perf_counter()
+                if scheduler is None:
+                    answer = generator.send_request(messages, use_cache=False)
+                else:
+                    estimated_tokens = count_message_tokens(messages) + COMPLETION_TOKENS_ESTIMATE
+                    with scheduler.request(f"client-{index}", estimated_tokens) as ticket:
+                        answer = generator.send_request(messages, use_cache=False)
+                        usage = generator.last_metrics.get("usage") or {}
+                        ticket.actual_tokens = usage.get("total_tokens", estimated_tokens)
+                with results_lock:
+                    results.append({"client": index, "heavy": heavy, "ok": answer is not None,
+                                    "latency": time.perf_counter() - start,
+                                    "retries": generator.last_metrics.get("retries", 0)})
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        stats = server.stats()
+
+    short = [r["latency"] for r in results if r["ok"] and not r["heavy"]]
+    heavy = [r["latency"] for r in results if r["ok"] and r["heavy"]]
+    return {
+        "mode": mode,
+        "requests": len(results),
+        "failed": sum(1 for r in results if not r["ok"]),
+        "throttled_429": stats.get("throttled", 0),
+        "retries": sum(r["retries"] for r in results),
+        "seconds": round(seconds, 2),
+        "short_p50_s": percentile(short, 0.5),
+        "short_p95_s": percentile(short, 0.95),
+        "heavy_p50_s": percentile(heavy, 0.5),
+        "heavy_max_s": percentile(heavy, 1.0),
+        "scheduler": scheduler.status() if scheduler is not None else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--heavy-clients", type=int, default=1)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--short-tokens", type=int, default=200)
+    parser.add_argument("--heavy-tokens", type=int, default=5000)
+    parser.add_argument("--tpm", type=int, default=20000)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args)))
+        return 0
+    results = []
+    for mode in MODES:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode] + sys.argv[1:],
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
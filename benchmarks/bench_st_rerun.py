@@ -0,0 +1,90 @@
+"""Time Streamlit reruns of main_st.py while a large deck is uploaded.
+
+Usage:
+    python benchmarks/bench_st_rerun.py [--slides 500] [--reruns 10]
+
+Builds a synthetic deck with python-pptx, feeds it to the app's file uploader and times
+headless reruns with streamlit.testing's AppTest (every chat turn triggers such a rerun).
+The app's folders are created under a temporary working directory.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_FOLDER)
+
+import streamlit
+from pptx import Presentation
+from streamlit.testing.v1 import AppTest
+from ppt_extraction import extract_text_with_metadata_from_ppt
+
+# Stand-in for streamlit's UploadedFile (AppTest cannot drive st.file_uploader)
+class FakeUploadedFile:
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.file_id = "benchmark-upload"
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+    def getvalue(self):
+        return self._data
+
+    def getbuffer(self):
+        return memoryview(self._data)
+
+def build_deck(path, slides):
+    presentation = Presentation()
+    for number in range(1, slides + 1):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {number} title"
+        slide.placeholders[1].text = f"Point one of slide {number}\nPoint two\nPoint three"
+        slide.notes_slide.notes_text_frame.text = f"Speaker notes for slide {number}"
+    presentation.save(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=500)
+    parser.add_argument("--reruns", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        os.chdir(work_folder)
+        deck_path = os.path.join(work_folder, "benchmark_deck.pptx")
+        build_deck(deck_path, args.slides)
+
+        # What every rerun used to cost: a full extraction and JSON write
+        start = time.perf_counter()
+        slides_data = extract_text_with_metadata_from_ppt(deck_path)
+        with open(os.path.join(work_folder, "uncached.json"), "w", encoding="utf-8") as f:
+            json.dump(slides_data, f, indent=4, ensure_ascii=False)
+        uncached_seconds = time.perf_counter() - start
+
+        upload = FakeUploadedFile(deck_path)
+        streamlit.file_uploader = lambda *args, **kwargs: upload
+        app = AppTest.from_file(os.path.join(REPO_FOLDER, "main_st.py"), default_timeout=600)
+        start = time.perf_counter()
+        app.run()
+        first_run_seconds = time.perf_counter() - start
+        if app.exception:
+            raise RuntimeError(app.exception)
+
+        rerun_seconds = []
+        for _ in range(args.reruns):
+            start = time.perf_counter()
+            app.run()
+            rerun_seconds.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "slides": args.slides,
+        "extract_and_write_s": round(uncached_seconds, 3),
+        "first_run_with_upload_s": round(first_run_seconds, 3),
+        "rerun_mean_s": round(sum(rerun_seconds) / len(rerun_seconds), 4),
+        "rerun_max_s": round(max(rerun_seconds), 4),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
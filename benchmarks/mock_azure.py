@@ -0,0 +1,247 @@
+"""Local mock of the Azure AD token endpoint and the Azure OpenAI chat completions endpoint.
+
+Usage:
+    python benchmarks/mock_azure.py [--port 8000] [--latency 0.3] [--token-delay 0.01] [--throttle-rate 0.1]
+
+Point the app at it with TOKEN_URL=http://127.0.0.1:<port>/token and
+OPENAI_API_BASE=http://127.0.0.1:<port>/openai. Every reply waits `latency` seconds
+before the first token and `token_delay` seconds per token (streamed as SSE chunks when
+the request asks for stream: true). Requests are answered with 429 + Retry-After at
+`throttle_rate` probability, above `rpm_limit` requests per minute or when the prompt and
+completion tokens of a request exceed what is left of `tpm_limit` (a token bucket refilled
+continuously, like the deployment quota). Like Azure's prompt caching, a system message of at
+least 1024 tokens that was already sent is reported as cached (usage.prompt_tokens_details.cached_tokens,
+in 128-token steps). GET /stats returns the request counters.
+"""
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Class to handle the mock endpoints; the configuration lives on the server object
+class MockAzureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.mock.stats())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.endswith("/token"):
+            mock.count("token_requests")
+            self._send_json(200, {
+                "token_type": "Bearer",
+                "expires_in": str(mock.token_lifetime),  # Azure AD returns it as a string
+                "access_token": f"mock-token-{mock.count('tokens_issued')}",
+            })
+            return
+        if "/chat/completions" not in self.path:
+            self._send_json(404, {"error": {"code": "DeploymentNotFound"}})
+            return
+        mock.count("chat_requests")
+        if not (self.headers.get("Authorization") or "").startswith("Bearer mock-token-"):
+            mock.count("unauthorized")
+            self._send_json(401, {"error": {"code": "401", "message": "Access denied due to invalid token."}})
+            return
+        request = json.loads(body or b"{}")
+        prompt_chars = sum(len(message.get("content") or "") for message in request.get("messages", []))
+        retry_after = mock.should_throttle(prompt_chars // 4 + mock.completion_tokens)
+        if retry_after is not None:
+            mock.count("throttled")
+            self._send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded."}}, {
+                "Retry-After": str(max(1, round(retry_after))),
+                "retry-after-ms": str(int(retry_after * 1000)),
+            })
+            return
+        mock.count("tokens", prompt_chars // 4 + mock.completion_tokens)
+        usage = {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": mock.completion_tokens,
+            "total_tokens": prompt_chars // 4 + mock.completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": mock.cached_prefix_tokens(request.get("messages", []))},
+        }
+        words = [f"word{i} " for i in range(mock.completion_tokens)]
+        time.sleep(mock.latency + random.uniform(0, mock.jitter))
+        if request.get("stream"):
+            self._stream(words, usage, request)
+        else:
+            time.sleep(mock.token_delay * len(words))
+            self._send_json(200, {
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(words)}}],
+                "usage": usage,
+            })
+
+    def _stream(self, words, usage, request):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        # Azure starts with a chunk that only carries prompt filter results
+        send_event(json.dumps({"choices": [], "prompt_filter_results": []}))
+        for word in words:
+            send_event(json.dumps({"choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}))
+            time.sleep(self.server.mock.token_delay)
+        send_event(json.dumps({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send_event(json.dumps({"choices": [], "usage": usage}))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+# Class to run the mock endpoints on a background thread
+class MockAzureServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, jitter=0.0, token_delay=0.005,
+                 completion_tokens=40, throttle_rate=0.0, rpm_limit=None, tpm_limit=None, retry_after=1.0,
+                 token_lifetime=3600):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.completion_tokens = completion_tokens
+        self.throttle_rate = throttle_rate
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.retry_after = retry_after
+        self.token_lifetime = token_lifetime
+        self._counters = {}
+        self._recent = deque()  # Times of accepted requests in the last minute (rpm_limit)
+        self._tokens = float(tpm_limit or 0)  # Token bucket (tpm_limit)
+        self._tokens_updated = time.monotonic()
+        self._prefixes = set()  # Hashes of the system messages sent so far (prompt caching)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), MockAzureHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/token"
+
+    @property
+    def api_base(self):
+        return f"{self.url}/openai"
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            return self._counters[name]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def should_throttle(self, tokens=0):
+        """Return the Retry-After seconds of a rejected request, None if it is accepted."""
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            return self.retry_after
+        with self._lock:
+            if self.rpm_limit:
+                now = time.time()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm_limit:
+                    return self.retry_after
+            if self.tpm_limit:
+                now = time.monotonic()
+                self._tokens = min(self.tpm_limit, self._tokens + (now - self._tokens_updated) * self.tpm_limit / 60)
+                self._tokens_updated = now
+                if self._tokens < tokens:
+                    return (min(tokens, self.tpm_limit) - self._tokens) * 60 / self.tpm_limit
+                self._tokens -= tokens
+            if self.rpm_limit:
+                self._recent.append(time.time())
+            return None
+
+    def cached_prefix_tokens(self, messages):
+        """Tokens of the system message if the same one was sent before and is long enough to be cached."""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        content = messages[0].get("content") or ""
+        tokens = len(content) // 4
+        if tokens < 1024:
+            return 0
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key not in self._prefixes:
+                self._prefixes.add(key)
+                return 0
+        self.count("cached_prefix_hits")
+        return tokens // 128 * 128
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds per streamed token")
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--rpm-limit", type=int, default=None, help="requests per minute before 429")
+    parser.add_argument("--tpm-limit", type=int, default=None, help="tokens per minute before 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--token-lifetime", type=int, default=3600)
+    args = parser.parse_args()
+    server = MockAzureServer(
+        port=args.port, latency=args.latency, jitter=args.jitter, token_delay=args.token_delay,
+        completion_tokens=args.completion_tokens, throttle_rate=args.throttle_rate, rpm_limit=args.rpm_limit,
+        tpm_limit=args.tpm_limit, retry_after=args.retry_after, token_lifetime=args.token_lifetime
+    )
+    print(f"Mock Azure endpoints on {server.url}: TOKEN_URL={server.token_url} OPENAI_API_BASE={server.api_base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
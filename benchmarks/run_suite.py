@@ -0,0 +1,317 @@
+"""Offline benchmark suite: synthetic decks, a mock Azure endpoint and both app flows.
+
+Usage:
+    python benchmarks/run_suite.py [--decks 3] [--slides 50] [--turns 3] [--latency 0.2]
+                                   [--throttle-rate 0.0] [--skip-streamlit]
+                                   [--output results.json] [--compare previous.json]
+
+Generates decks with benchmarks/synthetic_decks.py into a temporary PPTCHAT_HOME, starts
+benchmarks/mock_azure.py and runs each stage in its own subprocess so its peak RSS is isolated:
+- extraction: slides/s and files/s of extract_text_with_metadata_from_ppt
+- serialization: JSON dump/load and compact serializer cost, prompt tokens per format
+- cli_flow: main.py driven with scripted input (ingest one deck, then chat turns)
+- streamlit_flow: main_st.py driven headlessly with AppTest (upload, Set, chat turns)
+The results are printed (and written to --output) as JSON; --compare prints the relative change
+of every numeric metric against an earlier results file. Peak RSS needs the resource module
+(Linux/macOS).
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REPO_FOLDER = os.path.dirname(BENCHMARKS_FOLDER)
+sys.path.insert(0, REPO_FOLDER)
+sys.path.insert(0, BENCHMARKS_FOLDER)
+
+STAGES = ["extraction", "serialization", "cli_flow", "streamlit_flow"]
+
+QUESTIONS = [
+    "Summarize the roadmap slide",
+    "What are the KPIs?",
+    "Which slides mention the budget?",
+    "List the risks in this deck",
+]
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def summarize_seconds(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean_s": round(sum(ordered) / len(ordered), 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "max_s": round(ordered[-1], 4),
+    }
+
+def list_decks(home):
+    ppt_folder = os.path.join(home, "ppt")
+    return [os.path.join(ppt_folder, f) for f in sorted(os.listdir(ppt_folder))]
+
+def stage_extraction(home, args):
+    from ppt_extraction import extract_text_with_metadata_from_ppt
+    slides = 0
+    start = time.perf_counter()
+    for ppt_path in list_decks(home):
+        slides += len(extract_text_with_metadata_from_ppt(ppt_path))
+    seconds = time.perf_counter() - start
+    return {"files": len(list_decks(home)), "slides": slides, "seconds": round(seconds, 3),
+            "files_per_s": round(len(list_decks(home)) / seconds, 2), "slides_per_s": round(slides / seconds, 1)}
+
+def stage_serialization(home, args):
+    from ppt_extraction import extract_text_with_metadata_from_ppt
+    from prompt_serializer import serialize_slides
+    from context_window import estimate_tokens
+    records = []
+    for ppt_path in list_decks(home):
+        records.extend(extract_text_with_metadata_from_ppt(ppt_path))
+
+    def timed(function):
+        start = time.perf_counter()
+        result = function()
+        return result, round((time.perf_counter() - start) * 1000, 3)
+
+    indented, indent_ms = timed(lambda: json.dumps(records, indent=4, ensure_ascii=False))
+    minified, minify_ms = timed(lambda: json.dumps(records, ensure_ascii=False, separators=(",", ":")))
+    _, load_ms = timed(lambda: json.loads(indented))
+    compact, compact_ms = timed(lambda: serialize_slides(records))
+    return {
+        "slides": len(records),
+        "json_indent_dump_ms": indent_ms,
+        "json_minified_dump_ms": minify_ms,
+        "json_load_ms": load_ms,
+        "compact_serialize_ms": compact_ms,
+        "json_indent_tokens": estimate_tokens(indented),
+        "json_minified_tokens": estimate_tokens(minified),
+        "compact_tokens": estimate_tokens(compact),
+    }
+
+# Class to feed scripted answers to input() and time the work between two prompts
+class ScriptedInput:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.returned_at = []  # (answer, time it was returned)
+        self.called_at = []
+
+    def __call__(self, prompt=""):
+        self.called_at.append(time.perf_counter())
+        answer = self.answers.pop(0)
+        self.returned_at.append((answer, time.perf_counter()))
+        return answer
+
+    def elapsed_after(self, index):
+        """Seconds between returning answer `index` and the next input() call."""
+        return self.called_at[index + 1] - self.returned_at[index][1]
+
+def stage_cli_flow(home, args):
+    import builtins
+    import main
+    questions = [QUESTIONS[turn % len(QUESTIONS)] for turn in range(args.turns)]
+    # Option 1 (new ppt file), deck 1, the questions, leave the chat, exit
+    scripted = ScriptedInput(["1", "1"] + questions + ["exit", "4"])
+    metrics = []
+    prompt_tokens = []
+    stream_request = main.OpenAITextGenerator.stream_request
+    build_messages = main.ContextWindow.build_messages
+
+    def recording_stream_request(generator, *call_args, **kwargs):
+        yield from stream_request(generator, *call_args, **kwargs)
+        metrics.append(dict(generator.last_metrics))
+
+    def recording_build_messages(context_window):
+        messages = build_messages(context_window)
+        prompt_tokens.append(context_window.last_prompt_tokens)
+        return messages
+
+    main.OpenAITextGenerator.stream_request = recording_stream_request
+    main.ContextWindow.build_messages = recording_build_messages
+    builtins.input = scripted
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        main.main()
+    turn_seconds = [scripted.elapsed_after(2 + turn) for turn in range(len(questions))]
+    first_token = [m["time_to_first_token"] for m in metrics if m.get("time_to_first_token") is not None]
+    return {
+        "ingest_s": round(scripted.elapsed_after(1), 3),
+        "turns": len(turn_seconds),
+        "turn_latency": summarize_seconds(turn_seconds),
+        "time_to_first_token": summarize_seconds(first_token),
+        "prompt_tokens": max(prompt_tokens) if prompt_tokens else None,
+        "http_retries": main.get_http_client().total_retries,
+    }
+
+# Stand-in for streamlit's UploadedFile (AppTest cannot drive st.file_uploader)
+class FakeUploadedFile:
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.file_id = "benchmark-upload"
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+    def getvalue(self):
+        return self._data
+
+def stage_streamlit_flow(home, args):
+    import streamlit
+    from streamlit.testing.v1 import AppTest
+    upload = FakeUploadedFile(list_decks(home)[0])
+    streamlit.file_uploader = lambda *call_args, **kwargs: upload
+    app = AppTest.from_file(os.path.join(REPO_FOLDER, "main_st.py"), default_timeout=600)
+
+    def timed_run(action):
+        start = time.perf_counter()
+        action()
+        if app.exception:
+            raise RuntimeError(app.exception)
+        return time.perf_counter() - start
+
+    first_run_seconds = timed_run(app.run)
+    set_seconds = timed_run(lambda: app.sidebar.button[0].click().run())
+    turn_seconds = []
+    first_token = []
+    for turn in range(args.turns):
+        turn_seconds.append(timed_run(lambda: app.chat_input[0].set_value(QUESTIONS[turn % len(QUESTIONS)]).run()))
+        # The app reports "Prompt: ~N tokens | First token: Xs | Total: Ys" under each reply
+        caption = app.caption[-1].value if len(app.caption) else ""
+        match = re.search(r"First token: ([\d.]+)s", caption)
+        if match:
+            first_token.append(float(match.group(1)))
+    tokens = re.search(r"Prompt: ~(\d+) tokens", app.caption[-1].value) if len(app.caption) else None
+    return {
+        "first_run_with_upload_s": round(first_run_seconds, 3),
+        "set_deck_s": round(set_seconds, 3),
+        "turns": len(turn_seconds),
+        "turn_latency": summarize_seconds(turn_seconds),
+        "time_to_first_token": summarize_seconds(first_token),
+        "prompt_tokens": int(tokens.group(1)) if tokens else None,
+    }
+
+def run_stage(stage, home, args):
+    """Run one stage in this process and print its result as one JSON line."""
+    os.chdir(home)
+    start = time.perf_counter()
+    result = globals()[f"stage_{stage}"](home, args)
+    result["wall_s"] = round(time.perf_counter() - start, 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+def flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+    return out
+
+def compare(previous, current):
+    """Return {metric: {"before", "after", "change"}} for the numeric metrics of both runs."""
+    before = flatten("", previous.get("stages", {}), {})
+    after = flatten("", current.get("stages", {}), {})
+    return {
+        key: {"before": before[key], "after": after[key],
+              "change": round(after[key] / before[key] - 1, 3) if before[key] else None}
+        for key in sorted(before.keys() & after.keys())
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_FOLDER, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decks", type=int, default=3)
+    parser.add_argument("--slides", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="mock seconds per streamed token")
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of mock requests answered with 429")
+    parser.add_argument("--skip-streamlit", action="store_true")
+    parser.add_argument("--output", help="also write the results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--home", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args.stage, args.home, args)
+        return
+
+    from synthetic_decks import build_decks
+    from mock_azure import MockAzureServer
+
+    stages = [stage for stage in STAGES if not (args.skip_streamlit and stage == "streamlit_flow")]
+    home = tempfile.mkdtemp(prefix="pptchat_bench_")
+    try:
+        build_decks(os.path.join(home, "ppt"), args.decks, args.slides)
+        os.makedirs(os.path.join(home, "system_prompt"))
+        shutil.copy(os.path.join(REPO_FOLDER, "system_prompt", "pre_paper_prompt.txt"),
+                    os.path.join(home, "system_prompt", "pre_paper_prompt.txt"))
+        with MockAzureServer(latency=args.latency, token_delay=args.token_delay,
+                             completion_tokens=args.completion_tokens, throttle_rate=args.throttle_rate,
+                             retry_after=0.2) as server:
+            env = dict(os.environ)
+            env.update({
+                "PPTCHAT_HOME": home,
+                "TOKEN_URL": server.token_url,
+                "OPENAI_API_BASE": server.api_base,
+                "TENANT_ID": "mock-tenant", "CLIENT_ID": "mock-client", "CLIENT_SECRET": "mock-secret",
+                "RESOURCE": "https://cognitiveservices.azure.com/",
+                "DEPLOYMENT_NAME": "mock-deployment", "SUBSCRIPTION_KEY": "mock-key",
+                # Measure real round trips with the defaults, whatever the local .env says
+                "CONTEXT_MODE": "full", "PROMPT_FORMAT": "compact", "RESPONSE_CACHE": "0",
+                "EMBEDDING_DEPLOYMENT": "",
+            })
+            results = {}
+            for stage in stages:
+                before = server.stats()
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--stage", stage, "--home", home,
+                     "--turns", str(args.turns)],
+                    env=env, check=True, capture_output=True, text=True
+                ).stdout
+                results[stage] = json.loads(output.strip().splitlines()[-1])
+                after = server.stats()
+                requests_made = {key: after[key] - before.get(key, 0) for key in after if after[key] != before.get(key, 0)}
+                if requests_made:
+                    results[stage]["mock_requests"] = requests_made
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "compare", "stage", "home")},
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Generate synthetic PowerPoint decks with python-pptx.
+
+Usage:
+    python benchmarks/synthetic_decks.py <output_folder> [--decks 5] [--slides 50] [--seed 0]
+
+Every slide has a title, a bullet placeholder, a free text box, a footer and a page number;
+every third slide adds a table and every fourth a group of text boxes. All slides have notes.
+"""
+import os
+import random
+import argparse
+from pptx import Presentation
+from pptx.util import Inches
+
+WORDS = ("revenue growth roadmap launch budget kpi hiring churn margin cloud security agenda "
+         "partner pipeline forecast region quarter customer platform release migration risk").split()
+
+def sentence(rng, words=8):
+    return " ".join(rng.choices(WORDS, k=words))
+
+def add_textbox(shapes, text, left, top, width=9.0, height=0.4):
+    shapes.add_textbox(Inches(left), Inches(top), Inches(width), Inches(height)).text_frame.text = text
+
+def build_deck(path, slides, rng=None):
+    """Write a deck with `slides` slides to path and return the number of text-bearing shapes."""
+    rng = rng or random.Random(0)
+    presentation = Presentation()
+    shape_count = 0
+    for number in range(1, slides + 1):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = sentence(rng, 4).capitalize()
+        slide.placeholders[1].text = "\n".join(sentence(rng) for _ in range(rng.randint(3, 6)))
+        add_textbox(slide.shapes, sentence(rng, 12), 0.5, 5.6)
+        add_textbox(slide.shapes, "Confidential - for internal use only", 0.5, 6.6)
+        add_textbox(slide.shapes, str(number), 9.0, 6.9, width=0.6)
+        shape_count += 5
+        if number % 3 == 0:
+            table = slide.shapes.add_table(4, 3, Inches(0.5), Inches(3.5), Inches(6), Inches(1.5)).table
+            for row in range(4):
+                for column in range(3):
+                    table.cell(row, column).text = sentence(rng, 2) if row else f"Column {column + 1}"
+            shape_count += 1
+        if number % 4 == 0:
+            group = slide.shapes.add_group_shape()
+            for position in range(3):
+                add_textbox(group.shapes, sentence(rng, 5), 6.5, 1.5 + position * 0.5, width=3.0)
+            shape_count += 1
+        slide.notes_slide.notes_text_frame.text = sentence(rng, 20)
+    presentation.save(path)
+    return shape_count
+
+def build_decks(folder, decks, slides, seed=0):
+    """Write `decks` decks named synthetic_deck_<n>.pptx into folder and return their paths."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for deck_number in range(1, decks + 1):
+        path = os.path.join(folder, f"synthetic_deck_{deck_number:03d}.pptx")
+        build_deck(path, slides, rng)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_folder")
+    parser.add_argument("--decks", type=int, default=5)
+    parser.add_argument("--slides", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    paths = build_decks(args.output_folder, args.decks, args.slides, args.seed)
+    print(f"Wrote {len(paths)} deck(s) with {args.slides} slide(s) each to {args.output_folder}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import os
+import re
+import json
+import math
+import hashlib
+from collections import Counter, defaultdict
+from file_utils import atomic_write_json
+
+# Folder (inside ppt_json) where the per-deck indexes are stored
+INDEX_FOLDER_NAME = "bm25_index"
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]")
+
+# Function to split text into index terms
+def tokenize(text):
+    """Lowercase words for alphabetic scripts and character bigrams for CJK runs (no spaces to split on)."""
+    terms = []
+    for word in _WORD_PATTERN.findall((text or "").lower()):
+        if _CJK_PATTERN.match(word):
+            if len(word) == 1:
+                terms.append(word)
+            else:
+                terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+# Function to get the index terms of a slide record
+def slide_terms(record):
+    """Index title, text and note; the title is counted twice so it weighs more."""
+    title = record.get("title", "")
+    return tokenize(title) * 2 + tokenize(record.get("text", "")) + tokenize(record.get("note", ""))
+
+# Class to handle BM25 retrieval over slide records
+class BM25Index:
+    """Inverted index over slide records scored with Okapi BM25."""
+
+    def __init__(self, records, postings, doc_lengths, k1=1.5, b=0.75):
+        self.records = records
+        self.postings = postings  # term -> {doc_id: term frequency}
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, records):
+        """Build an index from the records returned by extract_text_with_metadata_from_ppt."""
+        postings = defaultdict(dict)
+        doc_lengths = []
+        for doc_id, record in enumerate(records):
+            terms = slide_terms(record)
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term][doc_id] = tf
+        return cls(records, dict(postings), doc_lengths)
+
+    @classmethod
+    def merge(cls, indexes):
+        """Combine several deck indexes into one (used for "All JSON files")."""
+        records = []
+        postings = defaultdict(dict)
+        doc_lengths = []
+        for index in indexes:
+            offset = len(records)
+            records.extend(index.records)
+            doc_lengths.extend(index.doc_lengths)
+            for term, docs in index.postings.items():
+                target = postings[term]
+                for doc_id, tf in docs.items():
+                    target[doc_id + offset] = tf
+        return cls(records, dict(postings), doc_lengths)
+
+    def search(self, query, top_k=5):
+        """Return the top_k (score, record) pairs for the query, best first."""
+        n_docs = len(self.records)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avg_doc_length or 1)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(score, self.records[doc_id]) for doc_id, score in ranked]
+
+    def to_dict(self, source_hash):
+        return {
+            "source_hash": source_hash,
+            "doc_lengths": self.doc_lengths,
+            "postings": {term: [[doc_id, tf] for doc_id, tf in docs.items()] for term, docs in self.postings.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data, records):
+        postings = {term: {doc_id: tf for doc_id, tf in docs} for term, docs in data["postings"].items()}
+        return cls(records, postings, data["doc_lengths"])
+
+# Function to get the index file path for a deck JSON file
+def get_index_path(json_path):
+    folder, json_filename = os.path.split(json_path)
+    return os.path.join(folder, INDEX_FOLDER_NAME, json_filename)
+
+# Function to build and save the index for a deck JSON file
+def build_and_save_index(json_path, records=None):
+    """Build the BM25 index of a deck and persist it next to the deck JSON."""
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    if records is None:
+        records = json.loads(raw.decode("utf-8"))
+    index = BM25Index.build(records)
+    atomic_write_json(get_index_path(json_path), index.to_dict(hashlib.sha1(raw).hexdigest()), indent=None)
+    return index
+
+# Function to load the index of a deck JSON file, rebuilding it if it is missing or stale
+def load_or_build_index(json_path):
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    records = json.loads(raw.decode("utf-8"))
+    index_path = get_index_path(json_path)
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("source_hash") == hashlib.sha1(raw).hexdigest():
+            return BM25Index.from_dict(data, records)
+    return build_and_save_index(json_path, records)
+
+# Function to pick the slides relevant to a question
+def retrieve_slides(index, query, top_k=5):
+    """Return the top_k matching slide records in deck/slide order."""
+    hits = [record for _, record in index.search(query, top_k)]
+    hits.sort(key=lambda record: (record.get("file_name", ""), record.get("slide_number", 0)))
+    return hits
@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from file_utils import atomic_write_json
+from context_window import estimate_tokens
+from corpus_store import get_corpus_store, sync_corpus_from_json_folder
+from dedup_index import collapse_duplicates, get_dedup_index, get_dedup_threshold
+from prompt_serializer import format_context
+from session_store import hash_text
+from tracing import span, annotate
+
+# Bump when the layout of the system message changes so bundles built by older versions are not reused
+BUNDLE_VERSION = 2
+
+# Function to order the decks of a context independently of the directory listing
+def sort_deck_paths(deck_json_paths):
+    return sorted(deck_json_paths, key=lambda path: (os.path.basename(path), path))
+
+# Function to identify the current version of a deck JSON file without reading it
+def deck_fingerprint(json_path):
+    stat = os.stat(json_path)
+    return {"json_file": os.path.basename(json_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+# Function to serialize the slides of one or more decks for the system message
+def build_deck_context(deck_json_paths, prompt_format, dedup_threshold=None):
+    """One deck is read from its JSON file; several are streamed from the corpus store in file name order.
+
+    With a dedup_threshold, near-duplicate slides of several decks are collapsed into one slide each.
+    """
+    if len(deck_json_paths) == 1:
+        with span("json_load"):
+            with open(deck_json_paths[0], "r", encoding="utf-8") as f:
+                slides_data = json.load(f)
+        with span("format_context"):
+            return format_context(slides_data, prompt_format)
+    ppt_json_folder = os.path.dirname(deck_json_paths[0])
+    json_files = [os.path.basename(path) for path in deck_json_paths]
+    with span("json_load", source="corpus"):
+        sync_corpus_from_json_folder(ppt_json_folder, json_files)
+        corpus_store = get_corpus_store(ppt_json_folder)
+        if dedup_threshold is None:
+            if prompt_format == "json":
+                return corpus_store.read_text(json_files=json_files)
+            return format_context(corpus_store.iter_records(json_files=json_files), prompt_format)
+        records = list(corpus_store.iter_records(json_files=json_files))
+    slides = len(records)
+    with span("dedup_slides", slides=slides):
+        records, clusters = collapse_duplicates(records, get_dedup_index(ppt_json_folder), dedup_threshold)
+        annotate(deduped_slides=slides - len(records), dedup_clusters=clusters)
+    with span("format_context"):
+        if prompt_format == "json":
+            # Same minified layout as corpus_store.read_text
+            return json.dumps(records, ensure_ascii=False, separators=(",", ":"))
+        return format_context(records, prompt_format)
+
+# Class to reuse the system message of a prompt version and deck set across sessions and processes
+class ContextBundleStore:
+    """System messages (pre-paper prompt + deck context) built once per prompt version, deck set and format.
+
+    The decks are always serialized in file name order, so the same inputs give a byte-identical
+    prompt prefix in every session, which is what server-side prompt caching needs. The bundle key
+    hashes the prompt, the format, the dedup threshold and the name, size and mtime of each deck JSON file, so a bundle
+    is only rebuilt when one of them changes. Bundles are kept in memory and as <key>.json files
+    shared by every process, with the content hash and token count of the system message; the
+    least recently used files beyond max_files are deleted.
+    """
+
+    def __init__(self, folder, max_memory_entries=8, max_files=64):
+        self.folder = folder
+        self.max_memory_entries = max_memory_entries
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "builds": 0}
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def bundle_key(self, pre_paper_prompt, deck_json_paths, prompt_format):
+        inputs = {
+            "version": BUNDLE_VERSION,
+            "prompt_hash": hash_text(pre_paper_prompt),
+            "prompt_format": prompt_format,
+            "decks": [deck_fingerprint(path) for path in sort_deck_paths(deck_json_paths)],
+            "dedup_threshold": get_dedup_threshold() if len(deck_json_paths) > 1 else None,
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()[:32], inputs
+
+    def get(self, pre_paper_prompt, deck_json_paths, prompt_format):
+        """Return the bundle of the decks: system_message, content_hash, tokens, decks and source.
+
+        source is "memory", "disk" or "built"; deck_paths lists the decks in the order they were serialized.
+        """
+        key, inputs = self.bundle_key(pre_paper_prompt, deck_json_paths, prompt_format)
+        deck_paths = sort_deck_paths(deck_json_paths)
+        with self._lock:
+            bundle = self._memory.get(key)
+            if bundle is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return {**bundle, "deck_paths": deck_paths, "source": "memory"}
+
+        bundle = self._read(key)
+        source = "disk"
+        if bundle is None:
+            with span("build_context_bundle", decks=len(deck_paths)):
+                system_message = pre_paper_prompt + "\n\n" + build_deck_context(deck_paths, prompt_format, inputs["dedup_threshold"])
+            bundle = {
+                **inputs,
+                "key": key,
+                "built": datetime.now().isoformat(timespec="seconds"),
+                "content_hash": hash_text(system_message),
+                "tokens": estimate_tokens(system_message),
+                "system_message": system_message,
+            }
+            atomic_write_json(self._path(key), bundle, indent=None)
+            self._prune()
+            source = "built"
+        with self._lock:
+            self._stats["disk_hits" if source == "disk" else "builds"] += 1
+            self._memory[key] = bundle
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+        return {**bundle, "deck_paths": deck_paths, "source": source}
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                bundle = json.load(f)
+        except (OSError, ValueError):
+            return None  # Missing, or cut off by a crash: rebuilt
+        if bundle.get("key") != key or hash_text(bundle.get("system_message")) != bundle.get("content_hash"):
+            return None
+        os.utime(path)  # Recently used bundles survive pruning
+        return bundle
+
+    def _prune(self):
+        files = []
+        for file_name in os.listdir(self.folder):
+            if file_name.endswith(".json"):
+                path = os.path.join(self.folder, file_name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue  # Pruned by another process
+        for _, path in sorted(files)[:max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+# Function to create the bundle store configured in the environment
+def get_context_bundle_store(folder):
+    """CONTEXT_BUNDLE_FILES caps the bundles kept on disk."""
+    return ContextBundleStore(folder, max_files=int(os.getenv("CONTEXT_BUNDLE_FILES", "64")))
@@ -0,0 +1,85 @@
+import os
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Function to estimate the number of tokens in a text
+def estimate_tokens(text):
+    """Estimate tokens without a tokenizer: ~4 ASCII characters per token, one token per other character."""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+# Function to estimate the number of tokens in a message list
+def count_message_tokens(messages):
+    """Estimate the prompt size of a chat completions message list."""
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages) + 2
+
+# Class to keep the prompt within a token budget
+class ContextWindow:
+    """Keep the system prefix and the most recent turns, rolling older turns into a running summary."""
+
+    def __init__(self, system_message, max_tokens=None, summarizer=None):
+        self.system_message = system_message
+        self.max_tokens = max_tokens or int(os.getenv("CONTEXT_MAX_TOKENS", "100000"))
+        # summarizer(previous_summary, turns) -> new summary text; without one old turns are dropped
+        self.summarizer = summarizer
+        self.summary = ""
+        self.turns = []
+        self.last_prompt_tokens = 0
+
+    def add_message(self, role, content):
+        self.turns.append({"role": role, "content": content})
+
+    def discard_last_message(self):
+        """Drop the latest message, e.g. a question whose request failed."""
+        if self.turns:
+            self.turns.pop()
+
+    def build_messages(self):
+        """Return the message list for the next request, trimmed to the token budget."""
+        fixed_messages = self._prefix_messages()
+        budget = self.max_tokens - count_message_tokens(fixed_messages)
+        cut = len(self.turns)
+        used = 0
+        while cut > 0:
+            cost = estimate_tokens(self.turns[cut - 1]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            # Always keep the latest message, even if it alone exceeds the budget
+            if used + cost > budget and cut < len(self.turns):
+                break
+            used += cost
+            cut -= 1
+        # Start the kept window on a user message so question/answer pairs stay together
+        while cut < len(self.turns) - 1 and self.turns[cut]["role"] != "user":
+            cut += 1
+        if cut > 0:
+            overflow, self.turns = self.turns[:cut], self.turns[cut:]
+            if self.summarizer:
+                self.summary = self.summarizer(self.summary, overflow) or self.summary
+        messages = self._prefix_messages() + self.turns
+        self.last_prompt_tokens = count_message_tokens(messages)
+        return messages
+
+    def _prefix_messages(self):
+        messages = [{"role": "system", "content": self.system_message}]
+        if self.summary:
+            # Kept as a separate message so the deck prefix stays identical between turns
+            messages.append({"role": "system", "content": "Summary of the earlier conversation:\n" + self.summary})
+        return messages
+
+# Function to build a summarizer that uses the chat completions endpoint
+def make_summarizer(send_request, max_summary_tokens=500):
+    """Return a summarizer that condenses dropped turns with one extra request."""
+    def summarize(previous_summary, turns):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+        messages = [
+            {"role": "system", "content": (
+                "Condense the conversation below into a short summary that keeps every fact, "
+                "file name and slide number the user may refer to later. "
+                f"Use at most {max_summary_tokens} tokens."
+            )},
+            {"role": "user", "content": f"Previous summary:\n{previous_summary}\n\nNew turns:\n{transcript}"}
+        ]
+        return send_request(messages)
+    return summarize
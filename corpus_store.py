@@ -0,0 +1,206 @@
+import os
+import json
+from file_utils import FileLock, atomic_write_json
+
+# Folder (inside ppt_json) where the slide corpus is stored
+CORPUS_FOLDER_NAME = "corpus"
+
+# Compact the data file once more than this share of it belongs to replaced or deleted decks
+GARBAGE_RATIO = 0.5
+
+# Decks imported per index write during a migration
+SYNC_BATCH_DECKS = 100
+
+# Function to serialize a slide record as one minified JSONL line
+def encode_record(record):
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+# Class to handle the append-only slide corpus
+class CorpusStore:
+    """Minified slide records in one append-only JSONL file with a byte-offset index.
+
+    Files in the corpus folder:
+    - slides-<generation>.jsonl: one record per line; every deck is one contiguous segment
+    - index.json: deck JSON file name -> file_name, segment offset/length and the offset of
+      each slide inside the segment; rewritten atomically after every append
+
+    Reads seek straight to the selected decks and only parse the lines that pass the filters.
+    read_text() joins the raw lines into a JSON array, so the prompt is built without parsing.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.index_path = os.path.join(folder, "index.json")
+        self.lock_path = os.path.join(folder, ".lock")
+
+    def load_index(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"data_file": "slides-0.jsonl", "generation": 0, "garbage_bytes": 0, "decks": {}}
+
+    def write_deck(self, json_file, slides_data, source_mtime=None):
+        """Append a deck, replacing the previous version of it (safe across processes)."""
+        self.write_decks([(json_file, slides_data, source_mtime)])
+
+    def write_decks(self, decks):
+        """Append several (json_file, slides_data, source_mtime) decks with one index write."""
+        with FileLock(self.lock_path):
+            index = self.load_index()
+            with open(os.path.join(self.folder, index["data_file"]), "ab") as f:
+                f.seek(0, os.SEEK_END)
+                for json_file, slides_data, source_mtime in decks:
+                    lines = [encode_record(record) for record in slides_data]
+                    slide_offsets = []
+                    length = 0
+                    for record, line in zip(slides_data, lines):
+                        slide_offsets.append([record.get("slide_number"), length])
+                        length += len(line)
+                    offset = f.tell()
+                    f.write(b"".join(lines))
+                    old_entry = index["decks"].get(json_file)
+                    if old_entry:
+                        index["garbage_bytes"] += old_entry["length"]
+                    index["decks"][json_file] = {
+                        "file_name": slides_data[0].get("file_name") if slides_data else None,
+                        "offset": offset,
+                        "length": length,
+                        "slides": slide_offsets,
+                        "source_mtime": source_mtime,
+                    }
+                f.flush()
+                os.fsync(f.fileno())
+            self._save_index(index)
+
+    def delete_deck(self, json_file):
+        with FileLock(self.lock_path):
+            index = self.load_index()
+            old_entry = index["decks"].pop(json_file, None)
+            if old_entry is None:
+                return
+            index["garbage_bytes"] += old_entry["length"]
+            self._save_index(index)
+
+    def _save_index(self, index):
+        # Bytes past the indexed segments (an interrupted append) are never read
+        live_bytes = sum(entry["length"] for entry in index["decks"].values())
+        if index["garbage_bytes"] > GARBAGE_RATIO * (live_bytes + index["garbage_bytes"]):
+            index = self._compact(index)
+        atomic_write_json(self.index_path, index, indent=None)
+
+    def _compact(self, index):
+        """Copy the live decks into a new data file; readers holding the old index keep the old file."""
+        old_path = os.path.join(self.folder, index["data_file"])
+        generation = index["generation"] + 1
+        data_file = f"slides-{generation}.jsonl"
+        decks = {}
+        with open(old_path, "rb") as source, open(os.path.join(self.folder, data_file), "wb") as target:
+            for json_file in sorted(index["decks"]):
+                entry = dict(index["decks"][json_file])
+                source.seek(entry["offset"])
+                entry["offset"] = target.tell()
+                target.write(source.read(entry["length"]))
+                decks[json_file] = entry
+            target.flush()
+            os.fsync(target.fileno())
+        compacted = {"data_file": data_file, "generation": generation, "garbage_bytes": 0, "decks": decks}
+        atomic_write_json(self.index_path, compacted, indent=None)
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass  # Still open in a reader on Windows; left behind as an unreferenced file
+        return compacted
+
+    def _select(self, index, file_names=None, json_files=None):
+        """Return the selected deck entries in JSON file name order."""
+        selected = []
+        for json_file in sorted(index["decks"]):
+            entry = index["decks"][json_file]
+            if json_files is not None and json_file not in json_files:
+                continue
+            if file_names is not None and entry["file_name"] not in file_names:
+                continue
+            selected.append(entry)
+        return selected
+
+    def _iter_segments(self, file_names=None, json_files=None):
+        index = self.load_index()
+        entries = self._select(index, file_names, json_files)
+        if not entries:
+            return
+        with open(os.path.join(self.folder, index["data_file"]), "rb") as f:
+            for entry in entries:
+                f.seek(entry["offset"])
+                yield entry, f.read(entry["length"])
+
+    def read_text(self, file_names=None, json_files=None):
+        """Return the selected decks as one minified JSON array, without parsing any record."""
+        # JSON strings never contain a raw newline, so newlines only separate records
+        segments = [segment.rstrip(b"\n").replace(b"\n", b",")
+                    for _, segment in self._iter_segments(file_names, json_files)]
+        return (b"[" + b",".join(segment for segment in segments if segment) + b"]").decode("utf-8")
+
+    def iter_records(self, columns=None, file_names=None, slide_range=None, json_files=None):
+        """Stream record dicts one deck at a time; lines outside slide_range are never parsed."""
+        for entry, segment in self._iter_segments(file_names, json_files):
+            offsets = entry["slides"]
+            for position, (slide_number, start) in enumerate(offsets):
+                if slide_range is not None and not slide_range[0] <= slide_number <= slide_range[1]:
+                    continue
+                end = offsets[position + 1][1] if position + 1 < len(offsets) else entry["length"]
+                record = json.loads(segment[start:end])
+                if columns is not None:
+                    record = {column: record.get(column) for column in columns}
+                yield record
+
+    def read_records(self, columns=None, file_names=None, slide_range=None, json_files=None):
+        """Read the matching slides as a list of record dicts, in deck/slide order."""
+        return list(self.iter_records(columns, file_names, slide_range, json_files))
+
+    def file_names(self):
+        return sorted({entry["file_name"] for entry in self.load_index()["decks"].values() if entry["file_name"]})
+
+# Function to get the corpus store of a ppt_json folder
+def get_corpus_store(ppt_json_folder):
+    return CorpusStore(os.path.join(ppt_json_folder, CORPUS_FOLDER_NAME))
+
+# Function to migrate deck JSON files into the corpus store
+def sync_corpus_from_json_folder(ppt_json_folder, json_files=None):
+    """Import deck JSON files that are missing from the store or changed since; returns the number imported."""
+    store = get_corpus_store(ppt_json_folder)
+    full_sync = json_files is None
+    if full_sync:
+        json_files = [f for f in os.listdir(ppt_json_folder) if f.lower().endswith(".json")]
+    known = store.load_index()["decks"]
+    batch = []
+    imported = 0
+    for json_file in json_files:
+        json_path = os.path.join(ppt_json_folder, json_file)
+        source_mtime = os.path.getmtime(json_path)
+        entry = known.get(json_file)
+        if entry is not None and entry["source_mtime"] == source_mtime:
+            continue
+        with open(json_path, "r", encoding="utf-8") as f:
+            batch.append((json_file, json.load(f), source_mtime))
+        imported += 1
+        if len(batch) >= SYNC_BATCH_DECKS:
+            store.write_decks(batch)
+            batch = []
+    if batch:
+        store.write_decks(batch)
+    if full_sync:
+        # A full sync also drops decks whose JSON file was deleted
+        for json_file in set(known) - set(json_files):
+            store.delete_deck(json_file)
+    return imported
+
+def main():
+    import sys
+    base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+    ppt_json_folder = sys.argv[1] if len(sys.argv) > 1 else os.path.join(base_folder, "ppt_json")
+    imported = sync_corpus_from_json_folder(ppt_json_folder)
+    store = get_corpus_store(ppt_json_folder)
+    print(f"Imported {imported} deck(s); the corpus store now holds {len(store.file_names())} deck(s) in {store.folder}")
+
+if __name__ == "__main__":
+    main()
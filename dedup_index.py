@@ -0,0 +1,382 @@
+import os
+import re
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+import numpy as np
+from file_utils import FileLock, atomic_write_json
+from manifest import deck_source
+from prompt_serializer import body_lines, format_context
+from context_window import estimate_tokens
+
+# Folder (inside ppt_json) where the near-duplicate index is stored
+INDEX_FOLDER_NAME = "dedup_index"
+
+# MinHash permutations per slide, split into LSH bands of NUM_PERM // LSH_BANDS rows;
+# with 16 bands of 8 rows, pairs above ~0.8 Jaccard similarity almost always share a band
+NUM_PERM = 128
+LSH_BANDS = 16
+
+# Slides are compared on sets of consecutive word triples
+SHINGLE_WORDS = 3
+
+# Bump when the row keys change so an index written by an older version is rebuilt
+INDEX_VERSION = 2
+
+# Deleted rows are dropped from the signature file once they outnumber the live ones
+COMPACT_MIN_DELETED = 1024
+
+# Shingles hashed per numpy block, so signature computation never materializes more than one block
+SIGNATURE_BLOCK_SHINGLES = 65536
+
+# Universal hashing h(x) = (a * x + b) mod p with a fixed seed, so signatures stay valid across runs
+_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20240917)
+_A = _random.randint(1, _PRIME, NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, _PRIME, NUM_PERM).astype(np.uint64)
+_BAND_MULTIPLIERS = _random.randint(1, _PRIME, NUM_PERM // LSH_BANDS).astype(np.uint64) * 2 + 1
+
+# Function to get the key of a slide in the index
+def slide_key(record):
+    return (deck_source(record), int(record["slide_number"]))
+
+# Function to get the words a slide is compared on
+def slide_words(record):
+    """Title, body lines (without the page number) and note, lower-cased; the link and position are ignored."""
+    title = record.get("title") or ""
+    if title == f"Slide {record.get('slide_number')}":
+        title = ""  # The extractor's placeholder for slides without a title
+    text = "\n".join([title] + body_lines(record) + [record.get("note") or ""])
+    return re.findall(r"\w+", text.lower())
+
+# Function to get the shingle set of a slide
+def slide_shingles(words):
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+# Function to identify the text a signature was computed from
+def words_digest(words):
+    return hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).hexdigest()
+
+# Function to compute the MinHash signatures of shingle sets
+def minhash_signatures(shingle_sets):
+    """Return a (len(shingle_sets), NUM_PERM) uint32 array; an empty set gets an all-max signature."""
+    signatures = np.full((len(shingle_sets), NUM_PERM), _PRIME, dtype=np.uint32)
+    start = 0
+    while start < len(shingle_sets):
+        # Group whole slides into a block of about SIGNATURE_BLOCK_SHINGLES shingles
+        end, block_shingles = start, 0
+        while end < len(shingle_sets) and (end == start or block_shingles + len(shingle_sets[end]) <= SIGNATURE_BLOCK_SHINGLES):
+            block_shingles += len(shingle_sets[end])
+            end += 1
+        rows = [row for row in range(start, end) if shingle_sets[row]]
+        if rows:
+            values = np.fromiter(
+                (zlib.crc32(shingle.encode("utf-8")) % _PRIME for row in rows for shingle in shingle_sets[row]),
+                dtype=np.uint64, count=sum(len(shingle_sets[row]) for row in rows)
+            )
+            hashed = (values[:, None] * _A + _B) % _PRIME
+            offsets = np.cumsum([0] + [len(shingle_sets[row]) for row in rows[:-1]])
+            signatures[rows] = np.minimum.reduceat(hashed, offsets, axis=0).astype(np.uint32)
+        start = end
+    return signatures
+
+# Function to group near-duplicate signatures with locality-sensitive hashing
+def cluster_signatures(signatures, valid, threshold):
+    """Return the cluster root of every row; rows join when their estimated Jaccard similarity >= threshold.
+
+    Each band hashes NUM_PERM // LSH_BANDS signature values; rows sharing a band bucket are compared with
+    the first row of the bucket, so the work stays linear in the number of rows.
+    """
+    parent = np.arange(len(signatures))
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    rows = np.flatnonzero(valid)
+    if len(rows) < 2:
+        return parent
+    band_rows = NUM_PERM // LSH_BANDS
+    for band in range(LSH_BANDS):
+        keys = (signatures[rows, band * band_rows:(band + 1) * band_rows].astype(np.uint64) * _BAND_MULTIPLIERS).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        # First position of the bucket of every sorted row
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        bucket_first = starts[np.searchsorted(starts, np.arange(len(order)), side="right") - 1]
+        candidates = np.flatnonzero(bucket_first != np.arange(len(order)))
+        if not len(candidates):
+            continue
+        firsts = rows[order[bucket_first[candidates]]]
+        others = rows[order[candidates]]
+        similarity = (signatures[firsts] == signatures[others]).mean(axis=1)
+        for first, other in zip(firsts[similarity >= threshold], others[similarity >= threshold]):
+            root_first, root_other = find(first), find(other)
+            if root_first != root_other:
+                parent[max(root_first, root_other)] = min(root_first, root_other)
+    return np.array([find(row) for row in range(len(signatures))])
+
+# Class to handle the MinHash signatures of the ingested slides
+class DedupIndex:
+    """Slide MinHash signatures in one uint32 file, appended to as decks are ingested.
+
+    Files in the index folder:
+    - signatures.u32: row-major signatures of NUM_PERM values (appended to in place)
+    - ids.json: deck sources (see deck_source), (deck index or -1 if deleted, slide number) per row
+      and the digest of the words each signature was computed from, so a stale row is recomputed
+      instead of trusted
+    - meta.json: version, number of permutations and row count; rows past the count are ignored
+    Writes take a lock file and re-read the side tables first, so ingest.py, the watcher and both
+    apps can update the index concurrently.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.signatures_path = os.path.join(folder, "signatures.u32")
+        self.ids_path = os.path.join(folder, "ids.json")
+        self.meta_path = os.path.join(folder, "meta.json")
+        self.lock_path = os.path.join(folder, ".lock")
+        self._loaded_mtime = None
+        self._load()
+
+    def _load(self):
+        self.count = 0
+        self.sources = []
+        self.rows = np.zeros((0, 2), dtype=np.int32)  # (deck index or -1 if deleted, slide number)
+        self.digests = []
+        self._signatures = None
+        self._loaded_mtime = os.path.getmtime(self.meta_path) if os.path.exists(self.meta_path) else None
+        if self._loaded_mtime is None:
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != INDEX_VERSION or meta.get("num_perm") != NUM_PERM:
+            return  # Built with other parameters: rebuilt from scratch as decks are added
+        with open(self.ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+        self.count = meta["count"]
+        self.sources = ids["decks"]
+        self.rows = np.asarray(ids["rows"], dtype=np.int32).reshape(-1, 2)[:self.count]
+        self.digests = ids["digests"][:self.count]
+
+    def _refresh(self):
+        """Reload the side tables if another process changed them."""
+        mtime = os.path.getmtime(self.meta_path) if os.path.exists(self.meta_path) else None
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def _get_signatures(self):
+        if self._signatures is None and self.count:
+            self._signatures = np.fromfile(self.signatures_path, dtype=np.uint32, count=self.count * NUM_PERM).reshape(self.count, NUM_PERM)
+        return self._signatures
+
+    def _save(self):
+        atomic_write_json(self.ids_path, {"decks": self.sources, "rows": self.rows.tolist(), "digests": self.digests}, indent=None)
+        atomic_write_json(self.meta_path, {"version": INDEX_VERSION, "num_perm": NUM_PERM, "count": self.count})
+        self._loaded_mtime = os.path.getmtime(self.meta_path)
+
+    def _live_rows(self):
+        """(deck source, slide number) -> row of the current signature of every indexed slide."""
+        return {(self.sources[deck_idx], int(slide_number)): row
+                for row, (deck_idx, slide_number) in enumerate(self.rows) if deck_idx >= 0}
+
+    def _mark_deleted(self, keys):
+        live = self._live_rows()
+        for key in keys:
+            if key in live:
+                self.rows[live[key], 0] = -1
+
+    def add_records(self, records):
+        """Compute the signatures of slide records and append them, replacing older rows of the same slides."""
+        if not records:
+            return
+        words = [slide_words(record) for record in records]
+        signatures = minhash_signatures([slide_shingles(slide) for slide in words])
+        with FileLock(self.lock_path):
+            self._refresh()
+            self._mark_deleted([slide_key(record) for record in records])
+            source_lookup = {source: idx for idx, source in enumerate(self.sources)}
+            new_rows = []
+            for record in records:
+                source = deck_source(record)
+                if source not in source_lookup:
+                    source_lookup[source] = len(self.sources)
+                    self.sources.append(source)
+                new_rows.append((source_lookup[source], record["slide_number"]))
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.signatures_path, "r+b" if os.path.exists(self.signatures_path) else "wb") as f:
+                # Overwrite any rows left behind by an interrupted append
+                f.seek(self.count * NUM_PERM * 4)
+                f.write(signatures.tobytes())
+                f.truncate()
+            self.rows = np.concatenate([self.rows, np.asarray(new_rows, dtype=np.int32)])
+            self.digests.extend(words_digest(slide) for slide in words)
+            self.count += len(records)
+            self._signatures = None
+            self._save()
+        self._compact_if_sparse()
+
+    def remove_deck(self, source):
+        """Mark every row of a deck (see deck_source_for_path) as deleted (reclaimed by compact())."""
+        with FileLock(self.lock_path):
+            self._refresh()
+            if source not in self.sources:
+                return
+            self.rows[self.rows[:, 0] == self.sources.index(source), 0] = -1
+            self._save()
+        self._compact_if_sparse()
+
+    def apply_delta(self, delta, source):
+        """Update only the slides in an ingestion delta (see manifest.diff_slides) of the deck at source."""
+        if delta["removed"]:
+            with FileLock(self.lock_path):
+                self._refresh()
+                self._mark_deleted([(source, number) for number in delta["removed"]])
+                self._save()
+        self.add_records(delta["changed"])
+
+    def compact(self):
+        """Rewrite the signature file without deleted rows."""
+        with FileLock(self.lock_path):
+            self._refresh()
+            keep = np.flatnonzero(self.rows[:, 0] >= 0)
+            if len(keep) == self.count:
+                return
+            signatures = self._get_signatures()[keep] if len(keep) else np.zeros((0, NUM_PERM), dtype=np.uint32)
+            tmp_path = self.signatures_path + ".tmp"
+            signatures.tofile(tmp_path)
+            os.replace(tmp_path, self.signatures_path)
+            self.rows = self.rows[keep]
+            self.digests = [self.digests[row] for row in keep]
+            self.count = len(keep)
+            self._signatures = None
+            self._save()
+
+    def _compact_if_sparse(self):
+        deleted = int((self.rows[:, 0] < 0).sum())
+        if deleted >= COMPACT_MIN_DELETED and deleted * 2 > self.count:
+            self.compact()
+
+    def signatures_for(self, records):
+        """Return the signatures of records in order; slides that are missing or changed are (re)indexed first.
+
+        Records sharing a key (e.g. JSON files without links) are signed on the fly and not stored,
+        so they never overwrite each other's row.
+        """
+        self._refresh()
+        keys = [slide_key(record) for record in records]
+        key_counts = {}
+        for key in keys:
+            key_counts[key] = key_counts.get(key, 0) + 1
+        live = self._live_rows()
+        stale = [record for record, key in zip(records, keys) if key_counts[key] == 1
+                 and (key not in live or self.digests[live[key]] != words_digest(slide_words(record)))]
+        if stale:
+            self.add_records(stale)
+            live = self._live_rows()
+        signatures = np.empty((len(records), NUM_PERM), dtype=np.uint32)
+        indexed = [row for row, key in enumerate(keys) if key_counts[key] == 1]
+        if indexed:
+            signatures[indexed] = self._get_signatures()[[live[keys[row]] for row in indexed]]
+        shared = [row for row, key in enumerate(keys) if key_counts[key] > 1]
+        if shared:
+            signatures[shared] = minhash_signatures([slide_shingles(slide_words(records[row])) for row in shared])
+        return signatures
+
+# Function to get the near-duplicate index folder for a ppt_json folder
+def get_index_folder(ppt_json_folder):
+    return os.path.join(ppt_json_folder, INDEX_FOLDER_NAME)
+
+# Function to open the near-duplicate index of a ppt_json folder
+def get_dedup_index(ppt_json_folder):
+    return DedupIndex(get_index_folder(ppt_json_folder))
+
+# Function to read the deduplication setting from the environment
+def get_dedup_threshold():
+    """Jaccard similarity above which slides are collapsed (DEDUP_THRESHOLD); None when DEDUP_SLIDES=0."""
+    if os.getenv("DEDUP_SLIDES", "1") == "0":
+        return None
+    return float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+# Function to collapse near-duplicate slides into one representative per cluster
+def collapse_duplicates(records, index=None, threshold=0.8):
+    """Return (records, clusters): each cluster keeps its first slide in the given order, with a
+    "duplicates" list of the {file_name, slide_number} of the others, so every location can still be cited.
+
+    Signatures come from the index when one is given (computed on the fly otherwise).
+    """
+    records = list(records)
+    if len(records) < 2:
+        return records, 0
+    if index is not None:
+        signatures = index.signatures_for(records)
+    else:
+        signatures = minhash_signatures([slide_shingles(slide_words(record)) for record in records])
+    valid = (signatures != _PRIME).any(axis=1)  # Slides without text are never duplicates
+    roots = cluster_signatures(signatures, valid, threshold)
+
+    members = {}
+    for row, root in enumerate(roots):
+        members.setdefault(int(root), []).append(row)
+    collapsed = []
+    clusters = 0
+    for row, record in enumerate(records):
+        cluster = members[int(roots[row])]
+        if cluster[0] != row:
+            continue  # Listed under its representative
+        if len(cluster) > 1:
+            clusters += 1
+            record = dict(record, duplicates=[
+                {"file_name": records[other]["file_name"], "slide_number": records[other]["slide_number"]}
+                for other in cluster[1:]
+            ])
+        collapsed.append(record)
+    return collapsed, clusters
+
+# Function to measure how much of a corpus deduplication removes
+def dedup_report(records, index=None, threshold=0.8, prompt_format=None, top=10):
+    records = list(records)
+    collapsed, clusters = collapse_duplicates(records, index, threshold)
+    tokens_before = estimate_tokens(format_context(records, prompt_format))
+    tokens_after = estimate_tokens(format_context(collapsed, prompt_format))
+    largest = sorted((record for record in collapsed if record.get("duplicates")),
+                     key=lambda record: -len(record["duplicates"]))[:top]
+    return {
+        "slides": len(records),
+        "kept": len(collapsed),
+        "removed": len(records) - len(collapsed),
+        "clusters": clusters,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "token_reduction": round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0,
+        "largest_clusters": [
+            {"title": record.get("title"), "slides": 1 + len(record["duplicates"]),
+             "decks": len({record["file_name"]} | {d["file_name"] for d in record["duplicates"]})}
+            for record in largest
+        ],
+    }
+
+def main():
+    base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+    parser = argparse.ArgumentParser(description="Report the near-duplicate slides of the extracted decks.")
+    parser.add_argument("json_folder", nargs="?", default=os.path.join(base_folder, "ppt_json"))
+    parser.add_argument("--threshold", type=float, default=get_dedup_threshold() or 0.8)
+    parser.add_argument("--top", type=int, default=10, help="largest clusters to list")
+    args = parser.parse_args()
+
+    records = []
+    for json_file in sorted(f for f in os.listdir(args.json_folder) if f.lower().endswith(".json")):
+        with open(os.path.join(args.json_folder, json_file), "r", encoding="utf-8") as f:
+            records.extend(json.load(f))
+    report = dedup_report(records, get_dedup_index(args.json_folder), args.threshold, top=args.top)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from file_utils import FileLock, atomic_write_json
+from http_client import get_http_client
+from manifest import deck_source
+
+# Folder (inside ppt_json) where the embedding index is stored
+INDEX_FOLDER_NAME = "embedding_index"
+
+# Version of the index files; an index written by another version is rebuilt
+INDEX_VERSION = 2
+
+# Rows scored per block, so a query never materializes more than one block of scores
+SCORE_BLOCK_ROWS = 65536
+
+# Function to get the text that is embedded for a slide
+def slide_text(record):
+    return "\n".join(part for part in (record.get("title"), record.get("text"), record.get("note")) if part)
+
+# Function to L2-normalize rows so cosine similarity becomes a dot product
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# Class to handle local embeddings without any network access
+class HashingEmbedder:
+    """Signed feature hashing of word unigrams and bigrams; deterministic and fully offline."""
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"\w+", (text or "").lower())
+            for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if (value >> 63) & 1 else -1.0
+        return vectors
+
+# Class to handle embeddings from the Azure OpenAI embeddings endpoint
+class AzureEmbedder:
+    """Compute embeddings in batched calls to an Azure OpenAI embeddings deployment."""
+
+    def __init__(self, api_base, deployment, access_token, subscription_key, batch_size=16):
+        self.api_base = api_base.rstrip("/")
+        self.deployment = deployment
+        self.access_token = access_token  # Token string or a callable returning one
+        self.subscription_key = subscription_key
+        self.batch_size = batch_size
+        self.api_version = "2024-07-01-preview"
+        self.name = f"azure-{deployment}"
+
+    def embed(self, texts):
+        api_url = f"{self.api_base}/deployments/{self.deployment}/embeddings?api-version={self.api_version}"
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            token = self.access_token() if callable(self.access_token) else self.access_token
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Ocp-Apim-Subscription-Key": self.subscription_key,
+                "Content-Type": "application/json",
+            }
+            # The endpoint rejects empty strings
+            batch = [text or " " for text in texts[start:start + self.batch_size]]
+            response = get_http_client().post(api_url, headers=headers, json={"input": batch})
+            response.raise_for_status()
+            data = sorted(response.json()["data"], key=lambda item: item["index"])
+            vectors.extend(item["embedding"] for item in data)
+        return np.asarray(vectors, dtype=np.float32)
+
+# Class to handle the memory-mapped slide embedding index
+class EmbeddingIndex:
+    """Slide vectors in one contiguous float32 file, memory-mapped for search.
+
+    Files in the index folder:
+    - vectors.f32: row-major, L2-normalized float32 vectors (appended to in place)
+    - ids.json: id -> (deck index, slide number) side table plus the list of deck sources
+      (see manifest.deck_source: two folders may hold decks with the same file name)
+    - meta.json: format version, dimension, row count and embedder name; rows past the count are ignored,
+      so an interrupted append never corrupts the index
+    Writes take a lock file and re-read the side tables first, and searches reload them when
+    meta.json changed, so ingest.py, the watcher and both apps can share the index.
+    """
+
+    def __init__(self, folder, embedder):
+        self.folder = folder
+        self.embedder = embedder
+        self.vectors_path = os.path.join(folder, "vectors.f32")
+        self.ids_path = os.path.join(folder, "ids.json")
+        self.meta_path = os.path.join(folder, "meta.json")
+        self.lock_path = os.path.join(folder, ".lock")
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._loaded_mtime = None
+        self._load()
+
+    def _load(self):
+        self.dim = None
+        self.count = 0
+        self.sources = []
+        self.rows = np.zeros((0, 2), dtype=np.int32)  # (deck index or -1 if deleted, slide number)
+        self._loaded_mtime = os.path.getmtime(self.meta_path) if os.path.exists(self.meta_path) else None
+        if self._loaded_mtime is not None:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                # Written by an older version (rows keyed by file name): start over, the next write replaces it
+                self._matrix = None
+                return
+            if meta.get("embedder") != self.embedder.name:
+                raise ValueError(
+                    f"Index in {self.folder} was built with {meta.get('embedder')}, not {self.embedder.name}"
+                )
+            self.dim = meta["dim"]
+            self.count = meta["count"]
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                ids = json.load(f)
+            self.sources = ids["decks"]
+            self.rows = np.asarray(ids["rows"], dtype=np.int32).reshape(-1, 2)[:self.count]
+        self._matrix = None
+
+    def _refresh(self):
+        """Reload the side tables if another process changed them."""
+        mtime = os.path.getmtime(self.meta_path) if os.path.exists(self.meta_path) else None
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def _get_matrix(self):
+        if self._matrix is None and self.count:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        return self._matrix
+
+    def add_records(self, records):
+        """Embed slide records in batches and append them to the index."""
+        if not records:
+            return
+        vectors = normalize_rows(self.embedder.embed([slide_text(record) for record in records]))
+        with self._lock, FileLock(self.lock_path):
+            self._refresh()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            deck_lookup = {source: idx for idx, source in enumerate(self.sources)}
+            new_rows = []
+            for record in records:
+                source = deck_source(record)
+                if source not in deck_lookup:
+                    deck_lookup[source] = len(self.sources)
+                    self.sources.append(source)
+                new_rows.append((deck_lookup[source], record["slide_number"]))
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                # Overwrite any rows left behind by an interrupted append
+                f.seek(self.count * self.dim * 4)
+                f.write(vectors.tobytes())
+                f.truncate()
+            self.rows = np.concatenate([self.rows, np.asarray(new_rows, dtype=np.int32)])
+            self.count += len(records)
+            self._save_side_tables()
+            self._matrix = None
+
+    def remove_deck(self, source):
+        """Mark every row of a deck as deleted (reclaimed by compact())."""
+        with self._lock, FileLock(self.lock_path):
+            self._refresh()
+            if source not in self.sources:
+                return
+            self.rows[self.rows[:, 0] == self.sources.index(source), 0] = -1
+            self._save_side_tables()
+
+    def apply_delta(self, delta, source):
+        """Re-index only the slides in an ingestion delta (see manifest.diff_slides) of the deck source."""
+        with self._lock, FileLock(self.lock_path):
+            self._refresh()
+            if source in self.sources:
+                stale = {record["slide_number"] for record in delta["changed"]} | set(delta["removed"])
+                deck_idx = self.sources.index(source)
+                mask = (self.rows[:, 0] == deck_idx) & np.isin(self.rows[:, 1], list(stale))
+                self.rows[mask, 0] = -1
+                self._save_side_tables()
+        self.add_records(delta["changed"])
+
+    def replace_deck(self, records):
+        """Re-index a deck after it was re-extracted."""
+        if records:
+            self.remove_deck(deck_source(records[0]))
+        self.add_records(records)
+
+    def compact(self):
+        """Rewrite the vector file without deleted rows."""
+        with self._lock, FileLock(self.lock_path):
+            self._refresh()
+            keep = np.flatnonzero(self.rows[:, 0] >= 0)
+            if len(keep) == self.count:
+                return
+            matrix = self._get_matrix()
+            tmp_path = self.vectors_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for start in range(0, len(keep), SCORE_BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(matrix[keep[start:start + SCORE_BLOCK_ROWS]]).tobytes())
+            self._matrix = None
+            del matrix
+            os.replace(tmp_path, self.vectors_path)
+            self.rows = self.rows[keep]
+            self.count = len(keep)
+            self._save_side_tables()
+
+    def _save_side_tables(self):
+        atomic_write_json(self.ids_path, {"decks": self.sources, "rows": self.rows.tolist()}, indent=None)
+        atomic_write_json(self.meta_path, {"version": INDEX_VERSION, "dim": self.dim, "count": self.count, "embedder": self.embedder.name})
+        self._loaded_mtime = os.path.getmtime(self.meta_path)
+
+    def search(self, queries, top_k=5, sources=None):
+        """Return the top_k (score, deck source, slide_number) hits for each query, scored blockwise."""
+        single = isinstance(queries, str)
+        if single:
+            queries = [queries]
+        with self._lock:
+            self._refresh()  # Rows appended or deleted by another process
+            matrix = self._get_matrix()
+            # Snapshot, so a concurrent reload does not change the rows being scored
+            rows, indexed_sources, count = self.rows, self.sources, self.count
+        if matrix is None:
+            return [] if single else [[] for _ in queries]
+        query_vectors = normalize_rows(self.embedder.embed(queries))
+        valid = rows[:, 0] >= 0
+        if sources is not None:
+            wanted = set(sources)
+            allowed = [idx for idx, source in enumerate(indexed_sources) if source in wanted]
+            valid &= np.isin(rows[:, 0], allowed)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            scores = query_vectors @ block.T  # (queries, rows in block)
+            scores[:, ~valid[start:start + len(block)]] = -np.inf
+            ids = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            # Keep only the running top_k per query
+            scores = np.concatenate([best_scores, scores], axis=1)
+            ids = np.concatenate([best_ids, ids], axis=1)
+            k = min(top_k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(ids, top, axis=1)
+
+        results = []
+        for scores, ids in zip(best_scores, best_ids):
+            order = np.argsort(-scores)
+            hits = []
+            for position in order:
+                if not np.isfinite(scores[position]):
+                    continue
+                deck_idx, slide_number = rows[ids[position]]
+                hits.append((float(scores[position]), indexed_sources[deck_idx], int(slide_number)))
+            results.append(hits)
+        return results[0] if single else results
+
+# Function to create the embedder configured in the environment
+def get_embedder(api_base=None, access_token=None, subscription_key=None):
+    """Use the Azure deployment named by EMBEDDING_DEPLOYMENT, or the offline hashing embedder."""
+    embedding_deployment = os.getenv("EMBEDDING_DEPLOYMENT")
+    if embedding_deployment and api_base:
+        return AzureEmbedder(api_base, embedding_deployment, access_token, subscription_key)
+    return HashingEmbedder()
+
+# Function to get the embedding index folder for a ppt_json folder
+def get_index_folder(ppt_json_folder):
+    return os.path.join(ppt_json_folder, INDEX_FOLDER_NAME)
+
+# Function to make sure the given decks are in the index
+def index_missing_decks(index, records):
+    """Append the decks in records that the index has not seen yet (e.g. JSON extracted before the index existed)."""
+    index._refresh()
+    known = set(index.sources)
+    missing = [record for record in records if deck_source(record) not in known]
+    index.add_records(missing)
+
+# Function to pick the slides semantically closest to a question
+def retrieve_slides_semantic(index, records, query, top_k=5):
+    """Search only the decks present in records and return the hits in deck/slide order."""
+    lookup = {(deck_source(record), record["slide_number"]): record for record in records}
+    sources = {source for source, _ in lookup}
+    hits = [lookup[(source, number)] for _, source, number in index.search(query, top_k, sources=sources)
+            if (source, number) in lookup]
+    hits.sort(key=lambda record: (record.get("file_name", ""), record.get("slide_number", 0)))
+    return hits
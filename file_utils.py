@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import tempfile
+from datetime import datetime
+
+# Function to write text to a file atomically
+def atomic_write_text(file_path, text):
+    """Write text to a temporary file in the same folder and move it into place."""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# Function to write JSON data to a file atomically
+def atomic_write_json(file_path, data, indent=4):
+    """Serialize data to JSON and write it atomically."""
+    atomic_write_text(file_path, json.dumps(data, indent=indent, ensure_ascii=False))
+
+# Function to log errors to a file
+def log_error_to_file(error_message, response_text=None):
+    log_folder = "error_logs"
+    if not os.path.exists(log_folder):
+        os.makedirs(log_folder)
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    log_file = os.path.join(log_folder, f"error_{timestamp}.log")
+    with open(log_file, "w", encoding="utf-8") as f:
+        f.write(f"Error occurred at {timestamp}\n")
+        f.write(f"Error message: {error_message}\n")
+        if response_text:
+            f.write(f"Response content:\n{response_text}\n")
+    print(f"Error details logged to {log_file}")
+
+# Class to handle a lock shared between processes
+class FileLock:
+    """Exclusive lock implemented as a lock file created with O_EXCL (works on Windows and POSIX)."""
+
+    def __init__(self, lock_path, timeout=60, stale_after=300):
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode("ascii"))
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    # A lock left behind by a crashed process is removed after stale_after seconds
+                    if time.time() - os.path.getmtime(self.lock_path) > self.stale_after:
+                        os.remove(self.lock_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.time() > deadline:
+                    raise TimeoutError(f"Timed out waiting for lock: {self.lock_path}")
+                time.sleep(0.05)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            os.remove(self.lock_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,221 @@
+import os
+import json
+import re
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes that are worth retrying (throttling and transient server errors)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Exception raised when the circuit breaker rejects a request
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when too many consecutive failures have opened the circuit breaker."""
+
+# Function to parse durations such as "1s", "6m0s", "250ms" or "2.5"
+def parse_duration(value):
+    """Convert a rate-limit reset duration string into seconds, or None if it cannot be parsed."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+# Function to read the server's requested wait time from response headers
+def get_retry_after(response):
+    """Return the delay requested by Retry-After, retry-after-ms or x-ratelimit-reset-* headers."""
+    headers = response.headers
+    if "retry-after-ms" in headers:
+        delay = parse_duration(headers["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000
+    if "Retry-After" in headers:
+        retry_after = headers["Retry-After"]
+        delay = parse_duration(retry_after)
+        if delay is not None:
+            return delay
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            pass
+    # Fall back to the rate-limit headers for whichever budget is exhausted
+    delays = []
+    for kind in ("requests", "tokens"):
+        remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+        if reset is not None and remaining is not None and remaining.strip() == "0":
+            delays.append(reset)
+    return max(delays) if delays else None
+
+# Class to handle pooled HTTP requests with retries and a circuit breaker
+class HttpClient:
+    """Shared requests.Session with keep-alive pooling, backoff with jitter and a circuit breaker."""
+
+    def __init__(self, connect_timeout=5, read_timeout=120, max_retries=4, backoff_base=1.0,
+                 backoff_max=60.0, pool_size=10, failure_threshold=5, recovery_time=30, verify=False):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.verify = verify
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._half_open_trial = False
+        self.total_retries = 0
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying on connection errors, 429 and 5xx responses.
+
+        The circuit breaker counts requests, not attempts: a request that still fails after its
+        retries (5xx or connection error) is one failure.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        kwargs.setdefault("verify", self.verify)
+        trial = self._before_request()
+        succeeded = None
+        try:
+            response = self._request_with_retries(method, url, **kwargs)
+            # Throttling is the server working as intended, so only 5xx trips the breaker
+            succeeded = response.status_code < 500
+            return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            succeeded = False
+            raise
+        finally:
+            self._record_outcome(succeeded, trial)
+
+    def _request_with_retries(self, method, url, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    response.retry_count = attempt
+                    return response
+                delay = get_retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                else:
+                    delay = min(delay, self.backoff_max) + random.uniform(0, self.backoff_base)
+                response.close()
+            attempt += 1
+            with self._lock:
+                self.total_retries += 1
+            time.sleep(delay)
+
+    def _backoff_delay(self, attempt):
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _before_request(self):
+        """Raise CircuitOpenError while the breaker is open; return True for the half-open trial request."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.time() - self._opened_at < self.recovery_time or self._half_open_trial:
+                raise CircuitOpenError("Circuit breaker is open after repeated failures; try again later.")
+            # Let a single trial request through (half-open state)
+            self._half_open_trial = True
+            return True
+
+    def _record_outcome(self, succeeded, trial):
+        """succeeded is None when the request raised something other than a transport error."""
+        with self._lock:
+            if trial:
+                # Always end the trial, or the breaker would reject every request from now on
+                self._half_open_trial = False
+            if succeeded is None:
+                return
+            if succeeded:
+                self._consecutive_failures = 0
+                self._opened_at = None
+                return
+            self._consecutive_failures += 1
+            if trial or self._consecutive_failures >= self.failure_threshold:
+                self._opened_at = time.time()
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+# Function to get the process-wide HTTP client
+def get_http_client():
+    """Return the HttpClient shared by every caller in this process, configured from the environment."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient(
+                connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+                read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "120")),
+                max_retries=int(os.getenv("HTTP_MAX_RETRIES", "4"))
+            )
+        return _shared_client
+
+# Function to parse a server-sent events stream
+def iter_sse_events(response):
+    """Yield the data payload of each server-sent event as it arrives."""
+    # text/event-stream has no charset in its content type, so requests would assume latin-1
+    response.encoding = "utf-8"
+    data_lines = []
+    # chunk_size=None hands over data as soon as it arrives instead of waiting for 512 bytes
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+            continue
+        if line.startswith(":"):
+            continue  # comment / keep-alive line
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            data_lines.append(value)
+    if data_lines:
+        yield "\n".join(data_lines)
+
+# Function to extract the text deltas from a streamed chat completion
+def iter_chat_deltas(response, usage=None):
+    """Yield content deltas from a chat completions stream until the [DONE] event.
+
+    A stream that ends without [DONE] was cut off, so it raises instead of passing as a complete reply.
+    If a usage dict is given it is filled from the usage chunk (sent when stream_options.include_usage is set).
+    """
+    for data in iter_sse_events(response):
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        # Azure sends an initial chunk with no choices (prompt filter results)
+        for choice in chunk.get("choices", []):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+    raise requests.exceptions.ChunkedEncodingError("Chat stream ended before the [DONE] event")
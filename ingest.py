@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from file_utils import atomic_write_json, log_error_to_file
+from bm25_index import build_and_save_index, get_index_path
+from corpus_store import get_corpus_store
+from ppt_extraction import extract_text_with_metadata_from_ppt, list_ppt_files
+from manifest import IngestionManifest, hash_file, slide_hashes, diff_slides, deck_source_for_path
+from dedup_index import get_dedup_index, get_dedup_threshold
+from tracing import span
+
+# Save the manifest every N finished files so an interrupted run keeps its progress
+MANIFEST_SAVE_INTERVAL = 20
+
+# Function to reuse the extracted slides of an identical deck stored under another path
+def copy_slides_data(ppt_path, source_json_path):
+    with open(source_json_path, "r", encoding="utf-8") as f:
+        slides_data = json.load(f)
+    file_name = os.path.basename(ppt_path)
+    abs_path = os.path.abspath(ppt_path)
+    for record in slides_data:
+        record["file_name"] = file_name
+        record["slide_link"] = f"file:///{abs_path}#slide={record['slide_number']}"
+    return slides_data
+
+# Function to ingest one PowerPoint file (safe to run in a worker process)
+def process_deck(ppt_path, ppt_json_folder, json_file, old_entry=None, known_contents=None, extract=None):
+    """Hash a deck and re-extract it only if its content changed.
+
+    Writes the deck JSON, its BM25 index and its corpus store segment. extract(ppt_path) replaces
+    the default extractor (e.g. with one memoized by content hash).
+
+    Returns (status, entry, delta): status is "touched" (same content, nothing written),
+    "copied" (same content as another deck in known_contents, slides reused) or "extracted";
+    delta lists the slides whose content changed, for downstream indexes.
+    """
+    content_hash = hash_file(ppt_path)
+    output_file = os.path.join(ppt_json_folder, json_file)
+    if old_entry and old_entry["content_hash"] == content_hash and os.path.exists(output_file):
+        return "touched", {"content_hash": content_hash, "json_file": json_file, "slides": old_entry["slides"]}, None
+
+    status = "extracted"
+    slides_data = None
+    source_json_file = (known_contents or {}).get(content_hash)
+    if source_json_file and source_json_file != json_file:
+        source_json_path = os.path.join(ppt_json_folder, source_json_file)
+        if os.path.exists(source_json_path):
+            slides_data = copy_slides_data(ppt_path, source_json_path)
+            status = "copied"
+    if slides_data is None:
+        slides_data = (extract or extract_text_with_metadata_from_ppt)(ppt_path)
+
+    # Only rewrite the deck JSON and its BM25 index if a slide actually changed
+    delta = diff_slides(old_entry["slides"] if old_entry else {}, slides_data)
+    if delta["changed"] or delta["removed"] or not os.path.exists(output_file) or status == "copied":
+        with span("json_dump"):
+            atomic_write_json(output_file, slides_data)
+        build_and_save_index(output_file, slides_data)
+        get_corpus_store(ppt_json_folder).write_deck(json_file, slides_data, os.path.getmtime(output_file))
+    return status, {"content_hash": content_hash, "json_file": json_file, "slides": slide_hashes(slides_data)}, delta
+
+# Function to ingest one deck and update the manifest and the derived indexes
+def update_deck(ppt_path, ppt_json_folder, manifest, embedding_index=None, response_cache=None):
+    """Re-extract a new or changed deck in this process; returns (status, entry, delta) like process_deck."""
+    old_entry = manifest.get(ppt_path)
+    known_contents = {entry["content_hash"]: entry["json_file"] for entry in manifest.entries().values()}
+    status, result, delta = process_deck(ppt_path, ppt_json_folder, manifest.json_file_for(ppt_path), old_entry, known_contents)
+    if delta is not None and embedding_index is not None:
+        embedding_index.apply_delta(delta, deck_source_for_path(ppt_path))
+    if delta is not None and get_dedup_threshold() is not None:
+        get_dedup_index(ppt_json_folder).apply_delta(delta, deck_source_for_path(ppt_path))
+    # Cached replies about the previous version of the deck are no longer valid
+    if response_cache is not None and old_entry and old_entry["content_hash"] != result["content_hash"]:
+        response_cache.invalidate_decks([old_entry["content_hash"]])
+    manifest.record(ppt_path, result["content_hash"], result["json_file"], result["slides"])
+    return status, result, delta
+
+# Function to delete everything derived from a deck that was removed from the ppt folder
+def remove_deck(ppt_path, ppt_json_folder, manifest, embedding_index=None, response_cache=None):
+    """Drop the manifest entry, the deck JSON, its BM25 index, corpus segment, embeddings and signatures; returns the old entry."""
+    entry = manifest.remove(ppt_path)
+    if entry is None:
+        return None
+    json_path = os.path.join(ppt_json_folder, entry["json_file"])
+    for path in (json_path, get_index_path(json_path)):
+        if os.path.exists(path):
+            os.remove(path)
+    get_corpus_store(ppt_json_folder).delete_deck(entry["json_file"])
+    if embedding_index is not None:
+        embedding_index.remove_deck(deck_source_for_path(ppt_path))
+    get_dedup_index(ppt_json_folder).remove_deck(deck_source_for_path(ppt_path))
+    if response_cache is not None:
+        response_cache.invalidate_decks([entry["content_hash"]])
+    return entry
+
+# Function to ingest every PowerPoint file in a folder
+def ingest_folder(ppt_folder, ppt_json_folder, management_file, workers=None, embedding_index=None):
+    """Extract new and changed decks in parallel; unchanged decks are skipped."""
+    os.makedirs(ppt_json_folder, exist_ok=True)
+    manifest = IngestionManifest(management_file)
+
+    pending = []
+    for filename in list_ppt_files(ppt_folder):
+        ppt_path = os.path.join(ppt_folder, filename)
+        if not manifest.is_unchanged(ppt_path, ppt_json_folder):
+            pending.append(ppt_path)
+    manifest.save()  # Persist adopted legacy entries
+
+    if not pending:
+        print("No new update found.")
+        return {"files": 0, "slides": 0, "failed": 0, "seconds": 0.0}
+
+    print(f"Checking {len(pending)} new or modified file(s) with {workers or os.cpu_count()} worker(s)...")
+    known_contents = {entry["content_hash"]: entry["json_file"] for entry in manifest.entries().values()}
+    dedup_index = get_dedup_index(ppt_json_folder) if get_dedup_threshold() is not None else None
+    start_time = time.perf_counter()
+    done = failed = total_slides = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for ppt_path in pending:
+            old_entry = manifest.get(ppt_path)
+            json_file = manifest.json_file_for(ppt_path)
+            # Workers hash the file; known contents let a copied deck reuse existing slides
+            future = executor.submit(process_deck, ppt_path, ppt_json_folder, json_file, old_entry, known_contents)
+            futures[future] = ppt_path
+        for future in as_completed(futures):
+            ppt_path = futures[future]
+            filename = os.path.basename(ppt_path)
+            try:
+                status, result, delta = future.result()
+            except Exception as e:
+                # One broken deck must not stop the whole run
+                failed += 1
+                print(f"Failed to ingest {filename}: {e}")
+                log_error_to_file(f"Failed to ingest {filename}: {e}")
+                continue
+            if delta is not None and embedding_index is not None:
+                try:
+                    embedding_index.apply_delta(delta, deck_source_for_path(ppt_path))
+                except Exception as e:
+                    print(f"Failed to update the embedding index for {filename}: {e}")
+                    log_error_to_file(f"Failed to update the embedding index for {filename}: {e}")
+            if delta is not None and dedup_index is not None:
+                try:
+                    dedup_index.apply_delta(delta, deck_source_for_path(ppt_path))
+                except Exception as e:
+                    print(f"Failed to update the near-duplicate index for {filename}: {e}")
+                    log_error_to_file(f"Failed to update the near-duplicate index for {filename}: {e}")
+            manifest.record(ppt_path, result["content_hash"], result["json_file"], result["slides"])
+            done += 1
+            total_slides += len(result["slides"])
+            if done % MANIFEST_SAVE_INTERVAL == 0:
+                manifest.save()
+            elapsed = time.perf_counter() - start_time
+            detail = "unchanged content" if delta is None else f"{len(delta['changed'])} changed, {len(delta['removed'])} removed"
+            print(
+                f"[{done + failed}/{len(pending)}] {filename}: {status} ({len(result['slides'])} slides, {detail}) | "
+                f"{done / elapsed:.2f} files/s, {total_slides / elapsed:.1f} slides/s"
+            )
+    manifest.save()
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Processed {done} file(s), {total_slides} slide(s) in {elapsed:.1f}s "
+        f"({done / elapsed:.2f} files/s, {total_slides / elapsed:.1f} slides/s); {failed} failed."
+    )
+    return {"files": done, "slides": total_slides, "failed": failed, "seconds": elapsed}
+
+def main():
+    base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+    parser = argparse.ArgumentParser(description="Extract every PowerPoint file in the ppt folder.")
+    parser.add_argument("--ppt-folder", default=os.path.join(base_folder, "ppt"))
+    parser.add_argument("--json-folder", default=os.path.join(base_folder, "ppt_json"))
+    parser.add_argument("--management-folder", default=os.path.join(base_folder, "text_extraction_management_files"))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--skip-embeddings", action="store_true", help="do not update the embedding index")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ppt_folder):
+        print(f"Folder not found: {args.ppt_folder}")
+        return 1
+    embedding_index = None
+    if not args.skip_embeddings:
+        from main import get_embedding_index
+        embedding_index = get_embedding_index(args.json_folder)
+    management_file = os.path.join(args.management_folder, "ppt_management.json")
+    result = ingest_folder(args.ppt_folder, args.json_folder, management_file, args.workers, embedding_index)
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
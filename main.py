@@ -1,11 +1,26 @@
 import os
 import json
+import time
 import requests
 import certifi
 from dotenv import load_dotenv
 import urllib3
-from pptx import Presentation
-from datetime import datetime
+from token_provider import AccessTokenProvider
+from file_utils import log_error_to_file
+from ppt_extraction import list_ppt_files
+from manifest import IngestionManifest, deck_source_for_path
+from ingest import process_deck
+from http_client import get_http_client, iter_chat_deltas
+from context_window import ContextWindow, make_summarizer, estimate_tokens, count_message_tokens
+from tracing import configure_tracing, span, turn, annotate, count, traced
+from prompt_serializer import format_context
+from response_cache import get_response_cache, get_deck_hashes, make_cache_key, make_context_id
+from bm25_index import BM25Index, load_or_build_index, retrieve_slides
+from embedding_index import EmbeddingIndex, get_embedder, get_index_folder, index_missing_decks, retrieve_slides_semantic
+from map_reduce import build_shard_contexts, answer_map_reduce
+from session_store import get_session_store, make_session_context, hash_text
+from context_bundle import get_context_bundle_store
+from dedup_index import collapse_duplicates, get_dedup_index, get_dedup_threshold
 
 # Disable insecure request warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -26,153 +41,211 @@ deployment_name = os.getenv("DEPLOYMENT_NAME")
 openai_api_base = os.getenv("OPENAI_API_BASE")
 subscription_key = os.getenv("SUBSCRIPTION_KEY")
 
+# Folder that holds ppt, ppt_json, cache, ... (PPTCHAT_HOME overrides it, e.g. for benchmarks)
+base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+
+# "full" sends the whole deck with every turn, "retrieved" / "semantic" send only the
+# top-k BM25 / embedding matches, "mapreduce" asks each shard of the decks and merges the answers
+# (full mode switches to it when the decks do not fit in CONTEXT_MAX_TOKENS)
+context_mode = os.getenv("CONTEXT_MODE", "full")
+retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+# "compact" serializes slides grouped per deck without boilerplate, "json" keeps indented JSON
+prompt_format = os.getenv("PROMPT_FORMAT", "compact")
+
+# Ask for the usage chunk at the end of streamed replies (needs an API version with stream_options);
+# without it the per-turn token counts are estimated
+stream_usage = os.getenv("STREAM_USAGE", "0") == "1"
+
+# Token provider shared by every chat turn; the on-disk cache is shared with main_st.py
+token_cache_file = os.path.join(base_folder, "cache", "azure_token.json")
+token_provider = AccessTokenProvider(
+    tenant_id, client_id, client_secret, resource,
+    token_url=os.getenv("TOKEN_URL"),
+    cache_file=token_cache_file
+)
+
 # Function to obtain an Azure AD access token
 def get_access_token():
-    token_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
-    token_data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "scope": resource + ".default"
-    }
-    token_headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    response = requests.post(token_url, data=token_data, headers=token_headers)
-    response.raise_for_status()
-    return response.json().get("access_token")
-
-# Function to log errors to a file
-def log_error_to_file(error_message, response_text=None):
-    log_folder = "error_logs"
-    if not os.path.exists(log_folder):
-        os.makedirs(log_folder)
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    log_file = os.path.join(log_folder, f"error_{timestamp}.log")
-    with open(log_file, "w", encoding="utf-8") as f:
-        f.write(f"Error occurred at {timestamp}\n")
-        f.write(f"Error message: {error_message}\n")
-        if response_text:
-            f.write(f"Response content:\n{response_text}\n")
-    print(f"Error details logged to {log_file}")
+    """Return a cached access token, refreshing it only near expiry."""
+    with span("get_access_token"):
+        return token_provider.get_token()
 
 # Class to handle OpenAI text generation requests
 class OpenAITextGenerator:
-    def __init__(self, api_base, deployment, access_token, subscription_key):
+    def __init__(self, api_base, deployment, access_token, subscription_key,
+                 response_cache=None, context_id=None, deck_hashes=()):
         self.api_base = api_base.rstrip("/")  # remove trailing slash if present
         self.deployment = deployment
-        self.access_token = access_token
+        self.access_token = access_token  # token string or a callable returning one
         self.subscription_key = subscription_key
         self.api_version = "2024-07-01-preview"
+        self.last_metrics = {}  # latency, usage and retries (or error) of the last request
+        # Replies are cached per deck context; context_id stands in for the deck system message
+        self.response_cache = response_cache
+        self.context_id = context_id
+        self.deck_hashes = list(deck_hashes)
+        # Reported prompt tokens and the part of them served from the server-side prompt cache
+        self.usage_totals = {"prompt_tokens": 0, "cached_prompt_tokens": 0}
+
+    def get_token(self):
+        """Resolve the access token for the current request."""
+        return self.access_token() if callable(self.access_token) else self.access_token
+
+    def _cache_key(self, messages, use_cache):
+        if not use_cache or self.response_cache is None or self.context_id is None:
+            return None
+        return make_cache_key(self.deployment, self.context_id, messages)
     
-    def send_request(self, system_message, user_message):
+    def _build_request(self, messages, stream=False):
         api_url = f"{self.api_base}/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+        access_token = self.get_token()
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {access_token}",
             "Ocp-Apim-Subscription-Key": self.subscription_key,
             "Content-Type": "application/json",
-            "api-key": self.access_token
-        }
-        data = {
-            "messages": [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ]
+            "api-key": access_token
         }
+        data = {"messages": messages}
+        if stream:
+            data["stream"] = True
+            if stream_usage:
+                data["stream_options"] = {"include_usage": True}
+        return api_url, headers, data
+
+    def _record_usage(self, messages, content, usage):
+        """Add the token usage of a completed request to the current trace turn."""
+        if usage:
+            cached_prompt_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+            count(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0),
+                  cached_prompt_tokens=cached_prompt_tokens)
+            self.usage_totals["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.usage_totals["cached_prompt_tokens"] += cached_prompt_tokens
+        else:
+            count(prompt_tokens=count_message_tokens(messages), completion_tokens=estimate_tokens(content))
+            annotate(usage_estimated=True)
+
+    @traced("send_request")
+    def send_request(self, messages, use_cache=True, before_request=None):
+        """Send a chat completions request with the given message list and return the reply.
+
+        before_request() is called only when the reply is not cached, right before the request
+        is sent (batch.py waits for its rate limiter there).
+        """
+        start_time = time.perf_counter()
+        self.last_metrics = {}
+        cache_key = self._cache_key(messages, use_cache)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.last_metrics = {"cached": True, "total_latency": time.perf_counter() - start_time}
+                count(cache_hits=1)
+                return cached
+        if before_request is not None:
+            before_request()
+        api_url, headers, data = self._build_request(messages)
         try:
-            response = requests.post(api_url, headers=headers, json=data, verify=False)
+            response = get_http_client().post(api_url, headers=headers, json=data)
+            self.last_metrics["retries"] = response.retry_count
+            count(retries=response.retry_count)
             response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
             result = response.json()
-            return result['choices'][0]['message']['content']
+            content = result['choices'][0]['message']['content']
+            self._record_usage(messages, content, result.get("usage"))
+            self.last_metrics.update(usage=result.get("usage"), total_latency=time.perf_counter() - start_time)
+            if cache_key is not None:
+                self.response_cache.put(cache_key, content, self.deck_hashes)
+            return content
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
             print(f"Response content: {response.text}")
             log_error_to_file(str(http_err), response.text)
+            self.last_metrics["error"] = str(http_err)
         except requests.exceptions.RequestException as req_err:
             print(f"Request error occurred: {req_err}")
             log_error_to_file(str(req_err))
+            self.last_metrics["error"] = str(req_err)
         except KeyError as key_err:
             print(f"Unexpected response format: {key_err}")
             log_error_to_file(str(key_err), response.text)
+            self.last_metrics["error"] = f"Unexpected response format: {key_err}"
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             log_error_to_file(str(e))
-
-# Function to list all ppt or pptx files in a given folder
-def list_ppt_files(folder_path):
-    """List all PowerPoint files (.ppt, .pptx, .pptm) in the given folder."""
-    ppt_files = []
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith((".ppt", ".pptx", ".pptm")):
-            ppt_files.append(filename)
-    ppt_files.sort()
-    return ppt_files
-
-# Function to extract text, title, and slide number from a PowerPoint file
-def extract_text_with_metadata_from_ppt(file_path):
-    """Extract text, title, slide number, notes, file name, and slide link from a PowerPoint file."""
-    slides_data = []
-    presentation = Presentation(file_path)
-    file_name = os.path.basename(file_path)  # Get the file name
-    abs_path = os.path.abspath(file_path)    # Convert to absolute path
-
-    for slide_number, slide in enumerate(presentation.slides, start=1):
-        slide_text = ""
-        slide_title = None
-        slide_notes = None
-
-        # Extract text from slide shapes
-        for shape in slide.shapes:
-            if shape.has_text_frame:
-                for paragraph in shape.text_frame.paragraphs:
-                    slide_text += paragraph.text + "\n"
-            if shape.has_text_frame and shape.text_frame.text and not slide_title:
-                slide_title = shape.text_frame.text
-
-        # Extract notes from the slide
-        if slide.has_notes_slide and slide.notes_slide.notes_text_frame:
-            slide_notes = slide.notes_slide.notes_text_frame.text.strip()
-
-        # Create a link to the slide (e.g., file:///<absolute_path>#slide=<slide_number>)
-        slide_link = f"file:///{abs_path}#slide={slide_number}"
-
-        slides_data.append({
-            "file_name": file_name,
-            "title": slide_title if slide_title else f"Slide {slide_number}",
-            "slide_number": slide_number,
-            "text": slide_text.strip(),
-            "note": slide_notes if slide_notes else "",  # Add notes to the JSON
-            "slide_link": slide_link
-        })
-
-    return slides_data
-
-# Function to load management data
-def load_management_data(file_path):
-    """Load management data from a JSON file."""
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-# Function to save management data
-def save_management_data(file_path, data):
-    """Save management data to a JSON file."""
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
-
-# Function to save conversation history
-def save_conversation_history(conversation_folder, conversation_memory):
-    """Save the conversation history to a timestamped JSON file."""
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    conversation_file = os.path.join(conversation_folder, f"conversation_history_{timestamp}.json")
-    with open(conversation_file, "w", encoding="utf-8") as f:
-        json.dump(conversation_memory, f, indent=4, ensure_ascii=False)
-    print(f"Conversation history saved to {conversation_file}")
+            self.last_metrics["error"] = str(e)
+
+    def stream_request(self, messages, use_cache=True):
+        """Send a streaming request and yield the response text as it arrives."""
+        start_time = time.perf_counter()
+        cache_key = self._cache_key(messages, use_cache)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.last_metrics = {"cached": True, "time_to_first_token": 0.0,
+                                     "total_latency": time.perf_counter() - start_time}
+                count(cache_hits=1)
+                yield cached
+                return
+        api_url, headers, data = self._build_request(messages, stream=True)
+        first_token_time = None
+        self.last_metrics = {}
+        response = None
+        parts = []
+        usage = {}
+        error = None
+        try:
+            with span("stream_request"):
+                response = get_http_client().post(api_url, headers=headers, json=data, stream=True)
+                count(retries=response.retry_count)
+                response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+                for delta in iter_chat_deltas(response, usage):
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+                self._record_usage(messages, "".join(parts), usage)
+            # Only a reply that streamed to the end is cached
+            if cache_key is not None:
+                self.response_cache.put(cache_key, "".join(parts), self.deck_hashes)
+        except requests.exceptions.HTTPError as http_err:
+            print(f"HTTP error occurred: {http_err}")
+            print(f"Response content: {response.text}")
+            log_error_to_file(str(http_err), response.text)
+            error = str(http_err)
+        except requests.exceptions.RequestException as req_err:
+            print(f"Request error occurred: {req_err}")
+            log_error_to_file(str(req_err))
+            error = str(req_err)
+        except ValueError as value_err:
+            print(f"Unexpected stream format: {value_err}")
+            log_error_to_file(str(value_err))
+            error = f"Unexpected stream format: {value_err}"
+        finally:
+            if response is not None:
+                response.close()
+            self.last_metrics = {
+                "time_to_first_token": first_token_time - start_time if first_token_time else None,
+                "total_latency": time.perf_counter() - start_time
+            }
+            if error is not None:
+                self.last_metrics["error"] = error
+            if first_token_time:
+                annotate(time_to_first_token=round(first_token_time - start_time, 4))
+
+_embedding_index = None
+
+# Function to get the slide embedding index of the ppt_json folder
+def get_embedding_index(ppt_json_folder):
+    """Open the memory-mapped embedding index once per process."""
+    global _embedding_index
+    if _embedding_index is None:
+        embedder = get_embedder(openai_api_base, get_access_token, subscription_key)
+        _embedding_index = EmbeddingIndex(get_index_folder(ppt_json_folder), embedder)
+    return _embedding_index
 
 def load_pre_paper_prompt():
     """Load the content of pre_paper_prompt.txt from the system_prompt folder."""
-    system_prompt_folder = os.path.join("C:\\", "python_scripts", "pptChat", "system_prompt")
+    system_prompt_folder = os.path.join(base_folder, "system_prompt")
     pre_paper_prompt_file = os.path.join(system_prompt_folder, "pre_paper_prompt.txt")
     if not os.path.exists(pre_paper_prompt_file):
         raise FileNotFoundError(f"Pre-paper prompt file not found: {pre_paper_prompt_file}")
@@ -180,10 +253,10 @@ def load_pre_paper_prompt():
         return f.read()
 
 def main():
-    ppt_folder = os.path.join("C:\\", "python_scripts", "pptChat", "ppt")
-    ppt_json_folder = os.path.join("C:\\", "python_scripts", "pptChat", "ppt_json")
-    management_folder = os.path.join("C:\\", "python_scripts", "pptChat", "text_extraction_management_files")
-    conversation_folder = os.path.join("C:\\", "python_scripts", "pptChat", "conversation_history")
+    ppt_folder = os.path.join(base_folder, "ppt")
+    ppt_json_folder = os.path.join(base_folder, "ppt_json")
+    management_folder = os.path.join(base_folder, "text_extraction_management_files")
+    conversation_folder = os.path.join(base_folder, "conversation_history")
 
     if not os.path.exists(ppt_folder):
         print(f"Folder not found: {ppt_folder}")
@@ -196,11 +269,20 @@ def main():
         os.makedirs(conversation_folder)
 
     management_file = os.path.join(management_folder, "ppt_management.json")
-    if not os.path.exists(management_file):
-        with open(management_file, "w", encoding="utf-8") as f:
-            json.dump({}, f)  # Create an empty management file
+    manifest = IngestionManifest(management_file)
+
+    # Per-turn timing spans and token usage go to traces/trace_cli.jsonl and traces/pptchat_cli.prom
+    configure_tracing("cli", os.path.join(base_folder, "traces"))
 
-    management_data = load_management_data(management_file)
+    # Replies to repeated questions about the same decks are served from the response cache
+    response_cache = get_response_cache(os.path.join(base_folder, "cache", "responses"))
+
+    # Every turn is appended to conversation_history/<session id>.jsonl as it happens
+    session_store = get_session_store(conversation_folder)
+    session_store.rotate()
+
+    # System messages already assembled for a prompt version and deck set (shared with main_st.py and batch.py)
+    context_bundles = get_context_bundle_store(os.path.join(base_folder, "cache", "context_bundles"))
 
     # Load the pre-paper prompt
     pre_paper_prompt = load_pre_paper_prompt()
@@ -211,9 +293,11 @@ def main():
         print("\n")
         print("1: New ppt file")
         print("2: Existing json files")
-        print("3: Exit")
+        print("3: Resume a conversation")
+        print("4: Exit")
         print("\n")
         option = int(input("Enter your choice: "))
+        resumed_session = None
 
         if option == 1:
             # List PowerPoint files
@@ -232,46 +316,45 @@ def main():
             selected_file = ppt_files[selected_num - 1]
             ppt_path = os.path.join(ppt_folder, selected_file)
 
-            # Check if the file has been updated
-            last_modified_time = os.path.getmtime(ppt_path)
-            last_modified_str = datetime.fromtimestamp(last_modified_time).isoformat()
-
-            if selected_file in management_data and management_data[selected_file] == last_modified_str:
-                print("No new update found.")
-                print("\n")
-                json_filename = os.path.splitext(selected_file)[0] + ".json"
-                output_file = os.path.join(ppt_json_folder, json_filename)
-                with open(output_file, "r", encoding="utf-8") as f:
-                    system_message = f.read()
+            # Check if the file has been updated (size/mtime first, then the content hash)
+            json_filename = manifest.json_file_for(ppt_path)
+            output_file = os.path.join(ppt_json_folder, json_filename)
+            if manifest.is_unchanged(ppt_path, ppt_json_folder):
+                status, delta = "unchanged", None
             else:
-                # Extract text with metadata from the selected PowerPoint file
-                slides_data = extract_text_with_metadata_from_ppt(ppt_path)
-                if not slides_data:
+                old_entry = manifest.get(ppt_path)
+                status, result, delta = process_deck(
+                    ppt_path, ppt_json_folder, json_filename, old_entry,
+                    {entry["content_hash"]: entry["json_file"] for entry in manifest.entries().values()}
+                )
+                if not result["slides"]:
                     print("No text extracted from the selected PowerPoint file.")
                     print("\n")
                     continue
 
-                # Convert the extracted data to JSON format
-                slides_json = json.dumps(slides_data, indent=4, ensure_ascii=False)
-
-                # Save the JSON to a file with the same name as the PowerPoint file
-                json_filename = os.path.splitext(selected_file)[0] + ".json"
-                output_file = os.path.join(ppt_json_folder, json_filename)
-                with open(output_file, "w", encoding="utf-8") as f:
-                    f.write(slides_json)
-                print(f"Slides data saved to {output_file}")
-                print("\n")
-
-                # Update management data
-                management_data[selected_file] = last_modified_str
-                save_management_data(management_file, management_data)
+                # Re-index only the slides that changed and update the manifest
+                if delta is not None:
+                    get_embedding_index(ppt_json_folder).apply_delta(delta, deck_source_for_path(ppt_path))
+                    if get_dedup_threshold() is not None:
+                        get_dedup_index(ppt_json_folder).apply_delta(delta, deck_source_for_path(ppt_path))
+                # Cached replies about the previous version of the deck are no longer valid
+                if response_cache is not None and old_entry and old_entry.get("content_hash") != result["content_hash"]:
+                    response_cache.invalidate_decks([old_entry.get("content_hash")])
+                manifest.record(ppt_path, result["content_hash"], result["json_file"], result["slides"])
+            manifest.save()
+
+            if delta is None:
+                print("No new update found.")
+            else:
+                print(f"Slides data saved to {output_file} ({len(delta['changed'])} changed, {len(delta['removed'])} removed)")
+            print("\n")
 
-                # Set the extracted JSON data as the system prompt
-                system_message = slides_json
+            # Set the extracted slides as the system prompt
+            deck_json_paths = [output_file]
 
         elif option == 2:
             # List JSON files in the ppt_json folder
-            json_files = [f for f in os.listdir(ppt_json_folder) if f.lower().endswith(".json")]
+            json_files = sorted(f for f in os.listdir(ppt_json_folder) if f.lower().endswith(".json"))
             if not json_files:
                 print("No JSON files found in the folder.")
                 print("\n")
@@ -287,20 +370,35 @@ def main():
             selected_num = int(input("Enter the number: "))
 
             if selected_num == len(json_files) + 1:
-                # Combine all JSON files into one system message
-                combined_data = []
-                for json_file in json_files:
-                    file_path = os.path.join(ppt_json_folder, json_file)
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        combined_data.extend(json.load(f))
-                system_message = json.dumps(combined_data, indent=4, ensure_ascii=False)
+                # Combine all decks into one system message (streamed from the corpus store when it is built)
+                deck_json_paths = [os.path.join(ppt_json_folder, json_file) for json_file in json_files]
             else:
-                selected_file = json_files[selected_num - 1]
-                file_path = os.path.join(ppt_json_folder, selected_file)
-                with open(file_path, "r", encoding="utf-8") as f:
-                    system_message = f.read()
+                deck_json_paths = [os.path.join(ppt_json_folder, json_files[selected_num - 1])]
 
         elif option == 3:
+            # List the most recent sessions of conversation_history
+            sessions = session_store.list_sessions()
+            if not sessions:
+                print("No saved conversations found.")
+                continue
+
+            print("\n")
+            print("Select a conversation by entering its number:")
+            print("\n")
+            for idx, session in enumerate(sessions, start=1):
+                print(f"{idx}: {session['updated']} | {', '.join(session['decks'])} | {session['first_question'][:60]}")
+            print("\n")
+            selected_num = int(input("Enter the number: "))
+            resumed_session, resumed_messages = session_store.load(sessions[selected_num - 1]["id"])
+
+            # The session only references its decks, so the system message is rebuilt from ppt_json
+            deck_json_paths = [os.path.join(ppt_json_folder, deck["json_file"]) for deck in resumed_session["context"]["decks"]]
+            missing = [os.path.basename(path) for path in deck_json_paths if not os.path.exists(path)]
+            if missing:
+                print(f"JSON file(s) of this conversation no longer exist: {', '.join(missing)}")
+                continue
+
+        elif option == 4:
             print("Exiting the program.")
             break
 
@@ -308,42 +406,138 @@ def main():
             print("Invalid option selected.")
             continue
 
-        # Prepend the pre-paper prompt to the system message
-        system_message = pre_paper_prompt + "\n\n" + system_message
-
-        # Instantiate the text generator
-        generator = OpenAITextGenerator(openai_api_base, deployment_name, get_access_token(), subscription_key)
-
-        # Initialize memory to store the conversation
-        conversation_memory = [
-            {"role": "system", "content": system_message}
-        ]
+        # The pre-paper prompt and the decks in file name order, built once per prompt version and deck set
+        bundle = context_bundles.get(pre_paper_prompt, deck_json_paths, prompt_format)
+        system_message = bundle["system_message"]
+        deck_json_paths = bundle["deck_paths"]
+        print(f"System message: ~{bundle['tokens']} tokens ({prompt_format} format, "
+              f"bundle {bundle['content_hash'][:12]} {'built' if bundle['source'] == 'built' else 'reused'})")
+
+        # Instantiate the text generator; cached replies are keyed by the deck versions in the manifest
+        deck_hashes = get_deck_hashes(IngestionManifest(management_file), deck_json_paths)
+        if resumed_session is not None:
+            context = resumed_session["context"]
+            if [deck["content_hash"] for deck in context["decks"]] != deck_hashes or context["prompt_hash"] != hash_text(pre_paper_prompt):
+                print("Note: the decks or the pre-paper prompt changed since this conversation; the current versions are used.")
+        generator = OpenAITextGenerator(
+            openai_api_base, deployment_name, get_access_token, subscription_key,
+            response_cache=response_cache,
+            context_id=make_context_id(pre_paper_prompt, deck_hashes, context_mode, retrieval_top_k, prompt_format),
+            deck_hashes=deck_hashes
+        )
+
+        # Only the system prefix and the most recent turns are sent; older turns are summarized
+        context_window = ContextWindow(system_message, summarizer=make_summarizer(generator.send_request))
+
+        # The session log stores references to the prompt and decks instead of the system message
+        if resumed_session is not None:
+            session_log = session_store.open(resumed_session["id"])
+            for message in resumed_messages:
+                context_window.add_message(message["role"], message["content"])
+            print(f"Resumed conversation {session_log.session_id} ({len(resumed_messages)} messages)")
+        else:
+            session_log = session_store.create(make_session_context(
+                pre_paper_prompt, deck_json_paths, deck_hashes, context_mode=context_mode, prompt_format=prompt_format
+            ))
+
+        # In retrieved/semantic mode only the slides relevant to each question are put into the prompt
+        retrieve = None
+        shard_contexts = None
+        if context_mode == "retrieved":
+            retrieval_index = BM25Index.merge([load_or_build_index(path) for path in deck_json_paths])
+            retrieve = lambda question: retrieve_slides(retrieval_index, question, retrieval_top_k)
+        elif context_mode == "semantic":
+            embedding_index = get_embedding_index(ppt_json_folder)
+            deck_records = []
+            for path in deck_json_paths:
+                with open(path, "r", encoding="utf-8") as f:
+                    deck_records.extend(json.load(f))
+            index_missing_decks(embedding_index, deck_records)
+            retrieve = lambda question: retrieve_slides_semantic(embedding_index, deck_records, question, retrieval_top_k)
+        elif context_mode == "mapreduce" or count_message_tokens([{"role": "system", "content": system_message}]) > context_window.max_tokens:
+            # The decks are split into shards that are asked separately; the chat window keeps only the prompt
+            deck_records = []
+            for path in deck_json_paths:
+                with open(path, "r", encoding="utf-8") as f:
+                    deck_records.extend(json.load(f))
+            # Slides repeated across decks are asked about once
+            if len(deck_json_paths) > 1 and get_dedup_threshold() is not None:
+                deck_records, _ = collapse_duplicates(deck_records, get_dedup_index(ppt_json_folder), get_dedup_threshold())
+            shard_contexts = build_shard_contexts(deck_records, prompt_format=prompt_format)
+            context_window.system_message = pre_paper_prompt
+            print(f"Map-reduce mode: {len(shard_contexts)} shard(s) asked in parallel per question")
 
         # Chat with the extracted text as the system prompt
         while True:
-            user_message = input("Enter your prompt (type 'exit' to quit): ")
+            user_message = input("Enter your prompt (type 'exit' to quit, start with '!' to skip the response cache): ")
             if user_message.strip().lower() == "exit":
                 break
+            use_cache = not user_message.startswith("!")
+            if not use_cache:
+                user_message = user_message[1:]
+
+            with turn(mode=context_mode, format=prompt_format) as current_turn:
+                # The question goes into the session log only once it has a reply
+                context_window.add_message("user", user_message)
+                with span("prompt_assembly"):
+                    if retrieve is not None:
+                        retrieved_slides = retrieve(user_message)
+                        context_window.system_message = pre_paper_prompt + "\n\n" + format_context(retrieved_slides, prompt_format)
+                    messages = context_window.build_messages()
+                current_turn.set(prompt_tokens_estimate=context_window.last_prompt_tokens)
+
+                # Send the token-budgeted message list to the AI and print tokens as they arrive
+                print("\nResponse:")
+                response_parts = []
+                answer_start = time.perf_counter()
+                if shard_contexts is not None:
+                    deltas = answer_map_reduce(messages, shard_contexts, pre_paper_prompt,
+                                               generator.send_request, generator.stream_request)
+                else:
+                    deltas = generator.stream_request(messages, use_cache=use_cache)
+                for delta in deltas:
+                    print(delta, end="", flush=True)
+                    response_parts.append(delta)
+                response = "".join(response_parts)
+                print()
+
+            # A failed request yields nothing: the question is taken back out of the conversation
+            metrics = generator.last_metrics
+            if not response:
+                context_window.discard_last_message()
+                print(f"(No reply: {metrics.get('error') or 'the request failed'}. Nothing was added to the conversation; ask again.)")
+                print()
+                continue
 
-            # Add user message to memory
-            conversation_memory.append({"role": "user", "content": user_message})
-
-            # Send the entire conversation memory to the AI
-            response = generator.send_request(
-                system_message=system_message,
-                user_message=json.dumps(conversation_memory, ensure_ascii=False)
-            )
-
-            # Add AI response to memory
-            conversation_memory.append({"role": "assistant", "content": response})
-
-            # Display the AI's response
-            print("\nResponse:")
-            print(response)
+            # Add the turn to the session log and the AI response to the context window
+            session_log.append("user", user_message)
+            session_log.append("assistant", response)
+            context_window.add_message("assistant", response)
+
+            # Display the prompt size and latency of the turn
+            turn_info = f"prompt: ~{context_window.last_prompt_tokens} tokens"
+            if shard_contexts is not None:
+                turn_info += f" per shard, {len(shard_contexts)} shards, total: {time.perf_counter() - answer_start:.2f}s"
+            elif metrics.get("cached"):
+                turn_info += ", served from the response cache"
+            elif metrics.get("time_to_first_token") is not None:
+                turn_info += f", first token: {metrics['time_to_first_token']:.2f}s, total: {metrics['total_latency']:.2f}s"
+            if metrics.get("error"):
+                turn_info += f", reply cut off: {metrics['error']}"
+            usage_totals = generator.usage_totals
+            if usage_totals["prompt_tokens"]:
+                turn_info += (f", prefix cache: {usage_totals['cached_prompt_tokens'] / usage_totals['prompt_tokens']:.0%}"
+                              f" of {usage_totals['prompt_tokens']} prompt tokens so far")
+            print(f"({turn_info})")
             print()
 
-        # Save the conversation history
-        save_conversation_history(conversation_folder, conversation_memory)
+        # Sync the last turns of the session log
+        session_log.close()
+        print(f"Conversation saved to {session_log.path} (resume it with option 3)")
+        if response_cache is not None:
+            stats = response_cache.stats()
+            print(f"Response cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, "
+                  f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
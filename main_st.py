@@ -4,10 +4,26 @@ import requests
 import certifi
 import urllib3
 import time
-from pptx import Presentation
-from datetime import datetime
+import uuid
+import hashlib
+import contextlib
 import streamlit as st
 from dotenv import load_dotenv
+from token_provider import AccessTokenProvider
+from http_client import get_http_client, iter_chat_deltas
+from context_window import ContextWindow, make_summarizer, estimate_tokens, count_message_tokens
+from tracing import configure_tracing, span, turn, annotate, count, traced
+from prompt_serializer import format_context
+from response_cache import get_response_cache, get_deck_hashes, make_cache_key, make_context_id
+from bm25_index import load_or_build_index, retrieve_slides
+from manifest import IngestionManifest, deck_source_for_path
+from ingest import process_deck
+from ppt_extraction import extract_text_with_metadata_from_ppt
+from embedding_index import EmbeddingIndex, get_embedder, get_index_folder, index_missing_decks, retrieve_slides_semantic
+from session_store import get_session_store, make_session_context, hash_text
+from request_scheduler import get_request_scheduler, COMPLETION_TOKENS_ESTIMATE
+from context_bundle import get_context_bundle_store
+from dedup_index import get_dedup_index, get_dedup_threshold
 
 # Disable insecure request warnings and load environment variables
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -26,42 +42,152 @@ deployment_name = os.getenv("DEPLOYMENT_NAME")
 openai_api_base = os.getenv("OPENAI_API_BASE")
 subscription_key = os.getenv("SUBSCRIPTION_KEY")
 
+# Folder that holds ppt, ppt_json, cache, ... (PPTCHAT_HOME overrides it, e.g. for benchmarks)
+base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+
+# "compact" serializes slides grouped per deck without boilerplate, "json" keeps indented JSON
+prompt_format = os.getenv("PROMPT_FORMAT", "compact")
+
+# Ask for the usage chunk at the end of streamed replies (needs an API version with stream_options);
+# without it the per-turn token counts are estimated
+stream_usage = os.getenv("STREAM_USAGE", "0") == "1"
+
+# Labels of the context modes offered in the sidebar, by CONTEXT_MODE name (see main.py)
+CONTEXT_MODE_LABELS = {"full": "Full deck", "retrieved": "Retrieved", "semantic": "Semantic"}
+
+# Number of turns kept for the tracing panel of a session
+TRACE_PANEL_TURNS = 50
+
+# Tracer shared by all Streamlit sessions in this process (traces/trace_streamlit.jsonl)
+@st.cache_resource
+def get_shared_tracer():
+    return configure_tracing("streamlit", os.path.join(base_folder, "traces"))
+
+# Token provider shared by all Streamlit sessions in this process
+@st.cache_resource
+def get_token_provider():
+    token_cache_file = os.path.join(base_folder, "cache", "azure_token.json")
+    return AccessTokenProvider(
+        tenant_id, client_id, client_secret, resource,
+        token_url=os.getenv("TOKEN_URL"),
+        cache_file=token_cache_file
+    )
+
 # Function to obtain an Azure AD access token
 def get_access_token():
-    token_url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
-    token_data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret,
-        "scope": resource + ".default"
-    }
-    token_headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.post(token_url, data=token_data, headers=token_headers)
-    response.raise_for_status()
-    return response.json().get("access_token")
+    with span("get_access_token"):
+        return get_token_provider().get_token()
+
+# Slide embedding index shared by all Streamlit sessions in this process; it reloads its rows whenever
+# its meta.json changes, so decks indexed by the watcher or ingest.py are searched at once
+@st.cache_resource
+def get_embedding_index(ppt_json_folder):
+    embedder = get_embedder(openai_api_base, get_access_token, subscription_key)
+    return EmbeddingIndex(get_index_folder(ppt_json_folder), embedder)
+
+# Response cache shared by all Streamlit sessions in this process (None if RESPONSE_CACHE=0)
+@st.cache_resource
+def get_shared_response_cache():
+    return get_response_cache(os.path.join(base_folder, "cache", "responses"))
+
+# Conversation logs shared by all Streamlit sessions in this process; old sessions are rotated once
+@st.cache_resource
+def get_shared_session_store():
+    session_store = get_session_store(os.path.join(base_folder, "conversation_history"))
+    session_store.rotate()
+    return session_store
+
+# System messages already assembled for a prompt version and deck set, shared by all sessions and processes
+@st.cache_resource
+def get_shared_context_bundles():
+    return get_context_bundle_store(os.path.join(base_folder, "cache", "context_bundles"))
+
+# Scheduler that every Streamlit session of this process sends its completion requests through
+@st.cache_resource
+def get_shared_scheduler():
+    return get_request_scheduler()
 
 # Class to handle OpenAI text generation requests
 class OpenAITextGenerator:
-    def __init__(self, api_base, deployment, access_token, subscription_key):
+    def __init__(self, api_base, deployment, access_token, subscription_key,
+                 response_cache=None, context_id=None, deck_hashes=(), scheduler=None, session_id=None, on_wait=None):
         self.api_base = api_base.rstrip("/")  # Remove trailing slash if present
         self.deployment = deployment
-        self.access_token = access_token
+        self.access_token = access_token  # Token string or a callable returning one
         self.subscription_key = subscription_key
         self.api_version = "2024-07-01-preview"
-    
-    def send_request(self, messages):
+        self.last_metrics = {}  # Time to first token / total latency of the last streamed reply
+        # Replies are cached per deck context; context_id stands in for the deck system message
+        self.response_cache = response_cache
+        self.context_id = context_id
+        self.deck_hashes = list(deck_hashes)
+        # Requests that miss the cache queue in the shared scheduler; on_wait(position, seconds) shows the wait
+        self.scheduler = scheduler
+        self.session_id = session_id
+        self.on_wait = on_wait
+
+    def get_token(self):
+        return self.access_token() if callable(self.access_token) else self.access_token
+
+    def _cache_key(self, messages, use_cache):
+        if not use_cache or self.response_cache is None or self.context_id is None:
+            return None
+        return make_cache_key(self.deployment, self.context_id, messages)
+
+    def _build_request(self, messages, stream=False):
         api_url = f"{self.api_base}/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
         headers = {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {self.get_token()}",
             "Ocp-Apim-Subscription-Key": self.subscription_key,
             "Content-Type": "application/json",
         }
         data = {"messages": messages}
+        if stream:
+            data["stream"] = True
+            if stream_usage:
+                data["stream_options"] = {"include_usage": True}
+        return api_url, headers, data
+
+    def _schedule(self, messages):
+        """Slot of the shared scheduler for one request (nothing to wait for without a scheduler)."""
+        if self.scheduler is None:
+            return contextlib.nullcontext(None)
+        estimated_tokens = count_message_tokens(messages) + COMPLETION_TOKENS_ESTIMATE
+        return self.scheduler.request(self.session_id, estimated_tokens, self.on_wait)
+
+    def _record_usage(self, messages, content, usage, ticket=None):
+        """Add the token usage of a completed request to the current trace turn and settle its ticket."""
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+            count(cached_prompt_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0))
+        else:
+            prompt_tokens, completion_tokens = count_message_tokens(messages), estimate_tokens(content)
+            annotate(usage_estimated=True)
+        count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if ticket is not None:
+            ticket.actual_tokens = prompt_tokens + completion_tokens
+            count(queue_wait=round(ticket.queue_wait + ticket.rate_limit_wait, 4))
+    
+    @traced("send_request")
+    def send_request(self, messages, use_cache=True):
+        cache_key = self._cache_key(messages, use_cache)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                count(cache_hits=1)
+                return cached
+        api_url, headers, data = self._build_request(messages)
         try:
-            response = requests.post(api_url, headers=headers, json=data, verify=False)
-            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
-            result = response.json()
-            return result['choices'][0]['message']['content']
+            with self._schedule(messages) as ticket:
+                response = get_http_client().post(api_url, headers=headers, json=data)
+                count(retries=response.retry_count)
+                response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+                result = response.json()
+                content = result['choices'][0]['message']['content']
+                self._record_usage(messages, content, result.get("usage"), ticket)
+            if cache_key is not None:
+                self.response_cache.put(cache_key, content, self.deck_hashes)
+            return content
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error occurred: {http_err}")
             print(f"Response content: {response.text}")
@@ -76,96 +202,215 @@ class OpenAITextGenerator:
             print(f"An unexpected error occurred: {e}")
             raise
 
-# Function to extract text and metadata from a PowerPoint file
-def extract_text_with_metadata_from_ppt(file_path):
-    slides_data = []
-    presentation = Presentation(file_path)
-    file_name = os.path.basename(file_path)
+    def stream_request(self, messages, use_cache=True):
+        """Yield the response text as it arrives (stream: true)."""
+        start_time = time.perf_counter()
+        cache_key = self._cache_key(messages, use_cache)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.last_metrics = {"cached": True, "time_to_first_token": 0.0,
+                                     "total_latency": time.perf_counter() - start_time}
+                count(cache_hits=1)
+                yield cached
+                return
+        api_url, headers, data = self._build_request(messages, stream=True)
+        first_token_time = None
+        self.last_metrics = {}
+        parts = []
+        usage = {}
+        with span("stream_request"), self._schedule(messages) as ticket:
+            # The slot is held until the reply has streamed to the end
+            response = get_http_client().post(api_url, headers=headers, json=data, stream=True)
+            count(retries=response.retry_count)
+            try:
+                response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
+                for delta in iter_chat_deltas(response, usage):
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+                self._record_usage(messages, "".join(parts), usage, ticket)
+                # Only a reply that streamed to the end is cached
+                if cache_key is not None:
+                    self.response_cache.put(cache_key, "".join(parts), self.deck_hashes)
+            except requests.exceptions.HTTPError as http_err:
+                print(f"HTTP error occurred: {http_err}")
+                print(f"Response content: {response.text}")
+                raise
+            finally:
+                response.close()
+                self.last_metrics = {
+                    "time_to_first_token": first_token_time - start_time if first_token_time else None,
+                    "total_latency": time.perf_counter() - start_time,
+                    "queue_wait": ticket.queue_wait + ticket.rate_limit_wait if ticket is not None else 0.0
+                }
+                if first_token_time:
+                    annotate(time_to_first_token=round(first_token_time - start_time, 4))
 
-    for slide_number, slide in enumerate(presentation.slides, start=1):
-        slide_text = ""
-        slide_title = None
+# Function to extract the slides of an uploaded deck; memoized by content hash across reruns and sessions
+@st.cache_data(show_spinner=False)
+def extract_uploaded_slides(file_path, content_hash):
+    return extract_text_with_metadata_from_ppt(file_path)
 
-        for shape in slide.shapes:
-            if shape.has_text_frame:
-                for paragraph in shape.text_frame.paragraphs:
-                    slide_text += paragraph.text + "\n"
-            if shape.has_text_frame and shape.text_frame.text and not slide_title:
-                slide_title = shape.text_frame.text
+# Function to ingest an uploaded deck (writes the deck, the manifest and the indexes every time it is called)
+def ingest_uploaded_deck(file_name, content_hash, file_bytes, ppt_folder, ppt_json_folder, management_file):
+    file_path = os.path.join(ppt_folder, file_name)
+    with open(file_path, "wb") as f:
+        f.write(file_bytes)
+    manifest = IngestionManifest(management_file)
+    json_filename = manifest.json_file_for(file_path)
+    known_contents = {entry["content_hash"]: entry["json_file"] for entry in manifest.entries().values()}
+    old_entry = manifest.get(file_path)
+    status, result, delta = process_deck(
+        file_path, ppt_json_folder, json_filename, old_entry, known_contents,
+        extract=lambda path: extract_uploaded_slides(path, content_hash)
+    )
+    if delta is not None:
+        get_embedding_index(ppt_json_folder).apply_delta(delta, deck_source_for_path(file_path))
+        if get_dedup_threshold() is not None:
+            get_dedup_index(ppt_json_folder).apply_delta(delta, deck_source_for_path(file_path))
+    # Cached replies about the previous version of the deck are no longer valid
+    response_cache = get_shared_response_cache()
+    if response_cache is not None and old_entry and old_entry.get("content_hash") != result["content_hash"]:
+        response_cache.invalidate_decks([old_entry.get("content_hash")])
+    manifest.record(file_path, result["content_hash"], result["json_file"], result["slides"])
+    manifest.save()
+    list_json_files.clear()
+    return json_filename
 
-        slides_data.append({
-            "file_name": file_name,
-            "title": slide_title if slide_title else f"Slide {slide_number}",
-            "slide_number": slide_number,
-            "text": slide_text.strip()
-        })
+# Function to list the extracted JSON files; the mtime argument invalidates the cache when the watcher
+# or another process adds or removes a deck (cleared as well when a deck is uploaded)
+@st.cache_data(show_spinner=False)
+def list_json_files(ppt_json_folder, mtime):
+    return sorted(f for f in os.listdir(ppt_json_folder) if f.lower().endswith(".json"))
 
-    return slides_data
+# Function to read pre_paper_prompt.txt; the mtime argument invalidates the cache when the file changes
+@st.cache_data(show_spinner=False)
+def load_pre_paper_prompt(pre_paper_prompt_path, mtime):
+    with open(pre_paper_prompt_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+# BM25 index of a deck shared by all sessions; the mtime argument invalidates it when the deck changes
+@st.cache_resource(show_spinner=False)
+def get_bm25_index(json_path, mtime):
+    return load_or_build_index(json_path)
 
 # Force a rerun by setting a unique query parameter
 def force_rerun():
     st.set_query_params(_=str(time.time()))
 
+# Function to set the deck of the chat, optionally with the messages of a resumed session
+def start_conversation(deck_json_path, pre_paper_prompt, session_log, messages=()):
+    """Build the system message and reset the session state; returns the system message."""
+    # Combine pre_paper_prompt and deck content; built once per prompt version and deck
+    system_message = get_shared_context_bundles().get(pre_paper_prompt, [deck_json_path], prompt_format)["system_message"]
+
+    # Update session state for conversation
+    st.session_state.conversation = [{"role": "system", "content": system_message}] + list(messages)
+    st.session_state.context_window = ContextWindow(system_message)
+    for message in messages:
+        st.session_state.context_window.add_message(message["role"], message["content"])
+    st.session_state.pre_paper_prompt = pre_paper_prompt
+    st.session_state.deck_json_path = deck_json_path
+    st.session_state.deck_hashes = get_deck_hashes(IngestionManifest(management_file), [deck_json_path])
+    st.session_state.pop("deck_records", None)
+    if st.session_state.get("session_log") is not None:
+        st.session_state.session_log.close()
+    st.session_state.session_log = session_log
+    return system_message
+
 # Set page layout and title
 st.set_page_config(layout="wide")
 st.title("PPT Chat Application")
 
 # Define folder paths and ensure they exist
-ppt_folder = os.path.join("C:\\", "python_scripts", "pptChat", "ppt")
-ppt_json_folder = os.path.join("C:\\", "python_scripts", "pptChat", "ppt_json")
-conversation_folder = os.path.join("C:\\", "python_scripts", "pptChat", "conversation_history")
-system_prompt_folder = os.path.join("C:\\", "python_scripts", "pptChat", "system_prompt")
+ppt_folder = os.path.join(base_folder, "ppt")
+ppt_json_folder = os.path.join(base_folder, "ppt_json")
+conversation_folder = os.path.join(base_folder, "conversation_history")
+system_prompt_folder = os.path.join(base_folder, "system_prompt")
+management_folder = os.path.join(base_folder, "text_extraction_management_files")
+management_file = os.path.join(management_folder, "ppt_management.json")
 
 os.makedirs(ppt_folder, exist_ok=True)
 os.makedirs(ppt_json_folder, exist_ok=True)
 os.makedirs(conversation_folder, exist_ok=True)
 os.makedirs(system_prompt_folder, exist_ok=True)
+os.makedirs(management_folder, exist_ok=True)
+tracer = get_shared_tracer()
 
 # Sidebar: File upload and JSON file selection
 with st.sidebar:
     st.header("File Management")
     uploaded_file = st.file_uploader("Upload a PowerPoint file", type=["ppt", "pptx"])
     if uploaded_file:
-        file_path = os.path.join(ppt_folder, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Streamlit reruns this script on every interaction; only a new upload is ingested
+        if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+            file_bytes = uploaded_file.getvalue()
+            content_hash = hashlib.sha256(file_bytes).hexdigest()
+            with st.spinner("Extracting text from the PowerPoint file..."):
+                st.session_state.upload_json_filename = ingest_uploaded_deck(
+                    uploaded_file.name, content_hash, file_bytes, ppt_folder, ppt_json_folder, management_file
+                )
+            st.session_state.upload_file_id = uploaded_file.file_id
         st.success(f"Uploaded {uploaded_file.name}")
+        st.success(f"Extracted text saved to {st.session_state.upload_json_filename}")
 
-        with st.spinner("Extracting text from the PowerPoint file..."):
-            slides_data = extract_text_with_metadata_from_ppt(file_path)
-            json_filename = os.path.splitext(uploaded_file.name)[0] + ".json"
-            json_path = os.path.join(ppt_json_folder, json_filename)
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(slides_data, f, indent=4, ensure_ascii=False)
-        st.success(f"Extracted text saved to {json_filename}")
-
-    json_files = [f for f in os.listdir(ppt_json_folder) if f.lower().endswith(".json")]
+    json_files = list_json_files(ppt_json_folder, os.stat(ppt_json_folder).st_mtime_ns)
     selected_json = st.selectbox("Select a JSON file", json_files)
 
+    # "Full deck" sends every slide with each turn, "Retrieved" / "Semantic" only the best
+    # BM25 / embedding matches; the values are the CONTEXT_MODE names of main.py
+    context_mode = st.radio(
+        "Context mode", list(CONTEXT_MODE_LABELS), format_func=CONTEXT_MODE_LABELS.get, horizontal=True
+    )
+    retrieval_top_k = st.slider("Slides to retrieve", 1, 20, 5, disabled=context_mode == "full")
+    # Repeated questions about the same deck are answered from the response cache unless unchecked
+    use_response_cache = st.checkbox("Use response cache", value=True)
+
+    # Read the pre_paper_prompt.txt content
+    pre_paper_prompt_path = os.path.join(system_prompt_folder, "pre_paper_prompt.txt")
+    if os.path.exists(pre_paper_prompt_path):
+        pre_paper_prompt = load_pre_paper_prompt(pre_paper_prompt_path, os.path.getmtime(pre_paper_prompt_path))
+    else:
+        pre_paper_prompt = ""
+    session_store = get_shared_session_store()
+
     # Add "Set" button to confirm the selected JSON file
     if st.button("Set"):
         if selected_json:
-            # Read the pre_paper_prompt.txt content
-            pre_paper_prompt_path = os.path.join(system_prompt_folder, "pre_paper_prompt.txt")
-            if os.path.exists(pre_paper_prompt_path):
-                with open(pre_paper_prompt_path, "r", encoding="utf-8") as f:
-                    pre_paper_prompt = f.read()
-            else:
-                pre_paper_prompt = ""
-
-            # Read the selected JSON file content
-            with open(os.path.join(ppt_json_folder, selected_json), "r", encoding="utf-8") as f:
-                json_content = f.read()
-
-            # Combine pre_paper_prompt and JSON content
-            system_message = pre_paper_prompt + "\n\n" + json_content
-
-            # Update session state for conversation
-            st.session_state.conversation = [{"role": "system", "content": system_message}]
-            st.success(f"System message updated with content from {selected_json}")
+            deck_json_path = os.path.join(ppt_json_folder, selected_json)
+            deck_hashes = get_deck_hashes(IngestionManifest(management_file), [deck_json_path])
+            # The session log references the prompt and deck instead of storing the system message
+            session_log = session_store.create(make_session_context(
+                pre_paper_prompt, [deck_json_path], deck_hashes, context_mode=context_mode, prompt_format=prompt_format
+            ), app="streamlit")
+            system_message = start_conversation(deck_json_path, pre_paper_prompt, session_log)
+            st.success(f"System message updated with content from {selected_json} (~{estimate_tokens(system_message)} tokens)")
         else:
             st.error("Please select a JSON file before clicking 'Set'.")
 
+    # Resume an earlier conversation about a single deck (from this app or main.py)
+    sessions = [session for session in session_store.list_sessions() if len(session["decks"]) == 1]
+    if sessions:
+        with st.expander("Resume a conversation"):
+            session = st.selectbox(
+                "Conversation", sessions,
+                format_func=lambda item: f"{item['updated'][:16]} | {item['decks'][0]} | {item['first_question'][:40]}"
+            )
+            if st.button("Resume"):
+                header, messages = session_store.load(session["id"])
+                deck_json_path = os.path.join(ppt_json_folder, session["decks"][0])
+                if not os.path.exists(deck_json_path):
+                    st.error(f"{session['decks'][0]} no longer exists.")
+                else:
+                    start_conversation(deck_json_path, pre_paper_prompt, session_store.open(session["id"]), messages)
+                    context = header["context"]
+                    if [deck["content_hash"] for deck in context["decks"]] != st.session_state.deck_hashes \
+                            or context["prompt_hash"] != hash_text(pre_paper_prompt):
+                        st.warning("The deck or the pre-paper prompt changed since this conversation; the current versions are used.")
+                    st.success(f"Resumed conversation {session['id']} ({len(messages)} messages)")
+
 # Force a rerun by setting a unique query parameter
 def force_rerun():
     st.experimental_set_query_params(_=str(time.time()))
@@ -185,26 +430,133 @@ if "conversation" in st.session_state:
 
     # Accept user input
     if user_prompt := st.chat_input("Type your message here..."):
-        # Add user message to conversation history
-        st.session_state.conversation.append({"role": "user", "content": user_prompt})
-        # Display user message in chat message container
-        with st.chat_message("user"):
-            st.markdown(user_prompt)
-
-        # Generate assistant response using OpenAI API
-        generator = OpenAITextGenerator(
-            openai_api_base,
-            deployment_name,
-            get_access_token(),
-            subscription_key,
-        )
-        with st.chat_message("assistant"):
-            with st.spinner("Waiting for response..."):
+        with turn(mode=context_mode, format=prompt_format) as current_turn:
+            # The question is added to the conversation history and the session log once it has a reply
+            context_window = st.session_state.context_window
+            context_window.add_message("user", user_prompt)
+            with span("prompt_assembly"):
+                if context_mode == "retrieved":
+                    deck_json_path = st.session_state.deck_json_path
+                    retrieval_index = get_bm25_index(deck_json_path, os.path.getmtime(deck_json_path))
+                    retrieved_slides = retrieve_slides(retrieval_index, user_prompt, retrieval_top_k)
+                elif context_mode == "semantic":
+                    if "deck_records" not in st.session_state:
+                        with open(st.session_state.deck_json_path, "r", encoding="utf-8") as f:
+                            st.session_state.deck_records = json.load(f)
+                        index_missing_decks(get_embedding_index(ppt_json_folder), st.session_state.deck_records)
+                    retrieved_slides = retrieve_slides_semantic(
+                        get_embedding_index(ppt_json_folder), st.session_state.deck_records, user_prompt, retrieval_top_k
+                    )
+                if context_mode != "full":
+                    context_window.system_message = (
+                        st.session_state.pre_paper_prompt + "\n\n" + format_context(retrieved_slides, prompt_format)
+                    )
+                else:
+                    context_window.system_message = st.session_state.conversation[0]["content"]
+            # Display user message in chat message container
+            with st.chat_message("user"):
+                st.markdown(user_prompt)
+
+            # Generate assistant response using OpenAI API
+            generator = OpenAITextGenerator(
+                openai_api_base,
+                deployment_name,
+                get_access_token,
+                subscription_key,
+                response_cache=get_shared_response_cache(),
+                context_id=make_context_id(
+                    st.session_state.pre_paper_prompt, st.session_state.deck_hashes, context_mode, retrieval_top_k, prompt_format
+                ),
+                deck_hashes=st.session_state.deck_hashes,
+                scheduler=get_shared_scheduler(),
+                session_id=st.session_state.setdefault("scheduler_session_id", uuid.uuid4().hex),
+            )
+            context_window.summarizer = make_summarizer(generator.send_request)
+            with st.chat_message("assistant"):
+                queue_status = st.empty()
+
+                # Show the place in the shared queue while other sessions' requests go first
+                def show_queue_status(position, seconds):
+                    if position:
+                        queue_status.info(f"Waiting for other users' requests: position {position} in the queue, about {seconds}s")
+                    elif seconds:
+                        queue_status.info(f"Waiting for the token rate limit: about {seconds}s")
+                    else:
+                        queue_status.empty()
+
+                generator.on_wait = show_queue_status
                 try:
-                    # Send the entire conversation history to the API
-                    response = generator.send_request(st.session_state.conversation)
-                    st.markdown(response)
-                    # Add assistant response to conversation history
+                    # Send the token-budgeted history to the API and render tokens as they arrive
+                    response = st.write_stream(
+                        generator.stream_request(context_window.build_messages(), use_cache=use_response_cache)
+                    )
+                    if not response:
+                        raise requests.exceptions.RequestException("The reply was empty")
+                    # Add the turn to the conversation history and the session log
+                    st.session_state.conversation.append({"role": "user", "content": user_prompt})
                     st.session_state.conversation.append({"role": "assistant", "content": response})
+                    st.session_state.session_log.append("user", user_prompt)
+                    st.session_state.session_log.append("assistant", response)
+                    context_window.add_message("assistant", response)
+                    current_turn.set(prompt_tokens_estimate=context_window.last_prompt_tokens)
+                    metrics = generator.last_metrics
+                    turn_info = f"Prompt: ~{context_window.last_prompt_tokens} tokens"
+                    if metrics.get("cached"):
+                        turn_info += " | Served from the response cache"
+                    elif metrics.get("time_to_first_token") is not None:
+                        turn_info += f" | First token: {metrics['time_to_first_token']:.2f}s | Total: {metrics['total_latency']:.2f}s"
+                        if metrics.get("queue_wait", 0) >= 0.05:
+                            turn_info += f" (queued {metrics['queue_wait']:.2f}s)"
+                    if generator.response_cache is not None:
+                        stats = generator.response_cache.stats()
+                        turn_info += (f" | Cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+                                      f"{stats['misses']} misses")
+                    st.caption(turn_info)
                 except requests.exceptions.HTTPError as e:
-                    st.error(f"Error: {e.response.text}")
\ No newline at end of file
+                    # A failed question is not kept, so the next one does not follow an unanswered turn
+                    context_window.discard_last_message()
+                    st.error(f"Error: {e.response.text}")
+                except requests.exceptions.RequestException as e:
+                    context_window.discard_last_message()
+                    st.error(f"Error: {e}")
+        # Keep the last turns of this session for the tracing panel
+        if tracer.enabled:
+            st.session_state.setdefault("trace_turns", []).append(current_turn.to_dict())
+            del st.session_state.trace_turns[:-TRACE_PANEL_TURNS]
+
+# Function to add up the seconds of the named spans of a traced turn
+def span_seconds(turn_record, name):
+    return round(sum(span_["seconds"] for span_ in turn_record["spans"] if span_["name"] == name), 4)
+
+# Sidebar: per-turn timings and token usage of this session (rendered last so it includes this turn)
+if st.session_state.get("trace_turns"):
+    with st.sidebar:
+        with st.expander("Tracing", expanded=False):
+            trace_turns = st.session_state.trace_turns
+            total_prompt = sum(t.get("prompt_tokens", 0) for t in trace_turns)
+            total_completion = sum(t.get("completion_tokens", 0) for t in trace_turns)
+            first_tokens = [t["time_to_first_token"] for t in trace_turns if t.get("time_to_first_token") is not None]
+            total_cached = sum(t.get("cached_prompt_tokens", 0) for t in trace_turns)
+            column_1, column_2, column_3, column_4 = st.columns(4)
+            column_1.metric("Turns", len(trace_turns))
+            column_2.metric("Tokens", f"{total_prompt + total_completion:,}")
+            column_3.metric("Avg first token", f"{sum(first_tokens) / len(first_tokens):.2f}s" if first_tokens else "-")
+            column_4.metric("Prefix cache", f"{total_cached / total_prompt:.0%}" if total_prompt else "-")
+            st.dataframe([
+                {
+                    "time": t["time"][11:19],
+                    "total_s": t["seconds"],
+                    "token_s": span_seconds(t, "get_access_token"),
+                    "prompt_s": span_seconds(t, "prompt_assembly"),
+                    "completion_s": span_seconds(t, "stream_request"),
+                    "first_token_s": t.get("time_to_first_token"),
+                    "queue_s": t.get("queue_wait", 0),
+                    "prompt_tokens": t.get("prompt_tokens", 0),
+                    "cached_tokens": t.get("cached_prompt_tokens", 0),
+                    "completion_tokens": t.get("completion_tokens", 0),
+                    "estimated": bool(t.get("usage_estimated")),
+                    "retries": t.get("retries", 0),
+                    "cache_hit": bool(t.get("cache_hits")),
+                }
+                for t in reversed(trace_turns)
+            ], hide_index=True)
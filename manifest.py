@@ -0,0 +1,185 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from file_utils import FileLock, atomic_write_json
+
+MANIFEST_VERSION = 2
+
+# Function to compute the content hash of a file
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of the file body, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Function to compute the hash of one extracted slide
+def hash_slide(record):
+    """Hash the extracted content of a slide (the path-dependent slide_link is left out)."""
+    content = json.dumps([record.get("title"), record.get("text"), record.get("note")], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+# Function to compute the hashes of all slides of a deck
+def slide_hashes(slides_data):
+    return {str(record["slide_number"]): hash_slide(record) for record in slides_data}
+
+# Function to compare extracted slides with the hashes stored in the manifest
+def diff_slides(old_hashes, slides_data):
+    """Return the delta downstream indexes need: changed/added slide records and removed slide numbers."""
+    new_hashes = slide_hashes(slides_data)
+    changed = [record for record in slides_data if old_hashes.get(str(record["slide_number"])) != new_hashes[str(record["slide_number"])]]
+    removed = sorted(int(number) for number in old_hashes if number not in new_hashes)
+    return {
+        "file_name": slides_data[0]["file_name"] if slides_data else None,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": len(slides_data) - len(changed),
+    }
+
+# Function to get the manifest key of a PowerPoint file
+def get_manifest_key(ppt_path):
+    """Absolute, case-normalized path, so same-named files in different folders do not collide."""
+    return os.path.normcase(os.path.abspath(ppt_path))
+
+# Function to identify the deck a slide was extracted from
+def deck_source(record):
+    """The deck's file:/// link without the slide number: unlike file_name, unique across folders."""
+    slide_link = record.get("slide_link") or ""
+    if "#slide=" in slide_link:
+        return slide_link.rsplit("#slide=", 1)[0]
+    return record.get("file_name") or ""
+
+# Function to get the deck source of a PowerPoint file, as found in the links of its extracted slides
+def deck_source_for_path(ppt_path):
+    return f"file:///{os.path.abspath(ppt_path)}"
+
+# Class to handle the content-hash ingestion manifest (ppt_management.json)
+class IngestionManifest:
+    """Per-file content hash, size/mtime pre-check and per-slide hashes.
+
+    Writes take a lock file, re-read the manifest and merge only this process's changes,
+    so several ingesting processes can update it concurrently without losing entries.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock_path = file_path + ".lock"
+        self._dirty = {}  # key -> entry, or None for a removed entry
+        self._assigned = {}  # key -> JSON file name handed out before the deck was recorded
+        self.data = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.file_path):
+            return {"version": MANIFEST_VERSION, "files": {}, "legacy": {}}
+        with open(self.file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            # Old format: {file name: mtime ISO string}; entries are adopted on first use
+            return {"version": MANIFEST_VERSION, "files": {}, "legacy": data}
+        data.setdefault("legacy", {})
+        return data
+
+    def get(self, ppt_path):
+        return self.data["files"].get(get_manifest_key(ppt_path))
+
+    def entries(self):
+        return dict(self.data["files"])
+
+    def is_unchanged(self, ppt_path, ppt_json_folder):
+        """Fast pre-check on size and mtime; no hashing unless a legacy entry is being adopted."""
+        entry = self.get(ppt_path)
+        if entry is None:
+            return self._adopt_legacy(ppt_path, ppt_json_folder)
+        stat = os.stat(ppt_path)
+        return (
+            entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+            and os.path.exists(os.path.join(ppt_json_folder, entry["json_file"]))
+        )
+
+    def _adopt_legacy(self, ppt_path, ppt_json_folder):
+        """Convert an old mtime-only entry without re-extracting the deck."""
+        file_name = os.path.basename(ppt_path)
+        last_modified_str = datetime.fromtimestamp(os.path.getmtime(ppt_path)).isoformat()
+        json_file = os.path.splitext(file_name)[0] + ".json"
+        json_path = os.path.join(ppt_json_folder, json_file)
+        if self.data["legacy"].get(file_name) != last_modified_str or not os.path.exists(json_path):
+            return False
+        with open(json_path, "r", encoding="utf-8") as f:
+            slides_data = json.load(f)
+        self.record(ppt_path, hash_file(ppt_path), json_file, slide_hashes(slides_data))
+        self.data["legacy"].pop(file_name, None)
+        return True
+
+    def find_by_content(self, content_hash):
+        """Return an entry with the same content (e.g. a copied deck), if any."""
+        for entry in self.data["files"].values():
+            if entry["content_hash"] == content_hash:
+                return entry
+        return None
+
+    def json_file_for(self, ppt_path):
+        """JSON file name for a deck: <name>.json, or <name>_<hash>.json if another deck already uses it.
+
+        Names handed out earlier, e.g. to foo.ppt before foo.pptx in the same ingestion run, count as used.
+        """
+        entry = self.get(ppt_path)
+        if entry is not None:
+            return entry["json_file"]
+        key = get_manifest_key(ppt_path)
+        if key in self._assigned:
+            return self._assigned[key]
+        stem = os.path.splitext(os.path.basename(ppt_path))[0]
+        json_file = stem + ".json"
+        used = {other["json_file"] for other_key, other in self.data["files"].items() if other_key != key}
+        used.update(name for other_key, name in self._assigned.items() if other_key != key)
+        if json_file in used:
+            json_file = f"{stem}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}.json"
+        self._assigned[key] = json_file
+        return json_file
+
+    def make_entry(self, ppt_path, content_hash, json_file, hashes):
+        stat = os.stat(ppt_path)
+        return {
+            "file_name": os.path.basename(ppt_path),
+            "json_file": json_file,
+            "content_hash": content_hash,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "slides": hashes,
+        }
+
+    def record(self, ppt_path, content_hash, json_file, hashes):
+        self.set_entry(ppt_path, self.make_entry(ppt_path, content_hash, json_file, hashes))
+
+    def set_entry(self, ppt_path, entry):
+        key = get_manifest_key(ppt_path)
+        self.data["files"][key] = entry
+        self._dirty[key] = entry
+
+    def remove(self, ppt_path):
+        key = get_manifest_key(ppt_path)
+        entry = self.data["files"].pop(key, None)
+        self._assigned.pop(key, None)
+        self._dirty[key] = None
+        return entry
+
+    def save(self):
+        """Merge this process's changes into the manifest on disk and write it atomically."""
+        if not self._dirty:
+            return
+        with FileLock(self.lock_path):
+            data = self._read()
+            for key, entry in self._dirty.items():
+                if entry is None:
+                    data["files"].pop(key, None)
+                else:
+                    data["files"][key] = entry
+            for file_name in list(data["legacy"]):
+                if file_name not in self.data["legacy"]:
+                    data["legacy"].pop(file_name)
+            atomic_write_json(self.file_path, data)
+        self.data = data
+        self._dirty = {}
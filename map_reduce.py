@@ -0,0 +1,139 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from context_window import estimate_tokens, count_message_tokens
+from prompt_serializer import format_context
+from tracing import span, annotate
+
+# Answer pre_paper_prompt.txt asks for when the context does not cover the question
+NO_RELEVANT_INFORMATION = "No relevant information is found in the given ppt file."
+
+REDUCE_SYSTEM_PROMPT = (
+    "You merge partial answers to the user's question into one answer. Each partial answer was written "
+    "from a different part of a set of PowerPoint files.\n"
+    "- Begin with a brief summary, then list the metadata of the information as a list or table.\n"
+    "- Keep every file name, slide number, markdown link to a slide and slide title that the partial "
+    "answers cite, next to the information it belongs to.\n"
+    "- Do not add information that is not in the partial answers; merge duplicates instead of repeating them."
+)
+
+# Function to split slide records into prompt-sized shards
+def shard_records(records, max_tokens, prompt_format=None):
+    """Pack records into shards of at most max_tokens serialized tokens.
+
+    Decks are kept whole when they fit in a shard; a deck larger than max_tokens is split between
+    slides. A single slide larger than max_tokens becomes a shard of its own.
+    """
+    decks = []
+    for record in records:
+        if decks and decks[-1][0] == record.get("file_name"):
+            decks[-1][1].append(record)
+        else:
+            decks.append((record.get("file_name"), [record]))
+
+    shards = []
+    current, current_tokens = [], 0
+    for _, deck_records in decks:
+        deck_tokens = estimate_tokens(format_context(deck_records, prompt_format))
+        if deck_tokens <= max_tokens:
+            # Start a new shard instead of splitting a deck that fits in one
+            if current and current_tokens + deck_tokens > max_tokens:
+                shards.append(current)
+                current, current_tokens = [], 0
+            current.extend(deck_records)
+            current_tokens += deck_tokens
+            continue
+        for record in deck_records:
+            record_tokens = estimate_tokens(format_context([record], prompt_format))
+            if current and current_tokens + record_tokens > max_tokens:
+                shards.append(current)
+                current, current_tokens = [], 0
+            current.append(record)
+            current_tokens += record_tokens
+    if current:
+        shards.append(current)
+    return shards
+
+# Function to serialize the shards of a corpus once per chat
+def build_shard_contexts(records, max_tokens=None, prompt_format=None):
+    """Return the serialized text of each shard; MAPREDUCE_SHARD_TOKENS sets the default shard size."""
+    max_tokens = max_tokens or int(os.getenv("MAPREDUCE_SHARD_TOKENS", "60000"))
+    with span("shard_records"):
+        return [format_context(shard, prompt_format) for shard in shard_records(records, max_tokens, prompt_format)]
+
+# Function to tell a "nothing found" partial answer from a real one
+def is_no_relevant_information(answer):
+    normalized = " ".join(answer.split()).strip("\"'*").lower()
+    return normalized.startswith("no relevant information")
+
+# Function to ask the question of every shard concurrently
+def map_shards(messages, shard_contexts, pre_paper_prompt, send_request, max_workers=None):
+    """Send messages once per shard, with the shard as the system message; returns the answers in shard order.
+
+    messages is the turn's message list; its first (system) message is replaced by each shard.
+    """
+    max_workers = max_workers or int(os.getenv("MAPREDUCE_WORKERS", "4"))
+
+    def ask(shard_context):
+        shard_messages = [{"role": "system", "content": pre_paper_prompt + "\n\n" + shard_context}] + messages[1:]
+        # The shards share one cache context, so their replies must not be cached
+        return send_request(shard_messages, use_cache=False)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each worker runs in a copy of the caller's context so its spans land in the current turn
+        futures = [executor.submit(contextvars.copy_context().run, ask, context) for context in shard_contexts]
+        return [future.result() for future in futures]
+
+# Function to build the request that merges partial answers
+def build_reduce_messages(question, partial_answers):
+    parts = "\n\n".join(f"### Partial answer {index}\n{answer}" for index, answer in enumerate(partial_answers, start=1))
+    return [
+        {"role": "system", "content": REDUCE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Question:\n{question}\n\nPartial answers:\n\n{parts}"}
+    ]
+
+# Function to merge partial answers in groups until they fit in one reduce request
+def reduce_partials(question, partial_answers, send_request, max_tokens):
+    """Merge groups of partial answers with send_request until all of them fit within max_tokens."""
+    while len(partial_answers) > 1 and count_message_tokens(build_reduce_messages(question, partial_answers)) > max_tokens:
+        groups, group = [], []
+        for answer in partial_answers:
+            if group and count_message_tokens(build_reduce_messages(question, group + [answer])) > max_tokens:
+                groups.append(group)
+                group = []
+            group.append(answer)
+        groups.append(group)
+        if len(groups) == len(partial_answers):
+            break  # Every answer is too large on its own; send them as they are
+        partial_answers = [
+            group[0] if len(group) == 1 else (send_request(build_reduce_messages(question, group), use_cache=False) or "")
+            for group in groups
+        ]
+    return partial_answers
+
+# Function to answer a question about a corpus larger than the context window
+def answer_map_reduce(messages, shard_contexts, pre_paper_prompt, send_request, stream_request,
+                      max_tokens=None, max_workers=None):
+    """Yield the answer text: map the question over the shards, then stream the merged answer.
+
+    Shards that answer "No relevant information" are dropped. If none is left the fixed
+    no-information sentence is returned, and a single relevant answer is returned as is,
+    so the reduce call is only made when there is something to merge.
+    """
+    max_tokens = max_tokens or int(os.getenv("CONTEXT_MAX_TOKENS", "100000"))
+    question = messages[-1]["content"]
+    with span("map_shards", shards=len(shard_contexts)):
+        partial_answers = map_shards(messages, shard_contexts, pre_paper_prompt, send_request, max_workers)
+    # A failed shard request returns None; it was already logged by send_request
+    answered = [answer for answer in partial_answers if answer]
+    relevant = [answer for answer in answered if not is_no_relevant_information(answer)]
+    annotate(map_shards=len(shard_contexts), relevant_shards=len(relevant), failed_shards=len(partial_answers) - len(answered))
+    if not relevant:
+        if answered:
+            yield NO_RELEVANT_INFORMATION
+        return
+    relevant = reduce_partials(question, relevant, send_request, max_tokens)
+    if len(relevant) == 1:
+        yield relevant[0]
+        return
+    yield from stream_request(build_reduce_messages(question, relevant), use_cache=False)
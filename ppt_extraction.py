@@ -0,0 +1,65 @@
+import os
+from tracing import traced
+from pptx_stream import iter_slides
+
+# Function to list all ppt or pptx files in a given folder
+def list_ppt_files(folder_path):
+    """List all PowerPoint files (.ppt, .pptx, .pptm) in the given folder."""
+    ppt_files = []
+    for filename in os.listdir(folder_path):
+        if filename.lower().endswith((".ppt", ".pptx", ".pptm")):
+            ppt_files.append(filename)
+    ppt_files.sort()
+    return ppt_files
+
+# Function to extract text, title, and slide number from a PowerPoint file
+@traced("extract_deck")
+def extract_text_with_metadata_from_ppt(file_path, engine=None):
+    """Extract text, title, slide number, notes, file name, and slide link from a PowerPoint file.
+
+    EXTRACTION_ENGINE=stream (default) parses the slide XML directly (pptx_stream.py) and also
+    picks up table and group shape text; python-pptx uses the python-pptx object model.
+    """
+    engine = engine or os.getenv("EXTRACTION_ENGINE", "stream")
+    if engine == "stream":
+        return list(iter_slides(file_path))
+    return extract_with_python_pptx(file_path)
+
+# Function to extract the slides through the python-pptx object model
+def extract_with_python_pptx(file_path):
+    from pptx import Presentation  # Only this engine needs the python-pptx object model
+    slides_data = []
+    presentation = Presentation(file_path)
+    file_name = os.path.basename(file_path)  # Get the file name
+    abs_path = os.path.abspath(file_path)    # Convert to absolute path
+
+    for slide_number, slide in enumerate(presentation.slides, start=1):
+        slide_text = ""
+        slide_title = None
+        slide_notes = None
+
+        # Extract text from slide shapes
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                for paragraph in shape.text_frame.paragraphs:
+                    slide_text += paragraph.text + "\n"
+            if shape.has_text_frame and shape.text_frame.text and not slide_title:
+                slide_title = shape.text_frame.text
+
+        # Extract notes from the slide
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame:
+            slide_notes = slide.notes_slide.notes_text_frame.text.strip()
+
+        # Create a link to the slide (e.g., file:///<absolute_path>#slide=<slide_number>)
+        slide_link = f"file:///{abs_path}#slide={slide_number}"
+
+        slides_data.append({
+            "file_name": file_name,
+            "title": slide_title if slide_title else f"Slide {slide_number}",
+            "slide_number": slide_number,
+            "text": slide_text.strip(),
+            "note": slide_notes if slide_notes else "",  # Add notes to the JSON
+            "slide_link": slide_link
+        })
+
+    return slides_data
@@ -0,0 +1,149 @@
+import os
+import zipfile
+import posixpath
+from lxml import etree
+
+# XML namespaces of the PresentationML and DrawingML parts
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+P_SP = f"{{{NS_P}}}sp"
+P_GRP_SP = f"{{{NS_P}}}grpSp"
+P_GRAPHIC_FRAME = f"{{{NS_P}}}graphicFrame"
+P_TX_BODY = f"{{{NS_P}}}txBody"
+P_PH = f"{{{NS_P}}}ph"
+P_SLD_ID = f"{{{NS_P}}}sldId"
+A_P = f"{{{NS_A}}}p"
+A_R = f"{{{NS_A}}}r"
+A_BR = f"{{{NS_A}}}br"
+A_FLD = f"{{{NS_A}}}fld"
+A_T = f"{{{NS_A}}}t"
+A_TC = f"{{{NS_A}}}tc"
+R_ID = f"{{{NS_R}}}id"
+REL_RELATIONSHIP = f"{{{NS_REL}}}Relationship"
+
+NOTES_SLIDE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/notesSlide"
+
+# Function to read the relationships of a package part
+def read_relationships(package, part_name, part_names):
+    """Return {rId: (type, part name)} for part_name, with targets resolved against the part's folder."""
+    folder, base = posixpath.split(part_name)
+    rels_name = posixpath.join(folder, "_rels", base + ".rels")
+    if rels_name not in part_names:
+        return {}
+    relationships = {}
+    with package.open(rels_name) as f:
+        for element in etree.parse(f).getroot().iter(REL_RELATIONSHIP):
+            if element.get("TargetMode") == "External":
+                continue
+            target = element.get("Target")
+            if target.startswith("/"):
+                target_name = target.lstrip("/")
+            else:
+                target_name = posixpath.normpath(posixpath.join(folder, target))
+            relationships[element.get("Id")] = (element.get("Type"), target_name)
+    return relationships
+
+# Function to list the slide parts in presentation order
+def slide_part_names(package, part_names):
+    relationships = read_relationships(package, "ppt/presentation.xml", part_names)
+    with package.open("ppt/presentation.xml") as f:
+        slide_ids = [element.get(R_ID) for _, element in etree.iterparse(f, tag=P_SLD_ID)]
+    return [relationships[rel_id][1] for rel_id in slide_ids if rel_id in relationships]
+
+# Function to get the text of a DrawingML paragraph the way python-pptx's paragraph.text does
+def paragraph_text(paragraph):
+    parts = []
+    for child in paragraph:
+        if child.tag in (A_R, A_FLD):
+            parts.append(child.findtext(A_T) or "")
+        elif child.tag == A_BR:
+            parts.append("\v")
+    return "".join(parts)
+
+# Function to stream the text shapes of a slide part
+def iter_shape_paragraphs(stream):
+    """Yield (kind, paragraphs, placeholder_type) for each text-bearing shape, in document order.
+
+    kind is "shape" for a top-level shape, "group" for a shape inside a group shape and "table" for
+    a table cell. The tree is cleared as it is parsed, so memory does not grow with the slide.
+    """
+    group_depth = 0
+    shape_stack = []  # [kind, paragraphs, has_text_body, placeholder_type] of the open shapes / cells
+    for event, element in etree.iterparse(stream, events=("start", "end"),
+                                          tag=(P_SP, P_GRP_SP, P_GRAPHIC_FRAME, A_TC, P_TX_BODY, P_PH, A_P)):
+        tag = element.tag
+        if event == "start":
+            if tag == P_GRP_SP:
+                group_depth += 1
+            elif tag == P_SP:
+                shape_stack.append(["group" if group_depth else "shape", [], False, None])
+            elif tag == A_TC:
+                shape_stack.append(["table", [], True, None])
+            elif tag == P_TX_BODY and shape_stack:
+                shape_stack[-1][2] = True
+            elif tag == P_PH and shape_stack:
+                shape_stack[-1][3] = element.get("type", "obj")  # The schema default, as in python-pptx
+            continue
+        if tag == A_P:
+            if shape_stack:
+                shape_stack[-1][1].append(paragraph_text(element))
+            element.clear()
+        elif tag in (P_SP, A_TC):
+            kind, paragraphs, has_text_body, placeholder_type = shape_stack.pop()
+            if has_text_body:
+                yield kind, paragraphs, placeholder_type
+        elif tag == P_GRP_SP:
+            group_depth -= 1
+        if tag in (P_SP, P_GRP_SP, P_GRAPHIC_FRAME) and not shape_stack:
+            # Drop the finished top-level shape and the siblings parsed before it
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+# Function to read the note text of a notes slide part
+def read_notes(package, notes_part_name):
+    """Text of the body placeholder, like python-pptx's notes_slide.notes_text_frame.text."""
+    with package.open(notes_part_name) as f:
+        for _, paragraphs, placeholder_type in iter_shape_paragraphs(f):
+            if placeholder_type == "body":
+                return "\n".join(paragraphs).strip()
+    return ""
+
+# Function to stream slide records from a .pptx/.pptm file without python-pptx
+def iter_slides(file_path):
+    """Yield one record per slide, in presentation order, with the fields of extract_text_with_metadata_from_ppt.
+
+    Text, title and note match the python-pptx extractor; text inside group shapes and table cells,
+    which that extractor skips, is added in document order.
+    """
+    file_name = os.path.basename(file_path)
+    abs_path = os.path.abspath(file_path)
+    with zipfile.ZipFile(file_path) as package:
+        part_names = set(package.namelist())
+        for slide_number, part_name in enumerate(slide_part_names(package, part_names), start=1):
+            lines = []
+            slide_title = None
+            with package.open(part_name) as f:
+                for kind, paragraphs, _ in iter_shape_paragraphs(f):
+                    lines.extend(paragraphs)
+                    # The title is the first top-level shape with text, as in the python-pptx extractor
+                    if kind == "shape" and not slide_title:
+                        slide_title = "\n".join(paragraphs) or None
+
+            slide_notes = ""
+            for rel_type, target_name in read_relationships(package, part_name, part_names).values():
+                if rel_type == NOTES_SLIDE_REL_TYPE and target_name in part_names:
+                    slide_notes = read_notes(package, target_name)
+                    break
+
+            yield {
+                "file_name": file_name,
+                "title": slide_title if slide_title else f"Slide {slide_number}",
+                "slide_number": slide_number,
+                "text": "\n".join(lines).strip(),
+                "note": slide_notes,
+                "slide_link": f"file:///{abs_path}#slide={slide_number}"
+            }
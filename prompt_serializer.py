@@ -0,0 +1,89 @@
+import os
+import re
+import json
+from collections import Counter
+
+# A text line on at least this share of a deck's slides is treated as boilerplate (footer, confidentiality line)
+BOILERPLATE_RATIO = 0.6
+
+# Decks with fewer slides are too small to tell boilerplate from content
+MIN_BOILERPLATE_SLIDES = 4
+
+_PAGE_NUMBER_PATTERN = r"(?:page|p\.|slide)?\s*{number}(?:\s*(?:/|of)\s*\d+)?"
+
+# Function to get the body lines of a slide without the title the extractor repeats in its text
+def body_lines(record):
+    """Return the stripped, non-empty text lines, minus the title prefix and the page number line."""
+    text = record.get("text") or ""
+    title = record.get("title") or ""
+    # extract_text_with_metadata_from_ppt takes the title from the first text frame, which is also in text
+    if title and text.startswith(title):
+        text = text[len(title):]
+    page_number = _PAGE_NUMBER_PATTERN.format(number=record.get("slide_number"))
+    return [
+        line for line in (raw.strip() for raw in text.splitlines())
+        if line and not re.fullmatch(page_number, line, re.IGNORECASE)
+    ]
+
+# Function to find the lines that repeat on most slides of a deck
+def find_boilerplate(slides_lines, ratio=BOILERPLATE_RATIO):
+    """Return the lines found on at least ratio of the slides, in order of first appearance."""
+    if len(slides_lines) < MIN_BOILERPLATE_SLIDES:
+        return []
+    counts = Counter(line for lines in slides_lines for line in set(lines))
+    threshold = ratio * len(slides_lines)
+    boilerplate = []
+    for lines in slides_lines:
+        for line in lines:
+            if counts[line] >= threshold and line not in boilerplate:
+                boilerplate.append(line)
+    return boilerplate
+
+# Function to serialize the slides of one deck
+def serialize_deck(file_name, records, ratio=BOILERPLATE_RATIO):
+    """One header per deck (name, link pattern, boilerplate), then "[n] title", body lines and the note per slide."""
+    slides_lines = [body_lines(record) for record in records]
+    boilerplate = find_boilerplate(slides_lines, ratio)
+    skipped = set(boilerplate)
+
+    # Slide links only differ in the slide number, so the header carries the pattern once
+    first_link = records[0].get("slide_link") or ""
+    link_base = first_link.rsplit("#slide=", 1)[0] if "#slide=" in first_link else None
+
+    lines = [f"## {file_name}"]
+    if link_base:
+        lines.append(f"Link: {link_base}#slide=<n>")
+    if boilerplate:
+        lines.append("On most slides: " + " | ".join(boilerplate))
+    for record, slide_lines in zip(records, slides_lines):
+        slide_number = record.get("slide_number")
+        title = " ".join((record.get("title") or "").split())
+        # "Slide <n>" is the extractor's placeholder for slides without text
+        lines.append(f"[{slide_number}]" if title in ("", f"Slide {slide_number}") else f"[{slide_number}] {title}")
+        lines.extend(line for line in slide_lines if line not in skipped)
+        note = " ".join((record.get("note") or "").split())
+        if note:
+            lines.append(f"Note: {note}")
+        slide_link = record.get("slide_link")
+        if slide_link and slide_link != f"{link_base}#slide={slide_number}":
+            lines.append(f"Link: {slide_link}")
+        # Near-duplicate slides collapsed into this one (see dedup_index.py)
+        if record.get("duplicates"):
+            lines.append("Also in: " + ", ".join(f"{d['file_name']} [{d['slide_number']}]" for d in record["duplicates"]))
+    return "\n".join(lines)
+
+# Function to serialize slide records for the system message
+def serialize_slides(records, ratio=BOILERPLATE_RATIO):
+    """Compact prompt text for slide records of one or more decks (decks keep their first-seen order)."""
+    decks = {}
+    for record in records:
+        decks.setdefault(record.get("file_name") or "", []).append(record)
+    return "\n\n".join(serialize_deck(file_name, deck_records, ratio) for file_name, deck_records in decks.items())
+
+# Function to format slide records in the configured prompt format
+def format_context(records, prompt_format=None):
+    """PROMPT_FORMAT=compact (default) uses serialize_slides; json keeps the indented JSON of earlier versions."""
+    prompt_format = prompt_format or os.getenv("PROMPT_FORMAT", "compact")
+    if prompt_format == "json":
+        return json.dumps(list(records), indent=4, ensure_ascii=False)
+    return serialize_slides(records)
@@ -0,0 +1,69 @@
+import time
+import threading
+
+# Class to keep requests within a tokens-per-minute and requests-per-minute budget
+class RateLimiter:
+    """Two token buckets (tokens and requests) refilled continuously; a limit of 0 means unlimited.
+
+    acquire() charges the estimated tokens of a request up front; settle() corrects the bucket
+    once the real usage is known, so later requests wait for what was actually spent.
+    """
+
+    def __init__(self, tokens_per_minute=0, requests_per_minute=0):
+        self.tokens_per_minute = tokens_per_minute or 0
+        self.requests_per_minute = requests_per_minute or 0
+        self._tokens = float(self.tokens_per_minute)
+        self._requests = float(self.requests_per_minute)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+
+    def wait_time(self, tokens=0):
+        """Seconds until a request of `tokens` tokens fits in both budgets (0 if it fits now)."""
+        with self._condition:
+            self._refill()
+            return self._wait_time(tokens)
+
+    def _wait_time(self, tokens):
+        wait = 0.0
+        if self.tokens_per_minute:
+            # A request larger than the whole budget waits for a full bucket instead of forever
+            tokens = min(tokens, self.tokens_per_minute)
+            if self._tokens < tokens:
+                wait = (tokens - self._tokens) * 60 / self.tokens_per_minute
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        return wait
+
+    def acquire(self, tokens=0):
+        """Block until the request fits, charge it and return the seconds waited."""
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                self._refill()
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                self._condition.wait(wait)
+            if self.tokens_per_minute:
+                self._tokens -= min(tokens, self.tokens_per_minute)
+            if self.requests_per_minute:
+                self._requests -= 1
+        return time.monotonic() - start
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Refund or charge the difference between the estimated and the reported token usage."""
+        if not self.tokens_per_minute:
+            return
+        with self._condition:
+            self._refill()
+            self._tokens = min(self.tokens_per_minute, self._tokens + estimated_tokens - actual_tokens)
+            self._condition.notify_all()
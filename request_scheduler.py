@@ -0,0 +1,168 @@
+import os
+import math
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from rate_limiter import RateLimiter
+
+# Completion tokens charged to the rate limiter up front; corrected once the reply reports its usage
+COMPLETION_TOKENS_ESTIMATE = 500
+
+# Seconds between two queue updates reported to a waiting request
+STATUS_INTERVAL = 1.0
+
+# Class for one request waiting for, or holding, a slot of the scheduler
+class Ticket:
+    def __init__(self, session_id, estimated_tokens, finish_tag, sequence):
+        self.session_id = session_id
+        self.estimated_tokens = estimated_tokens
+        self.finish_tag = finish_tag
+        self.sequence = sequence
+        self.actual_tokens = None  # Set by the caller once the usage is known; the estimate is kept otherwise
+        self.queue_wait = 0.0
+        self.rate_limit_wait = 0.0
+
+    def sort_key(self):
+        return (self.finish_tag, self.sequence)
+
+# Class to share the completion endpoint fairly between the sessions of a process
+class RequestScheduler:
+    """Process-wide gate in front of the chat completion endpoint.
+
+    Waiting requests form a weighted fair queue measured in estimated tokens: a request is tagged
+    with the virtual time at which it would finish if every session got an equal share of tokens
+    (start at the later of the virtual clock and the session's previous tag, finish after its
+    estimated tokens). When fewer than max_in_flight requests run, the smallest tag is sent next
+    and charged to the token bucket. A session with many queued requests cannot starve the others,
+    a short question overtakes a huge prompt queued at the same time, and the huge prompt is still
+    sent once the virtual clock has passed its tag.
+    """
+
+    def __init__(self, limiter=None, max_in_flight=4):
+        self.limiter = limiter or RateLimiter()
+        self.max_in_flight = max(1, max_in_flight)
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._session_tags = {}  # session id -> finish tag of its last queued request
+        self._sequence = itertools.count()
+        self._service_seconds = None  # Moving average of the time a request holds its slot
+        self._stats = {"completed": 0, "queue_wait": 0.0, "rate_limit_wait": 0.0, "max_queued": 0}
+
+    def _enqueue(self, session_id, estimated_tokens):
+        with self._condition:
+            start_tag = max(self._virtual_time, self._session_tags.get(session_id, 0.0))
+            ticket = Ticket(session_id, estimated_tokens, start_tag + max(1, estimated_tokens), next(self._sequence))
+            self._session_tags[session_id] = ticket.finish_tag
+            self._waiting.append(ticket)
+            self._stats["max_queued"] = max(self._stats["max_queued"], len(self._waiting))
+            return ticket
+
+    def _position(self, ticket):
+        """1-based place of a waiting ticket in the dispatch order."""
+        key = ticket.sort_key()
+        return 1 + sum(1 for other in self._waiting if other.sort_key() < key)
+
+    def _estimate_wait(self, ticket, position):
+        """Seconds until the ticket is sent: slots freeing up, or the tokens queued before it refilling."""
+        service_seconds = self._service_seconds or 1.0
+        free_slots = self.max_in_flight - self._in_flight
+        slot_wait = math.ceil(max(0, position - free_slots) / self.max_in_flight) * service_seconds
+        key = ticket.sort_key()
+        tokens_ahead = sum(other.estimated_tokens for other in self._waiting if other.sort_key() <= key)
+        return max(slot_wait, self.limiter.wait_time(tokens_ahead))
+
+    def _wait_for_slot(self, ticket, on_wait):
+        last_reported = None
+        with self._condition:
+            while True:
+                if self._in_flight < self.max_in_flight and min(self._waiting, key=Ticket.sort_key) is ticket:
+                    self._waiting.remove(ticket)
+                    self._in_flight += 1
+                    self._virtual_time = max(self._virtual_time, ticket.finish_tag)
+                    # Sessions whose last tag is behind the clock would start at the clock anyway
+                    for session_id in [s for s, tag in self._session_tags.items() if tag <= self._virtual_time]:
+                        del self._session_tags[session_id]
+                    self._condition.notify_all()  # The next ticket may fit in another free slot
+                    return last_reported is not None
+                if on_wait is not None:
+                    position = self._position(ticket)
+                    report = (position, round(self._estimate_wait(ticket, position)))
+                    if report != last_reported:
+                        # The callback may render UI or raise; the condition is released meanwhile
+                        self._condition.release()
+                        try:
+                            on_wait(*report)
+                        finally:
+                            self._condition.acquire()
+                        last_reported = report
+                        continue
+                self._condition.wait(STATUS_INTERVAL)
+
+    def _cancel(self, ticket):
+        with self._condition:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._condition.notify_all()
+
+    def _release(self, ticket, service_seconds):
+        self.limiter.settle(ticket.estimated_tokens,
+                            ticket.estimated_tokens if ticket.actual_tokens is None else ticket.actual_tokens)
+        with self._condition:
+            self._in_flight -= 1
+            if self._service_seconds is None:
+                self._service_seconds = service_seconds
+            else:
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * service_seconds
+            self._stats["completed"] += 1
+            self._stats["queue_wait"] += ticket.queue_wait
+            self._stats["rate_limit_wait"] += ticket.rate_limit_wait
+            self._condition.notify_all()
+
+    @contextmanager
+    def request(self, session_id, estimated_tokens, on_wait=None):
+        """Hold a slot for one completion request (streaming included) for the duration of the block.
+
+        on_wait(position, seconds) is called while the request waits, whenever its queue position
+        or estimated wait changes (position 0: waiting for the token bucket only), and once more
+        with (0, 0) when it is sent. Set ticket.actual_tokens inside the block to settle the bucket.
+        """
+        start = time.monotonic()
+        ticket = self._enqueue(session_id, estimated_tokens)
+        try:
+            reported = self._wait_for_slot(ticket, on_wait)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        ticket.queue_wait = time.monotonic() - start
+        sent = time.monotonic()
+        try:
+            rate_limit_wait = self.limiter.wait_time(estimated_tokens)
+            if on_wait is not None and rate_limit_wait > 0:
+                on_wait(0, round(rate_limit_wait))
+                reported = True
+            ticket.rate_limit_wait = self.limiter.acquire(estimated_tokens)
+            if reported:
+                on_wait(0, 0)
+            sent = time.monotonic()
+            yield ticket
+        finally:
+            self._release(ticket, time.monotonic() - sent)
+
+    def status(self):
+        """Requests running and waiting now, plus totals since the scheduler was created."""
+        with self._condition:
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(self._waiting),
+                "sessions_queued": len({ticket.session_id for ticket in self._waiting}),
+                **self._stats,
+            }
+
+# Function to create the scheduler configured in the environment
+def get_request_scheduler():
+    """SCHEDULER_MAX_IN_FLIGHT caps concurrent requests; RATE_LIMIT_TPM / RATE_LIMIT_RPM set the token bucket."""
+    limiter = RateLimiter(int(os.getenv("RATE_LIMIT_TPM", "0")), int(os.getenv("RATE_LIMIT_RPM", "0")))
+    return RequestScheduler(limiter, max_in_flight=int(os.getenv("SCHEDULER_MAX_IN_FLIGHT", "4")))
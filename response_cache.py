@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from file_utils import atomic_write_json
+from manifest import hash_file
+from dedup_index import get_dedup_threshold
+
+# Function to normalize a message list so equivalent prompts share a cache key
+def normalize_messages(messages):
+    """Keep only role and content, with whitespace runs collapsed and the ends stripped."""
+    return [{"role": m["role"], "content": re.sub(r"\s+", " ", m["content"] or "").strip()} for m in messages]
+
+# Function to identify the system prompt of a chat without hashing the whole deck text
+def make_context_id(pre_paper_prompt, deck_hashes, context_mode, retrieval_top_k, prompt_format):
+    """Hash the pre-paper prompt, the content hashes of the decks and the options that shape the context.
+
+    context_mode is "full", "retrieved", "semantic" or "mapreduce" in every app, so they share cached
+    replies; top-k only counts when slides are retrieved, and the near-duplicate threshold only when
+    several decks are combined (as in context_bundle.ContextBundleStore.bundle_key).
+    """
+    options = [
+        context_mode,
+        retrieval_top_k if context_mode in ("retrieved", "semantic") else None,
+        prompt_format,
+        get_dedup_threshold() if len(deck_hashes) > 1 else None,
+    ]
+    digest = hashlib.sha256(pre_paper_prompt.encode("utf-8"))
+    for part in sorted(deck_hashes) + [str(option) for option in options]:
+        digest.update(b"\0" + part.encode("utf-8"))
+    return digest.hexdigest()
+
+# Function to look up the content hashes of deck JSON files in the ingestion manifest
+def get_deck_hashes(manifest, json_paths):
+    """Decks missing from the manifest (e.g. copied in by hand) are identified by a hash of their JSON."""
+    by_json_file = {entry["json_file"]: entry["content_hash"] for entry in manifest.entries().values()}
+    return [by_json_file.get(os.path.basename(path)) or hash_file(path) for path in json_paths]
+
+# Function to compute the cache key of a request
+def make_cache_key(deployment, context_id, messages):
+    """The first system message (the deck context) is represented by context_id instead of its text."""
+    if messages and messages[0]["role"] == "system":
+        messages = messages[1:]
+    payload = json.dumps([deployment, context_id, normalize_messages(messages)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Class to handle the two-tier chat response cache
+class ResponseCache:
+    """In-memory LRU in front of a folder of JSON files (one per response) with TTL and size eviction.
+
+    Each entry is tagged with the content hashes of its decks, so invalidate_decks() can drop the
+    answers about a deck that was re-ingested. The key also contains those hashes, so a stale
+    answer is never returned even before it is dropped.
+    """
+
+    def __init__(self, folder, max_memory_entries=256, max_disk_bytes=100 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.folder = folder
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> entry, least recently used first
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl
+
+    def get(self, key):
+        """Return the cached response text, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry["response"]
+            self._memory.pop(key, None)
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and self._expired(entry):
+            self._remove_file(path)
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        try:
+            os.utime(path)  # The disk tier evicts the least recently used files first
+        except OSError:
+            pass
+        return entry["response"]
+
+    def put(self, key, response, deck_hashes=()):
+        if not response:
+            return  # Never cache a failed or empty reply
+        entry = {"created": time.time(), "deck_hashes": sorted(deck_hashes), "response": response}
+        with self._lock:
+            self._remember(key, entry)
+        atomic_write_json(self._path(key), entry, indent=None)
+        self._evict_disk()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _iter_files(self):
+        try:
+            with os.scandir(self.folder) as entries:
+                for item in entries:
+                    if item.name.endswith(".json") and not item.name.startswith("."):
+                        yield item
+        except FileNotFoundError:
+            return
+
+    def _evict_disk(self):
+        """Drop expired files, then the least recently used ones until the folder fits max_disk_bytes."""
+        files = []
+        now = time.time()
+        for item in self._iter_files():
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue
+            # mtime is the last use (bumped on hits); a file unused for ttl is certainly expired
+            files.append((stat.st_mtime, stat.st_size, item.path))
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.max_disk_bytes and now - mtime <= self.ttl:
+                break
+            self._remove_file(path)
+            total -= size
+
+    def invalidate_decks(self, deck_hashes):
+        """Drop every cached response that was produced from one of the given deck versions."""
+        stale = set(deck_hashes)
+        if not stale:
+            return 0
+        with self._lock:
+            for key in [key for key, entry in self._memory.items() if stale & set(entry["deck_hashes"])]:
+                del self._memory[key]
+        removed = 0
+        for item in self._iter_files():
+            try:
+                with open(item.path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if stale & set(entry.get("deck_hashes", [])):
+                self._remove_file(item.path)
+                removed += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for item in self._iter_files():
+            self._remove_file(item.path)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+# Function to create the response cache configured in the environment
+def get_response_cache(folder):
+    """Return None when RESPONSE_CACHE=0; sizes and TTL come from RESPONSE_CACHE_* variables."""
+    if os.getenv("RESPONSE_CACHE", "1") == "0":
+        return None
+    return ResponseCache(
+        folder,
+        max_memory_entries=int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "256")),
+        max_disk_bytes=int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "100")) * 1024 * 1024),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+    )
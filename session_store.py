@@ -0,0 +1,195 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime
+
+# Function to hash the pre-paper prompt so sessions can reference it instead of storing it
+def hash_text(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+# Class to append the messages of one chat session to its JSONL log
+class SessionLog:
+    """Open session log; every message is flushed as it is appended and fsynced in batches.
+
+    A batch is synced after fsync_every messages or fsync_interval seconds, whichever comes first,
+    and on close(), so a crash loses at most the last unsynced batch (nothing if only the process dies).
+    """
+
+    def __init__(self, path, session_id, fsync_every=8, fsync_interval=2.0):
+        self.path = path
+        self.session_id = session_id
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def write_record(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def append(self, role, content, **fields):
+        self.write_record({"type": "message", "time": datetime.now().isoformat(timespec="seconds"),
+                           "role": role, "content": content, **fields})
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._unsynced:
+                self._sync()
+            self._file.close()
+
+# Class to handle the append-only conversation logs of a folder
+class SessionStore:
+    """One <session id>.jsonl file per chat session: a header record, then one record per message.
+
+    The header stores references to the chat context (hash of the pre-paper prompt, JSON files and
+    content hashes of the decks, context options) instead of the system message itself. Sessions idle
+    for archive_days are gzipped into archive/ by rotate(); archived ones older than retention_days are deleted.
+    """
+
+    def __init__(self, folder, fsync_every=8, fsync_interval=2.0, archive_days=30, retention_days=365):
+        self.folder = folder
+        self.archive_folder = os.path.join(folder, "archive")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.archive_days = archive_days
+        self.retention_days = retention_days
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.folder, f"{session_id}.jsonl")
+
+    def _archive_path(self, session_id):
+        return os.path.join(self.archive_folder, f"{session_id}.jsonl.gz")
+
+    def create(self, context, app="cli"):
+        """Start a new session; context holds references only (see SessionStore)."""
+        session_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_") + uuid.uuid4().hex[:6]
+        log = SessionLog(self._path(session_id), session_id, self.fsync_every, self.fsync_interval)
+        log.write_record({"type": "session", "id": session_id, "app": app,
+                          "created": datetime.now().isoformat(timespec="seconds"), "context": context})
+        return log
+
+    def open(self, session_id):
+        """Reopen a session to append to it; an archived session is restored first."""
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            archive_path = self._archive_path(session_id)
+            if not os.path.exists(archive_path):
+                raise FileNotFoundError(f"Session not found: {session_id}")
+            with gzip.open(archive_path, "rb") as source, open(path, "wb") as target:
+                target.write(source.read())
+            os.remove(archive_path)
+        return SessionLog(path, session_id, self.fsync_every, self.fsync_interval)
+
+    def _iter_records(self, session_id):
+        path = self._path(session_id)
+        if os.path.exists(path):
+            f = open(path, "r", encoding="utf-8")
+        elif os.path.exists(self._archive_path(session_id)):
+            f = gzip.open(self._archive_path(session_id), "rt", encoding="utf-8")
+        else:
+            raise FileNotFoundError(f"Session not found: {session_id}")
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Last line cut off by a crash
+
+    def load(self, session_id):
+        """Return (header, messages) of a session."""
+        header = None
+        messages = []
+        for record in self._iter_records(session_id):
+            if record.get("type") == "session":
+                header = record
+            elif record.get("type") == "message":
+                messages.append({"role": record["role"], "content": record["content"]})
+        return header, messages
+
+    def list_sessions(self, limit=20):
+        """Most recently updated sessions first: id, update time, decks and first question."""
+        sessions = []
+        for file_name in os.listdir(self.folder):
+            if file_name.endswith(".jsonl"):
+                path = os.path.join(self.folder, file_name)
+                sessions.append((os.path.getmtime(path), file_name[:-len(".jsonl")]))
+        summaries = []
+        for mtime, session_id in sorted(sessions, reverse=True)[:limit]:
+            header, first_question = None, ""
+            for record in self._iter_records(session_id):
+                if record.get("type") == "session":
+                    header = record
+                elif record.get("role") == "user":
+                    first_question = record["content"]
+                    break
+            if header is None:
+                continue
+            summaries.append({
+                "id": session_id,
+                "updated": datetime.fromtimestamp(mtime).isoformat(timespec="seconds"),
+                "decks": [deck["json_file"] for deck in header["context"].get("decks", [])],
+                "first_question": first_question,
+            })
+        return summaries
+
+    def rotate(self):
+        """Gzip sessions idle for archive_days and delete archived sessions older than retention_days."""
+        now = time.time()
+        archived = deleted = 0
+        for file_name in os.listdir(self.folder):
+            path = os.path.join(self.folder, file_name)
+            if not file_name.endswith(".jsonl") or now - os.path.getmtime(path) < self.archive_days * 86400:
+                continue
+            os.makedirs(self.archive_folder, exist_ok=True)
+            archive_path = os.path.join(self.archive_folder, file_name + ".gz")
+            with open(path, "rb") as source, gzip.open(archive_path, "wb") as target:
+                target.write(source.read())
+            os.utime(archive_path, (os.path.getatime(path), os.path.getmtime(path)))
+            os.remove(path)
+            archived += 1
+        if os.path.isdir(self.archive_folder):
+            for file_name in os.listdir(self.archive_folder):
+                path = os.path.join(self.archive_folder, file_name)
+                if now - os.path.getmtime(path) >= self.retention_days * 86400:
+                    os.remove(path)
+                    deleted += 1
+        return {"archived": archived, "deleted": deleted}
+
+# Function to create the session store configured in the environment
+def get_session_store(folder):
+    """SESSION_FSYNC_EVERY / SESSION_FSYNC_SECONDS batch the fsyncs; SESSION_ARCHIVE_DAYS / SESSION_RETENTION_DAYS rotate old sessions."""
+    return SessionStore(
+        folder,
+        fsync_every=int(os.getenv("SESSION_FSYNC_EVERY", "8")),
+        fsync_interval=float(os.getenv("SESSION_FSYNC_SECONDS", "2")),
+        archive_days=float(os.getenv("SESSION_ARCHIVE_DAYS", "30")),
+        retention_days=float(os.getenv("SESSION_RETENTION_DAYS", "365"))
+    )
+
+# Function to describe the context of a chat without its text
+def make_session_context(pre_paper_prompt, deck_json_paths, deck_hashes, **options):
+    return {
+        "prompt_hash": hash_text(pre_paper_prompt),
+        "decks": [{"json_file": os.path.basename(path), "content_hash": content_hash}
+                  for path, content_hash in zip(deck_json_paths, deck_hashes)],
+        **options,
+    }
@@ -0,0 +1,187 @@
+"""Tests of http_client.HttpClient against a local stub server that simulates throttling and failures.
+
+Run from the repository folder:
+    python -m pytest -q tests
+"""
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+from http_client import HttpClient, CircuitOpenError, get_retry_after, parse_duration
+
+# Class for a stub endpoint that answers with scripted (status, headers) responses, then 200
+class StubServer:
+    def __init__(self):
+        self.script = []
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub._lock:
+                    stub.requests += 1
+                    status, headers = stub.script.pop(0) if stub.script else (200, {})
+                body = json.dumps({"status": status}).encode("utf-8")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/chat"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the retry delays instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(http_client.time, "sleep", delays.append)
+    return delays
+
+def make_client(**kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return HttpClient(**kwargs)
+
+def test_retry_after_seconds_is_honoured(stub, sleeps):
+    stub.script = [(429, {"Retry-After": "2"})]
+    response = make_client().post(stub.url, json={})
+    assert response.status_code == 200
+    assert response.retry_count == 1
+    assert stub.requests == 2
+    assert 2 <= sleeps[0] <= 2.01
+
+def test_retry_after_ms_takes_precedence(stub, sleeps):
+    stub.script = [(429, {"retry-after-ms": "1500", "Retry-After": "10"})]
+    assert make_client().post(stub.url, json={}).status_code == 200
+    assert 1.5 <= sleeps[0] <= 1.51
+
+def test_ratelimit_reset_headers_when_budget_is_exhausted(stub, sleeps):
+    stub.script = [(429, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6s",
+                          "x-ratelimit-remaining-tokens": "100", "x-ratelimit-reset-tokens": "1m"})]
+    assert make_client().post(stub.url, json={}).status_code == 200
+    assert 6 <= sleeps[0] <= 6.01
+
+def test_retry_after_is_capped_by_backoff_max(stub, sleeps):
+    stub.script = [(429, {"Retry-After": "600"})]
+    assert make_client(backoff_max=5).post(stub.url, json={}).status_code == 200
+    assert 5 <= sleeps[0] <= 5.01
+
+def test_5xx_without_headers_uses_exponential_backoff(stub, sleeps):
+    stub.script = [(503, {}), (500, {}), (502, {})]
+    client = make_client(backoff_base=1.0)
+    response = client.post(stub.url, json={})
+    assert response.status_code == 200
+    assert response.retry_count == 3
+    assert client.total_retries == 3
+    assert [delay <= 2 ** attempt for attempt, delay in enumerate(sleeps)] == [True, True, True]
+
+def test_last_response_is_returned_when_retries_run_out(stub, sleeps):
+    stub.script = [(429, {"Retry-After": "1"})] * 3
+    response = make_client(max_retries=2).post(stub.url, json={})
+    assert response.status_code == 429
+    assert response.retry_count == 2
+    assert stub.requests == 3
+
+def test_non_retryable_status_is_returned_at_once(stub, sleeps):
+    stub.script = [(400, {})]
+    assert make_client().post(stub.url, json={}).status_code == 400
+    assert stub.requests == 1
+    assert sleeps == []
+
+def test_one_failing_request_does_not_open_the_breaker(stub, sleeps):
+    # Five 5xx attempts of one request (max_retries=4) are one failure, not five
+    stub.script = [(503, {})] * 5
+    client = make_client(max_retries=4, failure_threshold=5)
+    assert client.post(stub.url, json={}).status_code == 503
+    assert client.post(stub.url, json={}).status_code == 200
+
+def test_breaker_opens_after_consecutive_failed_requests(stub, sleeps):
+    stub.script = [(500, {})] * 3
+    client = make_client(max_retries=0, failure_threshold=3, recovery_time=60)
+    for _ in range(3):
+        assert client.post(stub.url, json={}).status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.post(stub.url, json={})
+    assert stub.requests == 3
+
+def test_throttling_does_not_open_the_breaker(stub, sleeps):
+    stub.script = [(429, {"Retry-After": "1"})] * 3
+    client = make_client(max_retries=0, failure_threshold=2)
+    for _ in range(3):
+        assert client.post(stub.url, json={}).status_code == 429
+    assert client.post(stub.url, json={}).status_code == 200
+
+def test_half_open_trial_closes_or_reopens_the_breaker(stub, sleeps, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, "time", lambda: now[0])
+    stub.script = [(500, {}), (500, {})]
+    client = make_client(max_retries=0, failure_threshold=1, recovery_time=30)
+    assert client.post(stub.url, json={}).status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.post(stub.url, json={})
+    # After the recovery time one trial goes through; its failure opens the breaker again
+    now[0] += 31
+    assert client.post(stub.url, json={}).status_code == 500
+    with pytest.raises(CircuitOpenError):
+        client.post(stub.url, json={})
+    now[0] += 31
+    assert client.post(stub.url, json={}).status_code == 200
+    assert client.post(stub.url, json={}).status_code == 200
+
+def test_trial_raising_an_unexpected_error_does_not_wedge_the_breaker(stub, sleeps, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, "time", lambda: now[0])
+    stub.script = [(500, {})]
+    client = make_client(max_retries=0, failure_threshold=1, recovery_time=30)
+    assert client.post(stub.url, json={}).status_code == 500
+    now[0] += 31
+    with pytest.raises(TypeError):
+        client.post(stub.url, json=object())  # Not JSON serializable: raised before anything is sent
+    assert client.post(stub.url, json={}).status_code == 200
+
+def test_connection_errors_are_retried_then_raised(sleeps):
+    server = StubServer()
+    url = server.url
+    server.close()  # Nothing listens on the port any more
+    client = make_client(max_retries=2, failure_threshold=1, recovery_time=60)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post(url, json={})
+    assert client.total_retries == 2
+    with pytest.raises(CircuitOpenError):
+        client.post(url, json={})
+
+def test_parse_duration_and_http_date_retry_after():
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("2.5") == 2.5
+    assert parse_duration("soon") is None
+    response = requests.Response()
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert get_retry_after(response) == 0
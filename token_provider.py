@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import threading
+import requests
+from file_utils import atomic_write_json
+
+# Class to obtain and cache Azure AD access tokens
+class AccessTokenProvider:
+    """Cache an Azure AD client-credentials token and refresh it shortly before it expires."""
+
+    def __init__(self, tenant_id, client_id, client_secret, resource, token_url=None,
+                 cache_file=None, refresh_margin=300, background_refresh=True, timeout=(5, 30)):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = (resource or "") + ".default"
+        self.token_url = token_url or f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self.timeout = timeout
+        self.cache_key = f"{tenant_id}:{client_id}:{self.scope}"
+        self._access_token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    def get_token(self):
+        """Return a valid access token, fetching a new one only when the cached one is near expiry."""
+        if self._is_fresh():
+            return self._access_token
+        with self._lock:
+            # Another thread may have refreshed the token while we were waiting
+            if not self._is_fresh():
+                if not self._load_from_disk():
+                    self._fetch_token()
+            self._start_background_refresh()
+            return self._access_token
+
+    def invalidate(self):
+        """Drop the in-memory token so the next call fetches a new one."""
+        with self._lock:
+            self._access_token = None
+            self._expires_at = 0.0
+            self._refresh_at = 0.0
+
+    def close(self):
+        """Stop the background refresh thread."""
+        self._stop_event.set()
+
+    def _is_fresh(self):
+        return self._access_token is not None and time.time() < self._refresh_at
+
+    def _fetch_token(self):
+        token_data = {
+            "grant_type": "client_credentials",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "scope": self.scope
+        }
+        token_headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        response = requests.post(self.token_url, data=token_data, headers=token_headers, timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        self._access_token = result.get("access_token")
+        # expires_in is returned in seconds (sometimes as a string)
+        expires_in = float(result.get("expires_in", 3600))
+        self._expires_at = time.time() + expires_in
+        # Short-lived tokens are refreshed at half their lifetime instead of the full margin
+        self._refresh_at = self._expires_at - min(self.refresh_margin, expires_in / 2)
+        self._save_to_disk()
+
+    def _load_from_disk(self):
+        """Reuse a token written by another process (CLI or Streamlit) if it is still fresh."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return False
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cached.get("cache_key") != self.cache_key:
+            return False
+        if time.time() >= cached.get("refresh_at", 0):
+            return False
+        self._access_token = cached.get("access_token")
+        self._expires_at = cached.get("expires_at")
+        self._refresh_at = cached.get("refresh_at")
+        return self._access_token is not None
+
+    def _save_to_disk(self):
+        if not self.cache_file:
+            return
+        try:
+            atomic_write_json(self.cache_file, {
+                "cache_key": self.cache_key,
+                "access_token": self._access_token,
+                "expires_at": self._expires_at,
+                "refresh_at": self._refresh_at
+            })
+            os.chmod(self.cache_file, 0o600)
+        except OSError as e:
+            print(f"Could not write token cache file: {e}")
+
+    def _start_background_refresh(self):
+        if not self.background_refresh or self._refresh_thread is not None:
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        """Refresh the token ahead of expiry so callers never wait on the token endpoint."""
+        while not self._stop_event.is_set():
+            wait_seconds = max(self._refresh_at - time.time(), 1.0)
+            if self._stop_event.wait(wait_seconds):
+                break
+            refresh_failed = False
+            with self._lock:
+                if self._is_fresh():
+                    continue
+                try:
+                    if not self._load_from_disk():
+                        self._fetch_token()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # Keep the current token; get_token() will retry on demand
+                    print(f"Background token refresh failed: {e}")
+                    refresh_failed = True
+            if refresh_failed:
+                self._stop_event.wait(30)
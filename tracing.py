@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import atexit
+import logging
+import functools
+import threading
+import contextvars
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from file_utils import atomic_write_text
+
+# Turn that spans and annotations are attached to (one per thread / Streamlit script run)
+_current_turn = contextvars.ContextVar("pptchat_current_turn", default=None)
+
+# Minimum seconds between two Prometheus file writes caused by spans outside a turn
+PROMETHEUS_WRITE_INTERVAL = 1.0
+
+# Class returned by every tracing call while tracing is disabled
+class _NoopTrace:
+    """Shared do-nothing span/turn, so disabled tracing costs one attribute check per call."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, **increments):
+        pass
+
+    def to_dict(self):
+        return {}
+
+_NOOP = _NoopTrace()
+
+# Class to time one operation
+class Span:
+    __slots__ = ("tracer", "name", "attributes", "start")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._finish_span(self.name, time.perf_counter() - self.start, self.attributes)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+# Class to collect the spans and usage of one chat turn
+class Turn:
+    def __init__(self, tracer, attributes):
+        self.tracer = tracer
+        self.attributes = attributes
+        self.spans = []
+        self.seconds = None
+        self.timestamp = datetime.now().isoformat(timespec="milliseconds")
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_turn.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_turn.reset(self._token)
+        self.seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.tracer._finish_turn(self)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **increments):
+        for name, value in increments.items():
+            self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def span_seconds(self, name):
+        return sum(span["seconds"] for span in self.spans if span["name"] == name)
+
+    def to_dict(self):
+        return {"kind": "turn", "app": self.tracer.app, "time": self.timestamp, "seconds": round(self.seconds or 0.0, 4),
+                **self.attributes, "spans": self.spans}
+
+# Class to write trace records to a rotating JSONL file and a Prometheus textfile
+class Tracer:
+    """Timing spans grouped per chat turn.
+
+    Each finished turn (and each span outside a turn) is appended to a rotating JSONL file, and
+    running totals are exported in the Prometheus textfile format (for node_exporter's textfile
+    collector). A disabled tracer hands out a shared no-op object and records nothing.
+    """
+
+    def __init__(self, app, folder=None, enabled=True, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 prometheus_file=None):
+        self.app = app
+        self.enabled = enabled and folder is not None
+        self._lock = threading.Lock()
+        self._totals = {}  # (metric, label items) -> value
+        self._last_prometheus_write = 0.0
+        self.prometheus_file = None
+        if not self.enabled:
+            return
+        os.makedirs(folder, exist_ok=True)
+        self.prometheus_file = prometheus_file or os.path.join(folder, f"pptchat_{app}.prom")
+        self._logger = logging.getLogger(f"pptchat.trace.{app}.{id(self)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        handler = RotatingFileHandler(os.path.join(folder, f"trace_{app}.jsonl"), maxBytes=max_bytes,
+                                      backupCount=backup_count, encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(handler)
+        atexit.register(self.write_prometheus)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attributes)
+
+    def turn(self, **attributes):
+        if not self.enabled:
+            return _NOOP
+        return Turn(self, attributes)
+
+    def _finish_span(self, name, seconds, attributes):
+        record = {"name": name, "seconds": round(seconds, 4), **attributes}
+        with self._lock:
+            self._add_total("pptchat_span_seconds_sum", seconds, span=name)
+            self._add_total("pptchat_span_seconds_count", 1, span=name)
+        turn = _current_turn.get()
+        if turn is not None and turn.tracer is self:
+            turn.spans.append(record)
+            return
+        self._emit({"kind": "span", "app": self.app, "time": datetime.now().isoformat(timespec="milliseconds"), **record})
+        if time.time() - self._last_prometheus_write >= PROMETHEUS_WRITE_INTERVAL:
+            self.write_prometheus()
+
+    def _finish_turn(self, turn):
+        attributes = turn.attributes
+        with self._lock:
+            self._add_total("pptchat_turns_total", 1)
+            self._add_total("pptchat_turn_seconds_sum", turn.seconds)
+            self._add_total("pptchat_turn_seconds_count", 1)
+            for attribute, metric in (("prompt_tokens", "pptchat_prompt_tokens_total"),
+                                      ("completion_tokens", "pptchat_completion_tokens_total"),
+                                      ("cached_prompt_tokens", "pptchat_cached_prompt_tokens_total"),
+                                      ("retries", "pptchat_http_retries_total"),
+                                      ("cache_hits", "pptchat_response_cache_hits_total")):
+                if attributes.get(attribute):
+                    self._add_total(metric, attributes[attribute])
+            if attributes.get("time_to_first_token") is not None:
+                self._add_total("pptchat_time_to_first_token_seconds_sum", attributes["time_to_first_token"])
+                self._add_total("pptchat_time_to_first_token_seconds_count", 1)
+        self._emit(turn.to_dict())
+        self.write_prometheus()
+
+    def _add_total(self, metric, value, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        self._totals[key] = self._totals.get(key, 0) + value
+
+    def _emit(self, record):
+        self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def write_prometheus(self):
+        """Write the running totals in the Prometheus text exposition format."""
+        if not self.enabled:
+            return
+        with self._lock:
+            totals = sorted(self._totals.items())
+            self._last_prometheus_write = time.time()
+        lines = []
+        declared = set()
+        for (metric, labels), value in totals:
+            family = metric.rsplit("_", 1)[0] if metric.endswith(("_sum", "_count")) else metric
+            if family not in declared:
+                declared.add(family)
+                metric_type = "summary" if family != metric else "counter"
+                lines.append(f"# TYPE {family} {metric_type}")
+            label_text = ",".join([f'app="{self.app}"'] + [f'{name}="{value_}"' for name, value_ in labels])
+            lines.append(f"{metric}{{{label_text}}} {value:.6g}")
+        atomic_write_text(self.prometheus_file, "\n".join(lines) + "\n")
+
+# Tracer used by the module-level helpers; disabled until configure_tracing() is called
+_tracer = Tracer("disabled", enabled=False)
+
+# Function to enable tracing for this process
+def configure_tracing(app, folder):
+    """Trace to <folder>/trace_<app>.jsonl and <folder>/pptchat_<app>.prom unless TRACING=0.
+
+    TRACE_MAX_MB / TRACE_BACKUPS size the JSONL rotation and TRACE_PROMETHEUS_FOLDER points the
+    textfile export at a node_exporter collector folder.
+    """
+    global _tracer
+    prometheus_folder = os.getenv("TRACE_PROMETHEUS_FOLDER")
+    _tracer = Tracer(
+        app, folder,
+        enabled=os.getenv("TRACING", "1") != "0",
+        max_bytes=int(float(os.getenv("TRACE_MAX_MB", "10")) * 1024 * 1024),
+        backup_count=int(os.getenv("TRACE_BACKUPS", "5")),
+        prometheus_file=os.path.join(prometheus_folder, f"pptchat_{app}.prom") if prometheus_folder else None
+    )
+    return _tracer
+
+def get_tracer():
+    return _tracer
+
+# Function to time a block: with span("json_load"): ...
+def span(name, **attributes):
+    return _tracer.span(name, **attributes)
+
+# Function to group the spans of one chat turn: with turn(mode="full") as current: ...
+def turn(**attributes):
+    return _tracer.turn(**attributes)
+
+# Function to set attributes (token counts, cache hits, ...) on the current turn
+def annotate(**attributes):
+    current = _current_turn.get()
+    if current is not None:
+        current.set(**attributes)
+
+# Function to add to counters (retries, ...) on the current turn
+def count(**increments):
+    current = _current_turn.get()
+    if current is not None:
+        current.add(**increments)
+
+# Decorator to time every call of a function
+def traced(name=None):
+    def decorate(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return function(*args, **kwargs)
+            with _tracer.span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
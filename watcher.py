@@ -0,0 +1,197 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+from file_utils import log_error_to_file
+from ingest import update_deck, remove_deck
+from manifest import IngestionManifest, get_manifest_key
+from ppt_extraction import list_ppt_files
+from response_cache import get_response_cache
+
+# Seconds without a new event before a file is processed (saving or copying a deck fires several events)
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+
+# Class to forward file system events of the ppt folder to the watcher
+class _DeckEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ("opened", "closed_no_write"):
+            return
+        self.watcher.notify(event.src_path)
+        if getattr(event, "dest_path", None):
+            self.watcher.notify(event.dest_path)
+
+# Class to keep ppt_json in sync with the ppt folder in the background
+class DeckWatcher:
+    """Watch a ppt folder and ingest new and changed decks, or delete the outputs of removed ones.
+
+    Events are debounced per file: a deck is processed once no event arrived for `debounce`
+    seconds, then it is re-extracted if it still exists and removed otherwise. scan() queues
+    everything that changed while the watcher was not running. process_pending() can be called
+    directly (e.g. with a temporary folder) instead of running the background thread.
+    """
+
+    def __init__(self, ppt_folder, ppt_json_folder, management_file, debounce=DEFAULT_DEBOUNCE_SECONDS,
+                 embedding_index=None, response_cache=None):
+        self.ppt_folder = os.path.abspath(ppt_folder)
+        self.ppt_json_folder = ppt_json_folder
+        self.management_file = management_file
+        self.debounce = debounce
+        self.embedding_index = embedding_index
+        self.response_cache = response_cache
+        self._pending = {}  # path -> time of the last event
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def is_deck_path(self, path):
+        """Decks directly in the ppt folder; Office lock files (~$name.pptx) are ignored."""
+        folder, file_name = os.path.split(os.path.abspath(path))
+        return (
+            os.path.normcase(folder) == os.path.normcase(self.ppt_folder)
+            and file_name.lower().endswith((".ppt", ".pptx", ".pptm"))
+            and not file_name.startswith("~$")
+        )
+
+    def notify(self, path):
+        """Record a file event; the deck is processed after `debounce` quiet seconds."""
+        if not self.is_deck_path(path):
+            return
+        with self._condition:
+            self._pending[os.path.abspath(path)] = time.monotonic()
+            self._condition.notify_all()
+
+    def scan(self):
+        """Queue the decks that are new, changed or gone since the manifest was last written."""
+        os.makedirs(self.ppt_json_folder, exist_ok=True)
+        manifest = IngestionManifest(self.management_file)
+        present = set()
+        for file_name in list_ppt_files(self.ppt_folder):
+            ppt_path = os.path.join(self.ppt_folder, file_name)
+            present.add(get_manifest_key(ppt_path))
+            if not manifest.is_unchanged(ppt_path, self.ppt_json_folder):
+                self.notify(ppt_path)
+        manifest.save()  # Persist adopted legacy entries
+        folder_key = get_manifest_key(self.ppt_folder)
+        for key, entry in manifest.entries().items():
+            if os.path.dirname(key) == folder_key and key not in present:
+                self.notify(os.path.join(self.ppt_folder, entry["file_name"]))
+
+    def process_pending(self, force=False):
+        """Process every deck whose events have settled (all queued decks with force=True).
+
+        Returns [(path, action)] where action is "extracted", "copied", "touched", "removed" or "failed".
+        """
+        now = time.monotonic()
+        with self._condition:
+            ready = [path for path, last_event in self._pending.items() if force or now - last_event >= self.debounce]
+            for path in ready:
+                del self._pending[path]
+        if not ready:
+            return []
+
+        manifest = IngestionManifest(self.management_file)
+        processed = []
+        for ppt_path in sorted(ready):
+            file_name = os.path.basename(ppt_path)
+            try:
+                if os.path.exists(ppt_path):
+                    if manifest.is_unchanged(ppt_path, self.ppt_json_folder):
+                        continue
+                    status, result, delta = update_deck(
+                        ppt_path, self.ppt_json_folder, manifest, self.embedding_index, self.response_cache
+                    )
+                    detail = "unchanged content" if delta is None else f"{len(delta['changed'])} changed, {len(delta['removed'])} removed"
+                    print(f"{file_name}: {status} ({len(result['slides'])} slides, {detail})")
+                    processed.append((ppt_path, status))
+                elif remove_deck(ppt_path, self.ppt_json_folder, manifest, self.embedding_index, self.response_cache):
+                    print(f"{file_name}: removed")
+                    processed.append((ppt_path, "removed"))
+            except Exception as e:
+                # A deck that is still being written fails to open; its next event queues it again
+                print(f"Failed to ingest {file_name}: {e}")
+                log_error_to_file(f"Failed to ingest {file_name}: {e}")
+                processed.append((ppt_path, "failed"))
+        manifest.save()
+        return processed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                if self._pending:
+                    wait = max(0.0, min(self._pending.values()) + self.debounce - time.monotonic())
+                else:
+                    wait = None
+                self._condition.wait(wait)
+            if not self._stopped.is_set():
+                self.process_pending()
+
+    def start(self):
+        """Queue what changed while stopped, then watch the folder and ingest in a background thread."""
+        self.scan()
+        self._stopped.clear()
+        self._observer = Observer()
+        self._observer.schedule(_DeckEventHandler(self), self.ppt_folder, recursive=False)
+        self._observer.start()
+        self._thread = threading.Thread(target=self._run, name="deck-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+def main():
+    base_folder = os.getenv("PPTCHAT_HOME", os.path.join("C:\\", "python_scripts", "pptChat"))
+    parser = argparse.ArgumentParser(description="Keep ppt_json and its indexes in sync with the ppt folder.")
+    parser.add_argument("--ppt-folder", default=os.path.join(base_folder, "ppt"))
+    parser.add_argument("--json-folder", default=os.path.join(base_folder, "ppt_json"))
+    parser.add_argument("--management-folder", default=os.path.join(base_folder, "text_extraction_management_files"))
+    parser.add_argument("--debounce", type=float, default=float(os.getenv("WATCH_DEBOUNCE", str(DEFAULT_DEBOUNCE_SECONDS))),
+                        help="quiet seconds before a changed file is processed")
+    parser.add_argument("--skip-embeddings", action="store_true", help="do not update the embedding index")
+    parser.add_argument("--once", action="store_true", help="sync the folder once and exit")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ppt_folder):
+        print(f"Folder not found: {args.ppt_folder}")
+        return 1
+    embedding_index = None
+    if not args.skip_embeddings:
+        from main import get_embedding_index
+        embedding_index = get_embedding_index(args.json_folder)
+    watcher = DeckWatcher(
+        args.ppt_folder, args.json_folder, os.path.join(args.management_folder, "ppt_management.json"),
+        debounce=args.debounce, embedding_index=embedding_index,
+        response_cache=get_response_cache(os.path.join(base_folder, "cache", "responses"))
+    )
+    if args.once:
+        watcher.scan()
+        watcher.process_pending(force=True)
+        return 0
+
+    watcher.start()
+    print(f"Watching {args.ppt_folder} (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())